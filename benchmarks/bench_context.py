@@ -0,0 +1,139 @@
+"""
+Compare verifying candidates with their whole profile against query-aware context.
+
+For each labeled query this verifies the same top candidates twice, once with
+VERIFY_CONTEXT 'full' and once with 'relevant', each with an empty verdict
+cache, and reports prompt tokens, wall time and verdict accuracy against the
+labels for both. Accuracy counts a verdict as correct when it passes exactly
+the candidates the labels mark relevant.
+
+By default it runs against the synthetic fixture profiles with the mock OpenAI
+server, whose chat latency grows with prompt length (--prompt-latency). With
+--labels it runs against the real lawyer store and the configured API; the
+labels file is a JSON list of {"query", "type", "relevant": [lawyer urls]}.
+
+Usage:
+    python -m benchmarks.bench_context --limit 30
+    python -m benchmarks.bench_context --labels labeled_queries.json --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import llm_utils
+from benchmarks.fixtures import build_fixture_store, labeled_queries, synthetic_corpus
+from benchmarks.mock_openai import MockOpenAIServer, use_mock_openai
+from lawyer_store import LawyerStore, open_lawyer_store
+from models import CandidateStrategy
+from precompute import load_embedding_index
+from verdict_cache import VerdictCache
+from verifier import verification_tasks
+
+CONTEXTS = ('full', 'relevant')
+
+
+async def verify(lawyer_urls, lawyers_dict, query, context, cache):
+    before = llm_utils.api_usage.copy()
+    start = time.perf_counter()
+    verdicts = {}
+    for task in asyncio.as_completed(verification_tasks(lawyer_urls, lawyers_dict, query, cache=cache,
+                                                        context=context)):
+        for _, url, passed in await task:
+            verdicts[url] = passed
+    elapsed = time.perf_counter() - start
+    usage = llm_utils.api_usage - before
+    return verdicts, elapsed, usage['chat_prompt_tokens']
+
+
+async def compare(store, labels, limit, tmp):
+    index = load_embedding_index(store)
+    lawyers_dict = store.profiles()
+    query_embeddings = await llm_utils.async_get_embedding(llm_utils.enhance_queries([l['query'] for l in labels]))
+    rankings = index.search_strategies(query_embeddings, [CandidateStrategy(kind='top_k', top_k=limit)] * len(labels))
+    # Separate empty caches, so neither context reuses the other's verdicts
+    caches = {context: VerdictCache(os.path.join(tmp, f"verdicts-{context}.sqlite")) for context in CONTEXTS}
+
+    rows = []
+    for label, ranked in zip(labels, rankings):
+        lawyer_urls = [url for url, _ in ranked]
+        relevant = set(label['relevant'])
+        row = {'query': label['query'], 'type': label.get('type', 'all'), 'candidates': len(lawyer_urls)}
+        for context in CONTEXTS:
+            verdicts, elapsed, prompt_tokens = await verify(lawyer_urls, lawyers_dict, label['query'], context,
+                                                            caches[context])
+            correct = sum(passed == (url in relevant) for url, passed in verdicts.items())
+            row[context] = {
+                'prompt_tokens': prompt_tokens,
+                'seconds': elapsed,
+                'accuracy': correct / len(verdicts) if verdicts else 1.0,
+                'passed': sorted(url for url, passed in verdicts.items() if passed),
+            }
+        rows.append(row)
+    return rows
+
+
+def report(rows):
+    print(f"{'query':48} {'context':9} {'in tok':>8} {'wall s':>7} {'accuracy':>9}")
+    for row in rows:
+        for context in CONTEXTS:
+            r = row[context]
+            print(f"{row['query'][:48]:48} {context:9} {r['prompt_tokens']:8} {r['seconds']:7.2f} {r['accuracy']:9.1%}")
+
+    queries = len(rows)
+    totals = {
+        context: {
+            'prompt_tokens': sum(row[context]['prompt_tokens'] for row in rows) / queries,
+            'seconds': sum(row[context]['seconds'] for row in rows) / queries,
+            'accuracy': sum(row[context]['accuracy'] for row in rows) / queries,
+        }
+        for context in CONTEXTS
+    }
+    full, relevant = totals['full'], totals['relevant']
+    print(f"\nPer query, over {queries} queries:")
+    print(f"  prompt tokens  {full['prompt_tokens']:9.0f} -> {relevant['prompt_tokens']:9.0f} "
+          f"({1 - relevant['prompt_tokens'] / max(full['prompt_tokens'], 1):.0%} saved)")
+    print(f"  wall seconds   {full['seconds']:9.2f} -> {relevant['seconds']:9.2f} "
+          f"({full['seconds'] - relevant['seconds']:.2f}s saved)")
+    print(f"  accuracy       {full['accuracy']:9.1%} -> {relevant['accuracy']:9.1%} "
+          f"({(relevant['accuracy'] - full['accuracy']) * 100:+.1f} points)")
+    return totals
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--labels', help="Labeled queries JSON for the real lawyer store")
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate fixture profiles for")
+    parser.add_argument('--limit', type=int, default=30, help="Candidates to verify per query")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock seconds per request")
+    parser.add_argument('--prompt-latency', type=float, default=0.5, help="Mock seconds per 1000 prompt tokens")
+    parser.add_argument('--json', help="Write the per-query results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.labels:
+            with open(args.labels) as f:
+                labels = json.load(f)
+            rows = await compare(open_lawyer_store(), labels, args.limit, tmp)
+        else:
+            corpus = synthetic_corpus(args.csv)
+            labels = labeled_queries(corpus)
+            mock = MockOpenAIServer(latency=args.latency, prompt_latency=args.prompt_latency)
+            use_mock_openai(await mock.start())
+            try:
+                store = LawyerStore(os.path.join(tmp, 'lawyers.sqlite'), os.path.join(tmp, 'lawyers.f32'),
+                                    os.path.join(tmp, 'chunks.f32'))
+                await build_fixture_store(store, corpus)
+                rows = await compare(store, labels, args.limit, tmp)
+            finally:
+                await mock.stop()
+
+    totals = report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'limit': args.limit, 'totals': totals, 'queries': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
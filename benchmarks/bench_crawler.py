@@ -0,0 +1,72 @@
+"""
+Compare the pooled Crawler against one aiohttp session per profile page.
+
+Serves profile pages from a local fixture server (synthetic pages for the
+lawyers in the links CSV, or saved pages with --pages-dir) and scrapes all of
+them both ways, reporting wall time, pages/sec and how many TCP connections
+each approach opened.
+
+Usage:
+    python -m benchmarks.bench_crawler --latency 0.05 --copies 4
+    python -m benchmarks.bench_crawler --pages-dir saved_pages/
+"""
+import argparse
+import asyncio
+import time
+import aiohttp
+from benchmarks.fixtures import FixtureServer, load_saved_pages, synthetic_pages
+from scraping_utils import Crawler, scrape_lawyer_profile
+
+
+async def scrape_with_session_per_url(urls):
+    """The original approach: every URL gets its own ClientSession, all launched at once."""
+    async def scrape(url):
+        async with aiohttp.ClientSession() as session:
+            return url, await scrape_lawyer_profile(url, session)
+    return await asyncio.gather(*(scrape(url) for url in urls))
+
+
+async def scrape_with_crawler(urls, args):
+    crawler = Crawler(concurrency=args.concurrency, per_host_limit=args.per_host_limit,
+                      requests_per_second=args.requests_per_second)
+    async with crawler:
+        return [result async for result in crawler.crawl(urls)]
+
+
+async def run(name, server, scrape, urls):
+    server.requests = 0
+    server.connections = set()
+    start = time.perf_counter()
+    results = await scrape(urls)
+    elapsed = time.perf_counter() - start
+    scraped = sum(1 for _, result in results if result)
+    print(f"{name:18} {elapsed:7.2f} {scraped / elapsed:9.1f} {scraped:7} {server.requests:8} {len(server.connections):11}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate synthetic pages for")
+    parser.add_argument('--pages-dir', help="Serve saved <slug>.html pages from this directory instead")
+    parser.add_argument('--copies', type=int, default=1, help="Request every page this many times")
+    parser.add_argument('--latency', type=float, default=0.02, help="Server latency per page in seconds")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--per-host-limit', type=int, default=8)
+    parser.add_argument('--requests-per-second', type=float, default=0,
+                        help="Crawler rate limit; 0 disables it for a raw throughput comparison")
+    args = parser.parse_args()
+
+    pages = load_saved_pages(args.pages_dir) if args.pages_dir else synthetic_pages(args.csv)
+    server = FixtureServer(pages, latency=args.latency)
+    await server.start()
+    urls = server.urls() * args.copies
+    try:
+        print(f"{len(urls)} page requests, {args.latency * 1000:.0f}ms server latency")
+        print(f"{'approach':18} {'wall s':>7} {'pages/s':>9} {'scraped':>7} {'requests':>8} {'connections':>11}")
+        await run('session per url', server, scrape_with_session_per_url, urls)
+        await run('pooled crawler', server, lambda u: scrape_with_crawler(u, args), urls)
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
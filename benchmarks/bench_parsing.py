@@ -0,0 +1,87 @@
+"""
+Compare profile HTML parsing paths over a corpus of profile pages.
+
+The old path parses whole pages with BeautifulSoup's html.parser on the event
+loop. The new path parses only the <main> subtree with lxml in the parse
+process pool. For each path this reports pages/sec and the longest time the
+event loop was blocked, and it checks that both paths extract the same text.
+
+Usage:
+    python -m benchmarks.bench_parsing --copies 10
+    python -m benchmarks.bench_parsing --pages-dir saved_pages/
+"""
+import argparse
+import asyncio
+import time
+from bs4 import BeautifulSoup
+from benchmarks.fixtures import load_saved_pages, synthetic_pages
+from scraping_utils import extract_main_content, get_parse_pool, run_in_parse_pool
+
+
+def extract_main_content_html_parser(html: str) -> str:
+    """The original extractor: full html.parser soup, then <main> text (with the current line separators)."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for elem in soup.find_all(['header', 'footer']):
+        elem.decompose()
+    main_content = soup.find('main') or soup.find('div', class_='main-content')
+    return (main_content or soup).get_text(separator='\n', strip=True)
+
+
+async def parse_inline(parse, pages):
+    async def parse_one(html):
+        return parse(html)
+    return await asyncio.gather(*(parse_one(html) for html in pages))
+
+
+async def parse_in_pool(pages):
+    return await asyncio.gather(*(run_in_parse_pool(extract_main_content, html) for html in pages))
+
+
+async def measure(name, parse_all, pages):
+    """Time a parsing path while a heartbeat task records the longest event loop stall."""
+    max_stall = 0.0
+    running = True
+
+    async def heartbeat():
+        nonlocal max_stall
+        loop = asyncio.get_running_loop()
+        while running:
+            before = loop.time()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, loop.time() - before - 0.001)
+
+    monitor = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    texts = await parse_all(pages)
+    elapsed = time.perf_counter() - start
+    running = False
+    await monitor
+    print(f"{name:28} {elapsed:7.2f} {len(pages) / elapsed:9.1f} {max_stall * 1000:14.1f}")
+    return texts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate synthetic pages for")
+    parser.add_argument('--pages-dir', help="Parse saved <slug>.html pages from this directory instead")
+    parser.add_argument('--copies', type=int, default=5, help="Parse every page this many times")
+    args = parser.parse_args()
+
+    corpus = load_saved_pages(args.pages_dir) if args.pages_dir else synthetic_pages(args.csv)
+    pages = list(corpus.values()) * args.copies
+    # Start the workers before timing so pool startup is not counted
+    await asyncio.gather(*(run_in_parse_pool(extract_main_content, '<main></main>')
+                           for _ in range(get_parse_pool()._max_workers)))
+
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.0f} KiB average")
+    print(f"{'path':28} {'wall s':>7} {'pages/s':>9} {'max stall ms':>14}")
+    old = await measure('html.parser on event loop', lambda p: parse_inline(extract_main_content_html_parser, p), pages)
+    await measure('lxml <main> on event loop', lambda p: parse_inline(extract_main_content, p), pages)
+    new = await measure('lxml <main> in process pool', parse_in_pool, pages)
+    mismatches = sum(a != b for a, b in zip(old, new))
+    print(f"Extracted text differs for {mismatches} of {len(pages)} pages")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
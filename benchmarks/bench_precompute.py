@@ -0,0 +1,67 @@
+"""
+Time a full precompute rebuild and a re-embed against local fixtures.
+
+Serves synthetic profile pages for every link in a CSV from the fixture server,
+answers the OpenAI calls with the mock server, and runs `update_lawyer_data`
+into an empty store followed by `reembed_lawyer_data`. For each it reports
+wall time and the embeddings and chat requests made, so the effect of batching
+embedding inputs across lawyers can be measured on a full lawyers.csv rebuild.
+
+Usage:
+    python -m benchmarks.bench_precompute --csv lawyers.csv --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from benchmarks.fixtures import FixtureServer, synthetic_pages
+from benchmarks.mock_openai import MockOpenAIServer, use_mock_openai
+from lawyer_store import LawyerStore
+from precompute import reembed_lawyer_data, update_lawyer_data
+from verdict_cache import VerdictCache
+
+
+def report(name, elapsed, counters):
+    print(f"{name:10} {elapsed:8.1f} {counters['embedding_requests']:9} {counters['embedding_inputs']:8} "
+          f"{counters['embedding_tokens']:10} {counters['chat_requests']:6}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='lawyers.csv', help="Links CSV to generate fixture profiles for")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock seconds per OpenAI request")
+    args = parser.parse_args()
+
+    fixtures = FixtureServer(synthetic_pages(args.csv))
+    await fixtures.start()
+    mock = MockOpenAIServer(latency=args.latency)
+    use_mock_openai(await mock.start())
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')]
+            start = time.perf_counter()
+            store = LawyerStore(*paths)
+            # A cache of its own, so the rebuild never touches the real verdict cache
+            cache = VerdictCache(os.path.join(tmp, 'verdicts.sqlite'))
+            await update_lawyer_data(store, lawyer_links=fixtures.urls(), cache=cache)
+            rebuilt = len(store)
+            store.close()
+            rebuild = time.perf_counter() - start, mock.counters.copy()
+
+            mock.counters.clear()
+            start = time.perf_counter()
+            await reembed_lawyer_data(*paths)
+            reembed = time.perf_counter() - start, mock.counters.copy()
+    finally:
+        await mock.stop()
+        await fixtures.stop()
+
+    print(f"\n{rebuilt} lawyers, mock latency {args.latency}s per request")
+    print(f"{'stage':10} {'wall s':>8} {'embed req':>9} {'inputs':>8} {'tokens':>10} {'chat':>6}")
+    report('rebuild', *rebuild)
+    report('reembed', *reembed)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""
+End-to-end latency benchmark of `main.process_search` over labeled queries.
+
+Builds a store of synthetic fixture profiles for the lawyers in a links CSV,
+answers every OpenAI call with the deterministic mock server, and runs each
+labeled query through `process_search` the way the REPL does: candidate
+selection from the field index, embeddings and BM25, then streamed
+verification. The queries are the README's examples plus the labeled fixture
+queries, and run one at a time with verdict and query embedding caches that
+start empty.
+
+For each query it records the time to the first and the last result, the API
+calls and tokens used, and precision and recall against the labels. --json
+writes them with a summary (p50/p95 latency, totals and mean precision and
+recall) so runs can be compared; --baseline prints how the summary moved
+against an earlier --json file.
+
+Usage:
+    python -m benchmarks.bench_search --json search.json
+    python -m benchmarks.bench_search --latency 0.3 --decode-latency 10 --baseline search.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import llm_utils
+import verifier
+from benchmarks.fixtures import build_fixture_store, labeled_queries, readme_queries, synthetic_corpus
+from benchmarks.mock_openai import MockOpenAIServer, use_mock_openai
+from constants import PRIMARY_MODEL, QUERY_EMBEDDING_CACHE_SIZE, VERDICT_CACHE_SIZE
+from embedding_cache import EmbeddingCache
+from lawyer_store import LawyerStore
+from main import process_search
+from precompute import build_lexical_index, load_embedding_index
+from query_router import route_query
+from search_index import FieldIndex
+from verdict_cache import VerdictCache
+
+# Summary metrics compared against --baseline, and whether lower is better
+SUMMARY_METRICS = {
+    'first_result_p50': True, 'first_result_p95': True, 'total_p50': True, 'total_p95': True,
+    'chat_calls': True, 'embedding_calls': True, 'prompt_tokens': True, 'completion_tokens': True,
+    'precision': False, 'recall': False,
+}
+
+
+async def run_query(label, lawyer_index, lawyers_dict, field_index, lexical_index):
+    before = llm_utils.api_usage.copy()
+    start = time.perf_counter()
+    first_result = None
+
+    def on_result(url):
+        nonlocal first_result
+        if first_result is None:
+            first_result = time.perf_counter() - start
+
+    results = await process_search(lawyer_index, label['query'], lawyers_dict, field_index=field_index,
+                                   lexical_index=lexical_index, on_result=on_result)
+    total = time.perf_counter() - start
+    usage = llm_utils.api_usage - before
+    relevant = set(label['relevant'])
+    found = len(relevant.intersection(results))
+    return {
+        'query': label['query'],
+        'type': label.get('type', 'all'),
+        'route': route_query(label['query']).kind,
+        'results': len(results),
+        'relevant': len(relevant),
+        'first_result': first_result,
+        'total': total,
+        'chat_calls': usage['chat_calls'],
+        'embedding_calls': usage['embedding_calls'],
+        'prompt_tokens': usage['chat_prompt_tokens'] + usage['embedding_prompt_tokens'],
+        'completion_tokens': usage['chat_completion_tokens'],
+        'precision': found / len(results) if results else 1.0,
+        'recall': found / len(relevant) if relevant else 1.0,
+    }
+
+
+def summarize(rows):
+    # A query with no results has no first result; count it as waiting the whole query
+    first = [row['first_result'] if row['first_result'] is not None else row['total'] for row in rows]
+    total = [row['total'] for row in rows]
+    return {
+        'queries': len(rows),
+        'first_result_p50': float(np.percentile(first, 50)),
+        'first_result_p95': float(np.percentile(first, 95)),
+        'total_p50': float(np.percentile(total, 50)),
+        'total_p95': float(np.percentile(total, 95)),
+        'chat_calls': sum(row['chat_calls'] for row in rows),
+        'embedding_calls': sum(row['embedding_calls'] for row in rows),
+        'prompt_tokens': sum(row['prompt_tokens'] for row in rows),
+        'completion_tokens': sum(row['completion_tokens'] for row in rows),
+        'precision': sum(row['precision'] for row in rows) / len(rows),
+        'recall': sum(row['recall'] for row in rows) / len(rows),
+    }
+
+
+def report(rows, summary):
+    print(f"\n{'query':48} {'route':15} {'first s':>7} {'total s':>7} {'chat':>5} {'embed':>5} "
+          f"{'in tok':>7} {'out tok':>7} {'prec.':>6} {'recall':>6}")
+    for row in rows:
+        first = f"{row['first_result']:7.2f}" if row['first_result'] is not None else f"{'-':>7}"
+        print(f"{row['query'][:48]:48} {row['route']:15} {first} {row['total']:7.2f} {row['chat_calls']:5} "
+              f"{row['embedding_calls']:5} {row['prompt_tokens']:7} {row['completion_tokens']:7} "
+              f"{row['precision']:6.0%} {row['recall']:6.0%}")
+    print(f"\n{summary['queries']} queries: first result p50 {summary['first_result_p50']:.2f}s "
+          f"p95 {summary['first_result_p95']:.2f}s, total p50 {summary['total_p50']:.2f}s "
+          f"p95 {summary['total_p95']:.2f}s")
+    print(f"  {summary['chat_calls']} chat and {summary['embedding_calls']} embedding calls, "
+          f"{summary['prompt_tokens']} prompt and {summary['completion_tokens']} completion tokens")
+    print(f"  precision {summary['precision']:.1%}, recall {summary['recall']:.1%}")
+
+
+def compare_baseline(summary, baseline):
+    print(f"\n{'metric':18} {'baseline':>10} {'now':>10} {'change':>8}")
+    for metric, lower_is_better in SUMMARY_METRICS.items():
+        old, new = baseline['summary'].get(metric), summary[metric]
+        if old is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = change > 0 if lower_is_better else change < 0
+        flag = '  worse' if worse and abs(change) > 0.05 else ''
+        print(f"{metric:18} {old:10.3f} {new:10.3f} {change:+8.1%}{flag}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate fixture profiles for")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random mock seconds per request")
+    parser.add_argument('--prompt-latency', type=float, default=0.5, help="Mock seconds per 1000 prompt tokens")
+    parser.add_argument('--decode-latency', type=float, default=10.0, help="Mock seconds per 1000 completion tokens")
+    parser.add_argument('--primary-latency', type=float, default=0.7,
+                        help="Extra mock seconds per request to PRIMARY_MODEL")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the mock's jitter")
+    parser.add_argument('--json', help="Write the per-query results and summary to this file")
+    parser.add_argument('--baseline', help="Earlier --json results to compare the summary against")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.csv)
+    labels = readme_queries(corpus) + labeled_queries(corpus)
+    mock = MockOpenAIServer(latency=args.latency, jitter=args.jitter, seed=args.seed,
+                            prompt_latency=args.prompt_latency, completion_latency=args.decode_latency,
+                            model_latency={PRIMARY_MODEL: args.primary_latency})
+    use_mock_openai(await mock.start())
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Start from empty caches, so every query pays for its own verdicts and embedding
+            verifier.verdict_cache = VerdictCache(os.path.join(tmp, 'verdicts.sqlite'), VERDICT_CACHE_SIZE)
+            # In memory only: the temporary directory is gone by the time the cache would be saved at exit
+            llm_utils.query_embedding_cache = EmbeddingCache(max_size=QUERY_EMBEDDING_CACHE_SIZE)
+            store = LawyerStore(*(os.path.join(tmp, name) for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')))
+            await build_fixture_store(store, corpus)
+            lawyers_dict = store.profiles()
+            lawyer_index = load_embedding_index(store)
+            field_index = FieldIndex.from_profiles(store.iter_structured_data())
+            lexical_index = build_lexical_index(store)
+
+            rows = []
+            for label in labels:
+                rows.append(await run_query(label, lawyer_index, lawyers_dict, field_index, lexical_index))
+            store.close()
+    finally:
+        await mock.stop()
+
+    summary = summarize(rows)
+    report(rows, summary)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_baseline(summary, json.load(f))
+    if args.json:
+        mock_config = {key: getattr(args, key) for key in
+                       ('csv', 'latency', 'jitter', 'prompt_latency', 'decode_latency', 'primary_latency', 'seed')}
+        with open(args.json, 'w') as f:
+            json.dump({'config': mock_config, 'summary': summary, 'queries': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
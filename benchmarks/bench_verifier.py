@@ -0,0 +1,141 @@
+"""
+Compare the verifier modes: one passes_criterion call per lawyer, batched
+verification, and the cascade of batched first-pass verdicts with unsure ones
+escalated to a stronger model.
+
+Runs every mode over the same candidates for each query, each with an empty
+verdict cache, and reports wall time, time to the first verdict, API calls,
+tokens and how often each mode agrees with the single-call mode. For the
+cascade it also reports the escalation rate.
+
+By default it runs against the real lawyer store and the configured API. With
+--fixtures it runs the labeled queries over the synthetic fixture profiles with
+the mock OpenAI server, and also reports accuracy against the labels. The mock
+answers take longer the more tokens they decode (--decode-latency), and
+PRIMARY_MODEL answers --primary-latency seconds slower than the mini model.
+
+Usage:
+    python -m benchmarks.bench_verifier "Lawyers who worked on a case with a TV network" --limit 40
+    python -m benchmarks.bench_verifier --fixtures --limit 30
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import llm_utils
+import verifier
+from benchmarks.fixtures import build_fixture_store, labeled_queries, synthetic_corpus
+from benchmarks.mock_openai import MockOpenAIServer, use_mock_openai
+from constants import PRIMARY_MODEL
+from lawyer_store import LawyerStore, open_lawyer_store
+from models import CandidateStrategy
+from precompute import load_embedding_index
+from verdict_cache import VerdictCache
+from verifier import verification_tasks
+
+DEFAULT_QUERIES = [
+    "Lawyers who worked on a case with a TV network",
+    "Lawyers who clerked for the Supreme Court",
+    "Lawyers who have represented pharmaceutical companies",
+]
+MODES = ('single', 'batched', 'cascade')
+
+
+async def run_mode(mode, lawyer_urls, lawyers_dict, query, cache):
+    before = llm_utils.api_usage.copy()
+    stats_before = verifier.cascade_stats.copy()
+    start = time.perf_counter()
+    first_verdict = None
+    verdicts = {}
+    for task in asyncio.as_completed(verification_tasks(lawyer_urls, lawyers_dict, query, mode=mode, cache=cache)):
+        for _, url, passed in await task:
+            if first_verdict is None:
+                first_verdict = time.perf_counter() - start
+            verdicts[url] = passed
+    elapsed = time.perf_counter() - start
+    usage = llm_utils.api_usage - before
+    escalated = (verifier.cascade_stats - stats_before)['escalated']
+    return verdicts, elapsed, first_verdict or elapsed, usage, escalated
+
+
+async def compare(store, queries, limit, tmp):
+    """Run every mode over each query's top candidates; `queries` are {"query", "relevant"?} dicts."""
+    lawyers_dict = store.profiles()
+    index = load_embedding_index(store)
+    query_embeddings = await llm_utils.async_get_embedding(llm_utils.enhance_queries([q['query'] for q in queries]))
+    rankings = index.search_strategies(query_embeddings, [CandidateStrategy(kind='top_k', top_k=limit)] * len(queries))
+    # Separate empty caches, so no mode reuses another's verdicts
+    caches = {mode: VerdictCache(os.path.join(tmp, f"verdicts-{mode}.sqlite")) for mode in MODES}
+
+    print(f"{'query':46} {'mode':8} {'wall s':>7} {'first s':>7} {'calls':>6} {'in tok':>8} {'out tok':>8} "
+          f"{'agree':>6} {'escal.':>7} {'accuracy':>9}")
+    totals = {mode: {'seconds': 0.0, 'first': 0.0, 'accuracy': 0.0, 'escalated': 0, 'verdicts': 0} for mode in MODES}
+    for q, ranked in zip(queries, rankings):
+        lawyer_urls = [url for url, _ in ranked]
+        if not lawyer_urls:
+            continue
+        results = {mode: await run_mode(mode, lawyer_urls, lawyers_dict, q['query'], caches[mode]) for mode in MODES}
+        single = results['single'][0]
+        for mode, (verdicts, elapsed, first, usage, escalated) in results.items():
+            agreement = sum(single[url] == verdicts[url] for url in lawyer_urls) / len(lawyer_urls)
+            escalation = f"{escalated / len(lawyer_urls):7.0%}" if mode == 'cascade' else f"{'':7}"
+            accuracy = ''
+            if 'relevant' in q:
+                relevant = set(q['relevant'])
+                correct = sum(verdicts[url] == (url in relevant) for url in lawyer_urls) / len(lawyer_urls)
+                totals[mode]['accuracy'] += correct * len(lawyer_urls)
+                accuracy = f"{correct:9.1%}"
+            totals[mode]['seconds'] += elapsed
+            totals[mode]['first'] += first
+            totals[mode]['escalated'] += escalated
+            totals[mode]['verdicts'] += len(lawyer_urls)
+            print(f"{q['query'][:46]:46} {mode:8} {elapsed:7.2f} {first:7.2f} {usage['chat_calls']:6} "
+                  f"{usage['chat_prompt_tokens']:8} {usage['chat_completion_tokens']:8} {agreement:6.0%} "
+                  f"{escalation} {accuracy}")
+
+    print("\nTotals:")
+    for mode, t in totals.items():
+        line = f"  {mode:8} wall {t['seconds']:7.2f}s, first verdicts after {t['first']:7.2f}s"
+        if mode == 'cascade' and t['verdicts']:
+            line += f", {t['escalated'] / t['verdicts']:.0%} escalated"
+        if 'relevant' in queries[0] and t['verdicts']:
+            line += f", accuracy {t['accuracy'] / t['verdicts']:.1%}"
+        print(line)
+    saved = totals['single']['seconds'] - totals['cascade']['seconds']
+    print(f"Cascade saves {saved:.2f}s of verification wall time over single-tier passes_criterion")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+    parser.add_argument('--limit', type=int, default=40, help="Candidates to verify per query")
+    parser.add_argument('--fixtures', action='store_true',
+                        help="Use the labeled fixture queries and profiles with the mock OpenAI server")
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate fixture profiles for")
+    parser.add_argument('--latency', type=float, default=0.3, help="Mock seconds per request")
+    parser.add_argument('--primary-latency', type=float, default=0.7,
+                        help="Extra mock seconds per request to PRIMARY_MODEL")
+    parser.add_argument('--decode-latency', type=float, default=10.0,
+                        help="Mock seconds per 1000 completion tokens")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.fixtures:
+            await compare(open_lawyer_store(), [{'query': query} for query in args.queries], args.limit, tmp)
+            return
+        corpus = synthetic_corpus(args.csv)
+        mock = MockOpenAIServer(latency=args.latency, model_latency={PRIMARY_MODEL: args.primary_latency},
+                                completion_latency=args.decode_latency)
+        use_mock_openai(await mock.start())
+        try:
+            store = LawyerStore(os.path.join(tmp, 'lawyers.sqlite'), os.path.join(tmp, 'lawyers.f32'),
+                                os.path.join(tmp, 'chunks.f32'))
+            await build_fixture_store(store, corpus)
+            await compare(store, labeled_queries(corpus), args.limit, tmp)
+        finally:
+            await mock.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
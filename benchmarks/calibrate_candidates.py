@@ -0,0 +1,130 @@
+"""
+Calibrate candidate selection strategies against a labeled query set.
+
+For every strategy (fixed threshold, top-k, relative to the best score, largest
+score gap, knee of the score curve) this reports, per query type, the mean
+recall of the candidates and how many candidates go to LLM verification. It
+then suggests the cheapest strategy that reaches the target recall for each
+type, for use in CANDIDATE_STRATEGIES.
+
+By default it runs against the synthetic fixture profiles embedded by the mock
+OpenAI server, with labels derived from the facts the profiles were generated
+from. With --labels it runs against the real lawyer store; the labels file is a
+JSON list of {"query", "type", "relevant": [lawyer urls]}.
+
+Usage:
+    python -m benchmarks.calibrate_candidates
+    python -m benchmarks.calibrate_candidates --labels labeled_queries.json --target-recall 0.9 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from collections import defaultdict
+from benchmarks.fixtures import build_fixture_store, labeled_queries, synthetic_corpus
+from benchmarks.mock_openai import MockOpenAIServer, use_mock_openai
+from lawyer_store import LawyerStore, open_lawyer_store
+from models import CandidateStrategy
+from precompute import load_embedding_index
+
+STRATEGIES = (
+    [CandidateStrategy(kind='threshold', threshold=t) for t in (0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5)]
+    + [CandidateStrategy(kind='top_k', top_k=k) for k in (10, 25, 50, 100, 150)]
+    + [CandidateStrategy(kind='relative', relative=r, top_k=150) for r in (0.6, 0.7, 0.8, 0.9)]
+    + [CandidateStrategy(kind='gap', top_k=150, min_candidates=m) for m in (1, 5, 10)]
+    + [CandidateStrategy(kind='knee', top_k=k) for k in (50, 150)]
+)
+
+
+def describe(strategy: CandidateStrategy) -> str:
+    parts = [f"{name}={value}" for name, value in strategy.model_dump(exclude={'kind'}).items()
+             if value is not None and not (name == 'min_candidates' and value == 1)]
+    return f"{strategy.kind}({', '.join(parts)})"
+
+
+async def calibrate(store, labels, target_recall):
+    import llm_utils
+    index = load_embedding_index(store)
+    queries = [label['query'] for label in labels]
+    query_embeddings = await llm_utils.async_get_embedding(llm_utils.enhance_queries(queries))
+
+    results = []
+    for strategy in STRATEGIES:
+        per_type = defaultdict(lambda: {'recall': 0.0, 'candidates': 0, 'queries': 0})
+        for label, ranked in zip(labels, index.search_strategies(query_embeddings, [strategy] * len(labels))):
+            candidates = {url for url, _ in ranked}
+            relevant = set(label['relevant'])
+            for query_type in (label.get('type', 'all'), 'overall'):
+                totals = per_type[query_type]
+                totals['recall'] += len(candidates & relevant) / len(relevant)
+                totals['candidates'] += len(candidates)
+                totals['queries'] += 1
+        results.append({
+            'strategy': strategy.model_dump(),
+            'label': describe(strategy),
+            'types': {
+                query_type: {'recall': t['recall'] / t['queries'], 'candidates': t['candidates'] / t['queries']}
+                for query_type, t in per_type.items()
+            },
+        })
+
+    types = sorted({label.get('type', 'all') for label in labels}) + ['overall']
+    recommendations = {}
+    for query_type in types:
+        reaching = [r for r in results if r['types'][query_type]['recall'] >= target_recall]
+        best = min(reaching, key=lambda r: r['types'][query_type]['candidates']) if reaching else max(
+            results, key=lambda r: (r['types'][query_type]['recall'], -r['types'][query_type]['candidates']))
+        recommendations[query_type] = {'label': best['label'], 'strategy': best['strategy'], **best['types'][query_type]}
+    return type(index).__name__, types, results, recommendations
+
+
+def report(index_name, types, results, recommendations, target_recall, lawyers):
+    print(f"{index_name} over {lawyers} lawyers; cells are mean recall / mean candidates (LLM verifications) per query")
+    print(f"{'strategy':42}" + ''.join(f"{t[:16]:>17}" for t in types))
+    for result in results:
+        cells = ''.join(f"{result['types'][t]['recall']:>9.0%} /{result['types'][t]['candidates']:>6.1f}" for t in types)
+        print(f"{result['label']:42}{cells}")
+    print(f"\nCheapest strategy reaching {target_recall:.0%} recall per query type:")
+    for query_type, best in recommendations.items():
+        print(f"  {query_type:16} {best['label']:42} recall {best['recall']:.0%}, {best['candidates']:.1f} candidates")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--labels', help="Labeled queries JSON for the real lawyer store")
+    parser.add_argument('--csv', default='test.csv', help="Links CSV to generate fixture profiles for")
+    parser.add_argument('--target-recall', type=float, default=0.95)
+    parser.add_argument('--json', help="Write the full results to this file")
+    args = parser.parse_args()
+
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+        store = open_lawyer_store()
+        lawyers = len(store)
+        index_name, types, results, recommendations = await calibrate(store, labels, args.target_recall)
+    else:
+        corpus = synthetic_corpus(args.csv)
+        labels = labeled_queries(corpus)
+        mock = MockOpenAIServer()
+        use_mock_openai(await mock.start())
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = LawyerStore(os.path.join(tmp, 'lawyers.sqlite'), os.path.join(tmp, 'lawyers.f32'),
+                                    os.path.join(tmp, 'chunks.f32'))
+                await build_fixture_store(store, corpus)
+                lawyers = len(store)
+                index_name, types, results, recommendations = await calibrate(store, labels, args.target_recall)
+        finally:
+            await mock.stop()
+
+    report(index_name, types, results, recommendations, args.target_recall, lawyers)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'index': index_name, 'target_recall': args.target_recall, 'results': results,
+                       'recommendations': recommendations}, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
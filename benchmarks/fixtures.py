@@ -0,0 +1,323 @@
+"""
+Synthetic lawyer profile pages and a local HTTP server that serves them.
+
+The live site is not reachable from benchmarks or tests, so this module
+generates deterministic profile pages shaped like Davis Polk lawyer pages
+(hero with name/title/offices, experience bullets, sidebar sections for
+practices, education, clerkships and bar admissions) for the slugs in
+test.csv or lawyers.csv. Every generated profile records the facts it was
+built from, which gives labeled ground truth for query benchmarks.
+
+Saved copies of real pages can be served instead with `load_saved_pages`.
+`labeled_queries` derives queries with known relevant lawyers from the
+generated facts, `readme_queries` labels the README's structured examples,
+and `build_fixture_store` loads the synthetic profiles into a LawyerStore
+without crawling.
+"""
+import asyncio
+import glob
+import hashlib
+import html
+import os
+import random
+from collections import Counter
+from typing import Dict, List, Optional
+from aiohttp import web
+from lawyer_store import LawyerStore
+
+PROFILE_URL = "https://www.davispolk.com/lawyers/{slug}"
+FIXTURE_NOTICE = "<!-- Synthetic fixture page generated by benchmarks/fixtures.py -->"
+
+TITLES = ["Partner", "Partner", "Counsel", "Associate", "Associate", "Senior Counsel"]
+OFFICES = ["New York", "New York", "Washington DC", "London", "Northern California", "Hong Kong"]
+LAW_SCHOOLS = [
+    "Yale Law School", "Harvard Law School", "Columbia Law School", "New York University School of Law",
+    "Stanford Law School", "University of Chicago Law School", "Georgetown University Law Center",
+]
+COLLEGES = [
+    "Princeton University", "Harvard College", "Yale University", "Cornell University", "Duke University",
+    "University of Michigan", "Brown University", "Dartmouth College",
+]
+PRACTICES = [
+    "Capital Markets", "Mergers and Acquisitions", "Antitrust and Competition", "Litigation",
+    "White Collar Defense and Investigations", "Restructuring", "Tax", "Finance",
+    "Intellectual Property and Technology", "Executive Compensation",
+]
+SUPREME_COURT_CLERKSHIPS = [
+    "Hon. John G. Roberts, Jr., Supreme Court of the United States",
+    "Hon. Sonia Sotomayor, Supreme Court of the United States",
+]
+OTHER_CLERKSHIPS = [
+    "Hon. Pierre N. Leval, U.S. Court of Appeals for the Second Circuit",
+    "Hon. Jed S. Rakoff, U.S. District Court for the Southern District of New York",
+    "Hon. Merrick B. Garland, U.S. Court of Appeals for the D.C. Circuit",
+]
+TV_NETWORK_CLIENTS = ["NBCUniversal", "CBS Broadcasting", "Fox Corporation", "ABC Television Network"]
+PHARMA_CLIENTS = ["Pfizer", "Merck & Co.", "Bristol Myers Squibb", "AbbVie"]
+OTHER_CLIENTS = [
+    "JPMorgan Chase", "Goldman Sachs", "Morgan Stanley", "Comcast Cable", "ExxonMobil", "Alphabet",
+    "Citigroup", "General Electric", "Blackstone", "Verizon",
+]
+MATTERS = [
+    "{client} in its ${size} billion acquisition of a competitor",
+    "{client} in a ${size} billion senior notes offering",
+    "{client} in securities class action litigation in the Southern District of New York",
+    "{client} in an investigation by the U.S. Department of Justice",
+    "the underwriters in {client}'s ${size} billion initial public offering",
+    "{client} in its ${size} billion credit facility",
+]
+
+
+def slug_from_url(url: str) -> str:
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+
+def name_from_slug(slug: str) -> str:
+    return ' '.join(part.capitalize() for part in slug.split('-'))
+
+
+def generate_profile(slug: str) -> Dict:
+    """Deterministically generate the facts of one synthetic lawyer profile."""
+    rng = random.Random(slug)
+    law_year = rng.randint(1985, 2022)
+    education = [
+        {"school": rng.choice(LAW_SCHOOLS), "degree": "J.D.", "year": law_year},
+        {"school": rng.choice(COLLEGES), "degree": rng.choice(["B.A.", "A.B.", "B.S."]), "year": law_year - 3},
+    ]
+    clerkships = []
+    if rng.random() < 0.12:
+        clerkships.append(rng.choice(SUPREME_COURT_CLERKSHIPS))
+    if rng.random() < 0.25:
+        clerkships.append(rng.choice(OTHER_CLERKSHIPS))
+    clients = rng.sample(OTHER_CLIENTS, 3)
+    if rng.random() < 0.12:
+        clients.append(rng.choice(TV_NETWORK_CLIENTS))
+    if rng.random() < 0.2:
+        clients.append(rng.choice(PHARMA_CLIENTS))
+    rng.shuffle(clients)
+    experience = [
+        "Represented " + rng.choice(MATTERS).format(client=client, size=rng.randint(1, 40)) for client in clients
+    ]
+    return {
+        "slug": slug,
+        "name": name_from_slug(slug),
+        "title": rng.choice(TITLES),
+        "offices": [rng.choice(OFFICES)],
+        "email": f"{slug.replace('-', '.')}@davispolk.com",
+        "phone": f"+1 212 450 {rng.randint(1000, 9999)}",
+        "practice_areas": rng.sample(PRACTICES, rng.randint(1, 3)),
+        "education": education,
+        "clerkships": clerkships,
+        "bar_admissions": rng.sample(["New York", "District of Columbia", "California", "England and Wales"], 1),
+        "experience": experience,
+        "clients": clients,
+        "facts": {
+            "tv_network": any(c in TV_NETWORK_CLIENTS for c in clients),
+            "pharma": any(c in PHARMA_CLIENTS for c in clients),
+            "supreme_court": any(c in SUPREME_COURT_CLERKSHIPS for c in clerkships),
+        },
+    }
+
+
+def render_profile(profile: Dict) -> str:
+    """Render a synthetic profile as an HTML page."""
+    e = html.escape
+
+    def items(values: List[str]) -> str:
+        return ''.join(f"<li>{e(v)}</li>" for v in values)
+
+    education = [f"{d['degree']}, {d['school']}, {d['year']}" for d in profile['education']]
+    practices = ''.join(
+        f'<li><a href="/practices/{p.lower().replace(" ", "-")}">{e(p)}</a></li>' for p in profile['practice_areas']
+    )
+    offices = ''.join(f'<a href="/offices/{o.lower().replace(" ", "-")}">{e(o)}</a>' for o in profile['offices'])
+    clerkships = (
+        f"<div class=\"lawyer-sidebar__section\"><h3>Clerkships</h3><ul>{items(profile['clerkships'])}</ul></div>"
+        if profile['clerkships'] else ""
+    )
+    return f"""<!DOCTYPE html>
+<html lang="en">
+{FIXTURE_NOTICE}
+<head><title>{e(profile['name'])} | Davis Polk</title></head>
+<body>
+<header class="site-header"><nav><ul><li><a href="/lawyers">Lawyers</a></li><li><a href="/practices">Practices</a></li>
+<li><a href="/insights">Insights</a></li><li><a href="/offices">Offices</a></li></ul></nav></header>
+<main id="main-content">
+<section class="lawyer-hero">
+<h1 class="lawyer-hero__name">{e(profile['name'])}</h1>
+<div class="lawyer-hero__title">{e(profile['title'])}</div>
+<div class="lawyer-hero__offices">{offices}</div>
+<div class="lawyer-hero__contact"><a href="mailto:{e(profile['email'])}">{e(profile['email'])}</a>
+<a href="tel:{e(profile['phone'])}">{e(profile['phone'])}</a></div>
+</section>
+<section class="lawyer-overview"><p>{e(profile['name'])} is a {e(profile['title'].lower())} in Davis Polk's
+{e(profile['practice_areas'][0])} practice.</p></section>
+<section class="lawyer-experience"><h2>Experience</h2><ul>{items(profile['experience'])}</ul></section>
+<aside class="lawyer-sidebar">
+<div class="lawyer-sidebar__section"><h3>Practices</h3><ul>{practices}</ul></div>
+<div class="lawyer-sidebar__section"><h3>Education</h3><ul>{items(education)}</ul></div>
+{clerkships}
+<div class="lawyer-sidebar__section"><h3>Bar admissions</h3><ul>{items(profile['bar_admissions'])}</ul></div>
+</aside>
+</main>
+<footer class="site-footer"><p>Attorney Advertising. Prior results do not guarantee a similar outcome.</p>
+<ul><li><a href="/privacy">Privacy notice</a></li><li><a href="/cookies">Cookie policy</a></li></ul></footer>
+</body>
+</html>"""
+
+
+def load_slugs(csv_file: str = 'test.csv') -> List[str]:
+    with open(csv_file) as f:
+        return [slug_from_url(line.strip()) for line in f if line.strip()]
+
+
+def synthetic_corpus(csv_file: str = 'test.csv') -> Dict[str, Dict]:
+    """Generate a synthetic profile for every lawyer slug in a links CSV."""
+    return {slug: generate_profile(slug) for slug in load_slugs(csv_file)}
+
+
+def synthetic_pages(csv_file: str = 'test.csv') -> Dict[str, str]:
+    return {slug: render_profile(profile) for slug, profile in synthetic_corpus(csv_file).items()}
+
+
+def labeled_queries(corpus: Dict[str, Dict]) -> List[Dict]:
+    """
+    Queries with the profile URLs that truly match them, from the facts the profiles were generated from.
+
+    Returns:
+        List[Dict]: {"query", "type", "relevant": [urls]} for every query with at least one match.
+    """
+    queries = []
+
+    def add(query, query_type, matches):
+        relevant = sorted(PROFILE_URL.format(slug=slug) for slug, profile in corpus.items() if matches(profile))
+        if relevant:
+            queries.append({"query": query, "type": query_type, "relevant": relevant})
+
+    add("Lawyers who worked on a case with a TV network", 'client_industry', lambda p: p['facts']['tv_network'])
+    add("Lawyers who have represented pharmaceutical companies", 'client_industry', lambda p: p['facts']['pharma'])
+    add("Lawyers who clerked for the Supreme Court", 'clerkship', lambda p: p['facts']['supreme_court'])
+    add("Lawyers who clerked on the Second Circuit", 'clerkship',
+        lambda p: any('Second Circuit' in clerkship for clerkship in p['clerkships']))
+    for client in TV_NETWORK_CLIENTS[:2] + PHARMA_CLIENTS[:2] + OTHER_CLIENTS[:4]:
+        add(f"Lawyers who represented {client}", 'client', lambda p, client=client: client in p['clients'])
+    for school in LAW_SCHOOLS[:4]:
+        add(f"Lawyers who went to {school}", 'school',
+            lambda p, school=school: any(d['school'] == school for d in p['education']))
+    for practice in PRACTICES[:4]:
+        add(f"Lawyers who work on {practice} matters", 'practice_area',
+            lambda p, practice=practice: practice in p['practice_areas'])
+    return queries
+
+
+def readme_queries(corpus: Dict[str, Dict]) -> List[Dict]:
+    """
+    The README's example queries that the field index answers, labeled like `labeled_queries`.
+
+    The name query uses the most common first name in the corpus, so it has matches.
+    """
+    first_names = Counter(profile['name'].split()[0] for profile in corpus.values())
+    name = first_names.most_common(1)[0][0]
+
+    def label(query, query_type, matches):
+        relevant = sorted(PROFILE_URL.format(slug=slug) for slug, profile in corpus.items() if matches(profile))
+        return {"query": query, "type": query_type, "relevant": relevant}
+
+    return [
+        label(f"Lawyers named {name}", 'name', lambda p: name in p['name'].split()),
+        label("Lawyers who went to Yale", 'school', lambda p: any('Yale' in d['school'] for d in p['education'])),
+        label("Lawyers who graduated law school after 2015", 'graduation_year',
+              lambda p: any(d['degree'] == 'J.D.' and d['year'] > 2015 for d in p['education'])),
+    ]
+
+
+async def build_fixture_store(store: LawyerStore, corpus: Dict[str, Dict], concurrency: int = 16) -> LawyerStore:
+    """
+    Parse, structure and embed synthetic profiles straight into a store, as precompute would after crawling.
+
+    Embeddings come from whichever OpenAI client llm_utils is configured with,
+    normally the mock server (see `benchmarks.mock_openai.use_mock_openai`).
+    """
+    from precompute import structure_and_embed
+    from scraping_utils import parse_profile_html
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def build(slug, profile):
+        raw_content, structured_data = parse_profile_html(render_profile(profile))
+        async with semaphore:
+            record = await structure_and_embed({"raw_content": raw_content, "structured_data": structured_data})
+        return PROFILE_URL.format(slug=slug), record
+
+    for url, record in await asyncio.gather(*(build(slug, profile) for slug, profile in corpus.items())):
+        store.add(url, record["raw_content"], record["structured_data"], record["embedding"])
+        store.add_chunks(url, record["chunks"])
+    return store
+
+
+def load_saved_pages(directory: str) -> Dict[str, str]:
+    """Load saved profile pages named <slug>.html from a directory."""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+class FixtureServer:
+    """
+    Local HTTP server for profile pages at /lawyers/<slug>.
+
+    Tracks the number of requests and distinct client connections so crawlers
+    can be compared on connection reuse. Supports ETag validators, and can
+    answer the next requests with an error status to exercise retries.
+    """
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.0):
+        self.pages = pages
+        self.latency = latency
+        self.requests = 0
+        self.connections = set()
+        self.scripted_failures: List[int] = []
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def fail_next(self, status: int, count: int = 1):
+        """Answer the next `count` requests with the given HTTP status."""
+        self.scripted_failures.extend([status] * count)
+
+    def url(self, slug: str) -> str:
+        return f"{self.base_url}/lawyers/{slug}"
+
+    def urls(self) -> List[str]:
+        return [self.url(slug) for slug in self.pages]
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get('/lawyers/{slug}', self._profile)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _profile(self, request: web.Request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.scripted_failures:
+            return web.Response(status=self.scripted_failures.pop(0))
+        page = self.pages.get(request.match_info['slug'])
+        if page is None:
+            raise web.HTTPNotFound()
+        # Stable across processes, unlike hash(), so stored validators stay valid between runs
+        etag = f'"{hashlib.sha1(page.encode("utf-8")).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=page, content_type='text/html', headers={'ETag': etag})
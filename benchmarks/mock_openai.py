@@ -0,0 +1,263 @@
+"""
+Deterministic local mock of the OpenAI HTTP API.
+
+Serves /v1/embeddings and /v1/chat/completions with configurable latency and
+injected failures, so the request scheduler, benchmarks and tests can run
+without network access or API credits. Point the clients at it with the
+OPENAI_BASE_URL environment variable.
+
+Embeddings are hashed bag-of-words vectors, so texts that share words are
+similar. Verdicts are decided by keyword overlap between the requirement and
+the lawyer's profile.
+
+Usage:
+    python -m benchmarks.mock_openai --port 8765 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+import numpy as np
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+from aiohttp import web
+from openai import AsyncOpenAI, OpenAI
+from search_index import lexical_tokens
+
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+}
+# Words that say what kind of match is wanted rather than what to match on
+GENERIC_WORDS = {'case', 'cases', 'named', 'went', 'represented', 'companies', 'company', 'clients', 'client',
+                 'graduated', 'clerked', 'school', 'who', 'has', 'have', 'been', 'matter', 'matters'}
+
+
+def mock_embedding(text: str, dim: int) -> np.ndarray:
+    """Hashed bag-of-words float32 embedding; deterministic across runs and processes."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in lexical_tokens(text):
+        digest = hashlib.md5(token.encode()).digest()
+        vector[int.from_bytes(digest[:4], 'little') % dim] += 1.0
+        vector[int.from_bytes(digest[4:8], 'little') % dim] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_embedding(vector: np.ndarray, encoding_format: Optional[str]):
+    """Encode a vector like the API: base64 of its float32 bytes, or a list of floats."""
+    if encoding_format == 'base64':
+        return base64.b64encode(vector.astype(np.float32).tobytes()).decode('ascii')
+    return vector.tolist()
+
+
+def mock_match(requirement: str, profile: str) -> float:
+    """Fraction of the requirement's content words that appear in the profile."""
+    wanted = {t for t in lexical_tokens(requirement) if t not in GENERIC_WORDS}
+    if not wanted:
+        return 0.0
+    return len(wanted & set(lexical_tokens(profile))) / len(wanted)
+
+
+def mock_judge(requirement: str, profile: str) -> bool:
+    """Pass a lawyer when most of the requirement's content words appear in the profile."""
+    return mock_match(requirement, profile) >= 0.5
+
+
+def mock_confidence(requirement: str, profile: str) -> float:
+    """Confidence in `mock_judge`'s verdict: 1 when no or all words match, 0 right at the pass mark."""
+    return round(abs(mock_match(requirement, profile) - 0.5) * 2, 2)
+
+
+def default_responder(body: dict) -> str:
+    """Produce a chat completion for the prompts used in this repo."""
+    messages = body.get('messages', [])
+    system = ' '.join(m['content'] for m in messages if m['role'] == 'system')
+    user = ' '.join(m['content'] for m in messages if m['role'] == 'user')
+
+    if '<lawyer id=' in user:
+        requirement = re.search(r"Requirement:\s*(.*)", user).group(1)
+        profiles = re.findall(r'<lawyer id="(\d+)">(.*?)</lawyer>', user, re.DOTALL)
+        return json.dumps({"results": [
+            {"id": int(i), "answer": "Pass" if mock_judge(requirement, text) else "Fail",
+             "confidence": mock_confidence(requirement, text)}
+            for i, text in profiles
+        ]})
+    if '<answer>' in system:
+        requirement = re.search(r"requirement:\s*(.*)", user).group(1)
+        profile = user.split("profile:", 1)[-1]
+        verdict = "Pass" if mock_judge(requirement, profile) else "Fail"
+        # Walk through the profile like a real chain of thought, so reasoning answers run long
+        thinking = ' '.join([f"The requirement is: {requirement}."]
+                            + [f"The profile says {line.strip()}." for line in profile.splitlines() if line.strip()]
+                            + [f"So the lawyer {'meets' if verdict == 'Pass' else 'does not meet'} it."])
+        return f"<thinking>{thinking}</thinking><answer>{verdict}</answer>"
+    if 'JSON' in system or 'JSON' in user:
+        text = user.rsplit(':', 1)[-1].strip()
+        return json.dumps({"summary": ' '.join(text.split())[:500]})
+    return "OK"
+
+
+def use_mock_openai(base_url: str):
+    """Point the shared llm_utils clients at a mock server for the rest of the process."""
+    import llm_utils
+    llm_utils.openai_client = OpenAI(api_key='mock', base_url=base_url)
+    llm_utils.client = AsyncOpenAI(api_key='mock', base_url=base_url, max_retries=0,
+                                   timeout=llm_utils.OPENAI_TIMEOUT)
+
+
+class MockOpenAIServer:
+    """
+    In-process mock OpenAI server.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        prompt_latency (float): Extra seconds per 1000 prompt tokens of a chat request, like the time
+            a real model spends reading its input before the first token.
+        model_latency (Dict[str, float]): Extra seconds per request to the given models.
+        completion_latency (float): Extra seconds per 1000 completion tokens of a chat answer, like
+            a real model's decoding time.
+        jitter (float): Extra random latency of up to this many seconds.
+        failure_rate (float): Fraction of requests answered with a random 429 or 500.
+        retry_after (str, optional): Retry-After header sent with failures; None sends none, so
+            clients fall back to their own backoff.
+        responder (Callable[[dict], str]): Builds the assistant message for a chat request.
+        seed (int): Seed for jitter and failure injection.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 responder: Callable[[dict], str] = default_responder, seed: int = 0, prompt_latency: float = 0.0,
+                 model_latency: Optional[Dict[str, float]] = None, completion_latency: float = 0.0,
+                 retry_after: Optional[str] = '0'):
+        self.latency = latency
+        self.prompt_latency = prompt_latency
+        self.model_latency = model_latency or {}
+        self.completion_latency = completion_latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.responder = responder
+        self.random = random.Random(seed)
+        self.scripted_failures: List[int] = []
+        self.counters: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def fail_next(self, status: int, count: int = 1):
+        """Answer the next `count` requests with the given HTTP status."""
+        self.scripted_failures.extend([status] * count)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1/embeddings', self._embeddings)
+        app.router.add_post('/v1/chat/completions', self._chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/v1"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, endpoint: str, request: web.Request, build: Callable[[dict], Dict]):
+        body = await request.json()
+        self.counters[f"{endpoint}_requests"] += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency + self.random.uniform(0, self.jitter) + self.model_latency.get(body.get('model'), 0.0)
+            if endpoint == 'chat':
+                delay += self.prompt_latency * self._prompt_tokens(body) / 1000
+            await asyncio.sleep(delay)
+            status = self.scripted_failures.pop(0) if self.scripted_failures else None
+            if status is None and self.random.random() < self.failure_rate:
+                status = self.random.choice([429, 500])
+            if status is not None:
+                self.counters[f"{endpoint}_errors"] += 1
+                error = {"error": {"message": f"Mock error {status}", "type": "mock_error", "code": None}}
+                headers = {'retry-after': self.retry_after} if self.retry_after is not None else {}
+                return web.json_response(error, status=status, headers=headers)
+            response = build(body)
+            if endpoint == 'chat':
+                await asyncio.sleep(self.completion_latency * response['usage']['completion_tokens'] / 1000)
+            return web.json_response(response)
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _prompt_tokens(body: dict) -> int:
+        return sum(len(m.get('content') or '') for m in body.get('messages', [])) // 4 + 1
+
+    async def _embeddings(self, request: web.Request):
+        def build(body):
+            inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+            dim = body.get('dimensions') or EMBEDDING_DIMENSIONS.get(body['model'], 256)
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            self.counters['embedding_inputs'] += len(inputs)
+            self.counters['embedding_tokens'] += tokens
+            return {
+                "object": "list",
+                "model": body['model'],
+                "data": [
+                    {"object": "embedding", "index": i,
+                     "embedding": encode_embedding(mock_embedding(text, dim), body.get('encoding_format'))}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        return await self._handle('embedding', request, build)
+
+    async def _chat(self, request: web.Request):
+        def build(body):
+            content = self.responder(body)
+            prompt_tokens = self._prompt_tokens(body)
+            completion_tokens = len(content) // 4 + 1
+            self.counters['chat_prompt_tokens'] += prompt_tokens
+            self.counters['chat_completion_tokens'] += completion_tokens
+            return {
+                "id": f"chatcmpl-mock-{self.counters['chat_requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body['model'],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        return await self._handle('chat', request, build)
+
+
+async def serve(args):
+    server = MockOpenAIServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate)
+    base_url = await server.start(port=args.port)
+    print(f"Mock OpenAI API listening on {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    asyncio.run(serve(parser.parse_args()))
@@ -1,8 +1,89 @@
 EMBEDDING_CUTOFF = 0.3
-IS_DEBUG_MODE = False
+IS_DEBUG_MODE = False  # log at DEBUG: every tracing span, prompt and retry
+LOG_LEVEL = 'WARNING'  # log level when IS_DEBUG_MODE is off
+LOG_FORMAT = 'text'  # 'text' for key=value log lines, 'json' for one JSON object per line
+TRACE_HISTORY = 100  # finished traces kept for the REPL's Stats command
 PRIMARY_MODEL = 'gpt-4o'
 MINI_MODEL = 'gpt-4o-mini'
 EMBEDDING_MODEL_LARGE = "text-embedding-3-large"
 EMBEDDING_MODEL_SMALL = "text-embedding-3-small"
+EMBEDDING_BACKEND = 'openai'  # 'openai', or 'sentence_transformers' for a local model with no network calls
+LOCAL_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+LOCAL_EMBEDDING_DEVICE = None  # None lets sentence_transformers pick (CUDA if available, else CPU)
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+# Model each embedding backend produces vectors with
+EMBEDDING_MODELS = {
+    'openai': EMBEDDING_MODEL_LARGE,
+    'sentence_transformers': LOCAL_EMBEDDING_MODEL,
+}
 OPENAI_KEY = 'your_api_key'
-IS_TEST = False
\ No newline at end of file
+IS_TEST = False
+LAWYER_DB_PATH = 'lawyer_data.sqlite'
+LAWYER_EMBEDDINGS_PATH = 'lawyer_embeddings.f32'
+LAWYER_CHUNK_EMBEDDINGS_PATH = 'lawyer_chunk_embeddings.f32'
+LEGACY_LAWYER_DATA_PATH = 'lawyer_data.json'
+QUERY_EMBEDDING_CACHE_PATH = 'query_embedding_cache.pkl'
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_SAVE_INTERVAL = 60  # Seconds between background writes of the query embedding cache
+LEXICAL_INDEX_PATH = 'lawyer_bm25.npz'
+LEXICAL_TOP_K = 100
+LEXICAL_MAX_DOC_FREQ = 0.25  # BM25 hits only count query terms found in at most this fraction of profiles
+RRF_K = 60
+# The fused candidates are capped at this multiple of the cosine cut, but never below HYBRID_MIN_CANDIDATES,
+# so rare-term hits can still be verified for queries the embeddings miss entirely
+HYBRID_CANDIDATE_RATIO = 1.0
+HYBRID_MIN_CANDIDATES = 20
+VERIFY_MODE = 'cascade'  # 'batched' for one tier of batched checks, 'single' for one passes_criterion call per lawyer
+# Verification cascade per query route kind, as VerifyCascade fields; kinds without an entry use 'free_form'
+VERIFY_CASCADES = {
+    'free_form': {'first_model': MINI_MODEL, 'escalation_model': PRIMARY_MODEL, 'min_confidence': 0.8, 'batch_size': 5},
+}
+VERIFY_BATCH_MAX_SIZE = 20
+VERIFY_BATCH_TOKEN_BUDGET = 12000
+VERIFY_CONTEXT = 'relevant'  # 'full' sends the whole structured profile to the verifier
+VERIFY_CONTEXT_TOKEN_BUDGET = 300
+OPENAI_BASE_URL = None  # None uses the OPENAI_BASE_URL environment variable or the public API
+OPENAI_TIMEOUT = 60
+OPENAI_MAX_RETRIES = 6
+CHAT_COMPLETION_TOKEN_ESTIMATE = 300
+DEFAULT_MODEL_CONCURRENCY = 32
+MODEL_CONCURRENCY = {
+    PRIMARY_MODEL: 16,
+    MINI_MODEL: 64,
+    EMBEDDING_MODEL_LARGE: 16,
+    EMBEDDING_MODEL_SMALL: 16,
+}
+MODEL_TOKENS_PER_MINUTE = {
+    PRIMARY_MODEL: 450_000,
+    MINI_MODEL: 2_000_000,
+    EMBEDDING_MODEL_LARGE: 1_000_000,
+    EMBEDDING_MODEL_SMALL: 1_000_000,
+}
+VERDICT_CACHE_PATH = 'verdict_cache.sqlite'
+VERDICT_CACHE_SIZE = 200_000
+PRECOMPUTE_CONCURRENCY = 32
+PRECOMPUTE_MAX_ATTEMPTS = 3
+# Precompute packs texts from many lawyers into each embeddings request, up to these limits
+EMBEDDING_BATCH_TOKEN_BUDGET = 100_000
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_BATCH_MAX_WAIT = 2.0  # Seconds a partly filled batch waits for more texts before it is sent
+CRAWL_CONCURRENCY = 16
+CRAWL_PER_HOST_LIMIT = 8
+CRAWL_REQUESTS_PER_SECOND = 10
+CRAWL_TIMEOUT = 30
+CRAWL_CONNECT_TIMEOUT = 10
+CRAWL_KEEPALIVE_TIMEOUT = 30
+CRAWL_MAX_RETRIES = 3
+PARSE_WORKERS = None  # Processes for HTML parsing; None uses one per CPU
+# Profile fields asked from the LLM when they cannot be extracted from the page structure
+LLM_FALLBACK_FIELDS = ('name', 'education', 'practice_areas', 'experience')
+CHUNK_EMBEDDING_CUTOFF = 0.4  # Max-sim over section chunks scores specific matches higher than whole profiles
+CHUNK_MAX_WORDS = 120
+CHUNK_MAX_PER_LAWYER = 40
+# Candidate selection per query route kind; calibrate with `python -m benchmarks.calibrate_candidates`.
+# A 'threshold' strategy without a threshold uses the index's cutoff (EMBEDDING_CUTOFF or CHUNK_EMBEDDING_CUTOFF).
+CANDIDATE_STRATEGIES = {
+    'free_form': {'kind': 'threshold'},
+}
+SERVER_HOST = '127.0.0.1'  # Interface the search server (server.py) listens on
+SERVER_PORT = 8080
@@ -0,0 +1,132 @@
+import atexit
+import logging
+import os
+import pickle
+import re
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Writes cache files off the search path; one worker, so writes of a cache never overlap
+_save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding-cache')
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookups: lowercase, drop punctuation, collapse whitespace."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings keyed by (model, normalized text).
+
+    Entries are persisted to a pickle file so the cache survives restarts. The
+    file is read on first use rather than when the cache is created, and
+    written by `save_soon` in a background thread at most every
+    `save_interval` seconds, plus once more at interpreter exit, so a cache
+    miss never waits for the whole cache to be pickled.
+    Hit and miss counters cover the lifetime of the process.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = 1024, save_interval: float = 60.0):
+        # Resolved now, since the file is read and written later, possibly after a chdir
+        self.path = os.path.abspath(path) if path else None
+        self.max_size = max_size
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], np.ndarray]' = OrderedDict()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._saving: Optional[Future] = None
+        if path:
+            atexit.register(self.save)
+
+    def __len__(self) -> int:
+        self._load_once()
+        return len(self._entries)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        self._load_once()
+        key = (model, normalize_text(text))
+        embedding = self._entries.get(key)
+        if embedding is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return embedding.tolist()
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        self._load_once()
+        key = (model, normalize_text(text))
+        self._entries[key] = np.asarray(embedding, dtype=np.float32)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def stats(self) -> Dict[str, float]:
+        self._load_once()
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning("Ignoring unreadable embedding cache %s: %s", self.path, e)
+            return
+        # Entries put before the file was read are newer than any in it
+        entries = OrderedDict(entries)
+        entries.update(self._entries)
+        self._entries = OrderedDict(list(entries.items())[-self.max_size:])
+
+    def save_soon(self):
+        """Write the cache in a background thread if it changed and the last write is `save_interval` old."""
+        if not self.path or not self._dirty or time.monotonic() - self._last_save < self.save_interval:
+            return
+        if self._saving is not None and not self._saving.done():
+            return
+        self._last_save = time.monotonic()
+        self._saving = _save_executor.submit(self._write, self._snapshot())
+
+    def save(self):
+        """Atomically write the cache to disk now if it changed since the last save."""
+        if self._saving is not None:
+            self._saving.result()
+        if not self.path or not self._dirty:
+            return
+        self._write(self._snapshot())
+
+    def _load_once(self):
+        if not self._loaded:
+            self._loaded = True
+            if self.path and os.path.exists(self.path):
+                self.load()
+
+    def _snapshot(self) -> List[Tuple[Tuple[str, str], np.ndarray]]:
+        # Taken on the caller's thread, so the writer never iterates the live dict
+        self._dirty = False
+        return list(self._entries.items())
+
+    def _write(self, entries: List[Tuple[Tuple[str, str], np.ndarray]]):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save embedding cache %s: %s", self.path, e)
+            self._dirty = True
@@ -0,0 +1,376 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from constants import LAWYER_DB_PATH, LAWYER_EMBEDDINGS_PATH, LAWYER_CHUNK_EMBEDDINGS_PATH, LEGACY_LAWYER_DATA_PATH
+from constants import LEXICAL_INDEX_PATH
+from constants import EMBEDDING_BACKEND, EMBEDDING_MODELS, EMBEDDING_MODEL_LARGE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lawyers (
+    url TEXT PRIMARY KEY,
+    row INTEGER NOT NULL,
+    raw_content TEXT NOT NULL,
+    structured_data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    content_hash TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    chunked_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    url TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_url ON chunks (url);
+CREATE TABLE IF NOT EXISTS failures (
+    url TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    last_error TEXT NOT NULL,
+    last_attempt REAL NOT NULL
+);
+"""
+# Columns added after the first release, created on open for older databases
+LAWYER_COLUMN_MIGRATIONS = {
+    'content_hash': "ALTER TABLE lawyers ADD COLUMN content_hash TEXT",
+    'etag': "ALTER TABLE lawyers ADD COLUMN etag TEXT",
+    'last_modified': "ALTER TABLE lawyers ADD COLUMN last_modified TEXT",
+    'chunked_at': "ALTER TABLE lawyers ADD COLUMN chunked_at REAL",
+}
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def configured_embedding_space() -> Tuple[str, str]:
+    """The (backend, model) that the configured EMBEDDING_BACKEND embeds with."""
+    return EMBEDDING_BACKEND, EMBEDDING_MODELS[EMBEDDING_BACKEND]
+
+
+class LawyerStore:
+    """
+    Persistent lawyer data split into a SQLite profile table and a binary embedding file.
+
+    Embeddings are L2-normalized float32 rows appended to a flat binary file and
+    memory-mapped on load, so startup never parses vectors. The `lawyers` table
+    is the URL -> row manifest and holds the profile text and structured data,
+    which are only decoded when a profile is accessed.
+
+    Each lawyer can also have section chunks (education, clerkships, single
+    matters, ...) whose vectors live in a second binary file, referenced from
+    the `chunks` table the same way.
+
+    The embedding backend and model that produced the vectors are recorded in
+    `meta`; opening the store with a different `embedding_space` raises instead
+    of mixing vectors from two models.
+    """
+
+    def __init__(self, db_path: str = LAWYER_DB_PATH, embeddings_path: str = LAWYER_EMBEDDINGS_PATH,
+                 chunk_embeddings_path: str = LAWYER_CHUNK_EMBEDDINGS_PATH,
+                 embedding_space: Optional[Tuple[str, str]] = None):
+        self.db_path = db_path
+        self.embeddings_path = embeddings_path
+        self.chunk_embeddings_path = chunk_embeddings_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.dim = self._get_meta('dim', int)
+        self._rows = self._count_rows_on_disk(embeddings_path)
+        self._chunk_rows = self._count_rows_on_disk(chunk_embeddings_path)
+        if embedding_space is not None:
+            self.check_embedding_space(embedding_space)
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def lexical_index_path(self) -> str:
+        """Where the BM25 index over this store is saved: next to its database, wherever the process runs."""
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), LEXICAL_INDEX_PATH)
+
+    @property
+    def embedding_space(self) -> Optional[Tuple[str, str]]:
+        """The (backend, model) the stored vectors were embedded with, if known."""
+        backend, model = self._get_meta('embedding_backend'), self._get_meta('embedding_model')
+        if backend is None and self.dim is not None:
+            # Stores written before backends were recorded only ever held OpenAI vectors
+            return 'openai', EMBEDDING_MODEL_LARGE
+        return (backend, model) if backend is not None else None
+
+    def check_embedding_space(self, embedding_space: Tuple[str, str]):
+        """Record the embedding space of a new store, or raise if the store holds vectors from another one."""
+        recorded = self.embedding_space
+        if recorded is None or self._get_meta('embedding_backend') is None:
+            self._set_meta('embedding_backend', (recorded or embedding_space)[0])
+            self._set_meta('embedding_model', (recorded or embedding_space)[1])
+            recorded = recorded or tuple(embedding_space)
+        if tuple(recorded) != tuple(embedding_space):
+            raise ValueError(
+                f"{self.db_path} holds embeddings from {recorded[0]} model {recorded[1]}, but the configured "
+                f"backend is {embedding_space[0]} model {embedding_space[1]}. Re-embed the stored profiles with "
+                f"`python precompute.py --reembed` or configure the original backend."
+            )
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM lawyers").fetchone()[0]
+
+    def __contains__(self, url: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM lawyers WHERE url = ?", (url,)).fetchone() is not None
+
+    def urls(self) -> List[str]:
+        return [url for url, in self.conn.execute("SELECT url FROM lawyers ORDER BY row")]
+
+    def manifest(self) -> Tuple[List[str], np.ndarray]:
+        """Return lawyer URLs and their embedding rows, ordered by row."""
+        pairs = self.conn.execute("SELECT url, row FROM lawyers ORDER BY row").fetchall()
+        return [url for url, _ in pairs], np.array([row for _, row in pairs], dtype=np.int64)
+
+    def vectors(self) -> np.ndarray:
+        """Memory-map every embedding row on disk, shape (rows, dim)."""
+        return self._memmap(self.embeddings_path, self._rows)
+
+    def chunk_manifest(self) -> Tuple[List[str], List[str], np.ndarray]:
+        """Return the owning lawyer URL, section and embedding row of every chunk, grouped by lawyer."""
+        found = self.conn.execute(
+            "SELECT chunks.url, chunks.section, chunks.row FROM chunks JOIN lawyers USING (url) "
+            "ORDER BY lawyers.row, chunks.row"
+        ).fetchall()
+        return ([url for url, _, _ in found], [section for _, section, _ in found],
+                np.array([row for _, _, row in found], dtype=np.int64))
+
+    def chunk_vectors(self) -> np.ndarray:
+        """Memory-map every chunk embedding row on disk, shape (chunk rows, dim)."""
+        return self._memmap(self.chunk_embeddings_path, self._chunk_rows)
+
+    def chunk_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def urls_without_chunks(self) -> List[str]:
+        """Lawyers that were never split into chunks; a profile too short to yield any counts as split."""
+        # Lawyers chunked before chunked_at was recorded are known by their chunk rows
+        query = ("SELECT url FROM lawyers WHERE chunked_at IS NULL AND url NOT IN (SELECT url FROM chunks) "
+                 "ORDER BY row")
+        return [url for url, in self.conn.execute(query)]
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Load a single profile's raw content and structured data."""
+        found = self.conn.execute(
+            "SELECT raw_content, structured_data FROM lawyers WHERE url = ?", (url,)
+        ).fetchone()
+        if found is None:
+            return None
+        raw_content, structured_data = found
+        return {"raw_content": raw_content, "structured_data": json.loads(structured_data)}
+
+    def iter_structured_data(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (url, structured_data) for every lawyer without caching the profiles."""
+        for url, structured_data in self.conn.execute("SELECT url, structured_data FROM lawyers ORDER BY row"):
+            yield url, json.loads(structured_data)
+
+    def iter_profiles(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Yield (url, raw_content, structured_data) for every lawyer without caching the profiles."""
+        query = "SELECT url, raw_content, structured_data FROM lawyers ORDER BY row"
+        for url, raw_content, structured_data in self.conn.execute(query):
+            yield url, raw_content, json.loads(structured_data)
+
+    def fingerprint(self) -> str:
+        """Identifies the current contents of the store, for invalidating derived indexes."""
+        count, last_update = self.conn.execute("SELECT COUNT(*), MAX(updated_at) FROM lawyers").fetchone()
+        return f"{count}:{last_update}"
+
+    def profiles(self) -> 'LazyProfiles':
+        """Dict-like view of all profiles that decodes each one on first access."""
+        return LazyProfiles(self)
+
+    def add(self, url: str, raw_content: str, structured_data: Dict[str, Any], embedding: List[float]):
+        """Append one lawyer's embedding and commit its profile."""
+        self.add_many([(url, raw_content, structured_data, embedding)])
+
+    def add_many(self, records: Iterable[Tuple[str, str, Dict[str, Any], List[float]]]):
+        """
+        Append embeddings for several lawyers and commit their profiles in one transaction.
+
+        Vectors are flushed to disk before the manifest rows pointing at them are
+        committed, so an interrupted write leaves at most unreferenced trailing rows.
+        A lawyer that is already stored gets a new row; its old row is left unreferenced.
+        """
+        records = list(records)
+        if not records:
+            return
+        first_row = self._rows
+        self._append_vectors(self.embeddings_path, [embedding for _, _, _, embedding in records])
+        self._rows += len(records)
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO lawyers (url, row, raw_content, structured_data, updated_at, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET row = excluded.row, raw_content = excluded.raw_content, "
+                "structured_data = excluded.structured_data, updated_at = excluded.updated_at, "
+                "content_hash = excluded.content_hash",
+                [
+                    (url, first_row + i, raw_content, json.dumps(structured_data, separators=(',', ':')), now,
+                     content_hash(raw_content))
+                    for i, (url, raw_content, structured_data, _) in enumerate(records)
+                ]
+            )
+            self.conn.executemany("DELETE FROM failures WHERE url = ?", [(url,) for url, _, _, _ in records])
+
+    def add_chunks(self, url: str, chunks: Iterable[Tuple[str, str, List[float]]]):
+        """
+        Replace a lawyer's chunks with new (section, text, embedding) triples, and mark
+        the lawyer as chunked even when there are none.
+
+        The old chunk vectors are left unreferenced in the chunk file.
+        """
+        chunks = list(chunks)
+        first_row = self._chunk_rows
+        if chunks:
+            self._append_vectors(self.chunk_embeddings_path, [embedding for _, _, embedding in chunks])
+            self._chunk_rows += len(chunks)
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.conn.executemany(
+                "INSERT INTO chunks (url, row, section, text) VALUES (?, ?, ?, ?)",
+                [(url, first_row + i, section, text) for i, (section, text, _) in enumerate(chunks)]
+            )
+            self.conn.execute("UPDATE lawyers SET chunked_at = ? WHERE url = ?", (time.time(), url))
+
+    def validators(self, url: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Return the stored (etag, last_modified, content_hash) of a lawyer's page."""
+        found = self.conn.execute(
+            "SELECT etag, last_modified, content_hash FROM lawyers WHERE url = ?", (url,)
+        ).fetchone()
+        return found or (None, None, None)
+
+    def set_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        """Remember the HTTP validators of the last successful fetch of a lawyer's page."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE lawyers SET etag = ?, last_modified = ? WHERE url = ?", (etag, last_modified, url)
+            )
+
+    def record_failure(self, url: str, error: str):
+        """Count a failed precompute attempt for a lawyer."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO failures (url, attempts, last_error, last_attempt) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET attempts = attempts + 1, last_error = excluded.last_error, "
+                "last_attempt = excluded.last_attempt",
+                (url, error, time.time())
+            )
+
+    def failure_attempts(self) -> Dict[str, int]:
+        """Failed attempt counts of lawyers since they were last stored successfully."""
+        return dict(self.conn.execute("SELECT url, attempts FROM failures"))
+
+    def import_json(self, path: str = LEGACY_LAWYER_DATA_PATH) -> int:
+        """Import a legacy lawyer_data.json file. Returns the number of lawyers imported, skipping stored ones."""
+        with open(path, 'r') as file:
+            content = file.read().strip()
+        if not content:
+            return 0
+        data = json.loads(content)
+        records = [(url, d["raw_content"], d["structured_data"], d["embedding"])
+                   for url, d in data.items() if url not in self]
+        self.add_many(records)
+        return len(records)
+
+    def _migrate(self):
+        columns = {name for _, name, *_ in self.conn.execute("PRAGMA table_info(lawyers)")}
+        with self.conn:
+            for column, statement in LAWYER_COLUMN_MIGRATIONS.items():
+                if column not in columns:
+                    self.conn.execute(statement)
+
+    def _append_vectors(self, path: str, embeddings: List[List[float]]):
+        """Normalize embeddings and append them to a vector file, flushed to disk before returning."""
+        matrix = np.array(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            self._set_meta('dim', self.dim)
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = (matrix / norms).astype(np.float32)
+        with open(path, 'ab') as f:
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _memmap(self, path: str, rows: int) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+
+    def _count_rows_on_disk(self, path: str) -> int:
+        if self.dim is None or not os.path.exists(path):
+            return 0
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        size = os.path.getsize(path)
+        if size % row_bytes:
+            # Drop a partially written trailing row left by an interrupted append
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % row_bytes)
+        return size // row_bytes
+
+    def _get_meta(self, key: str, cast=str):
+        found = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return cast(found[0]) if found else None
+
+    def _set_meta(self, key: str, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+class LazyProfiles(Mapping):
+    """Read-only mapping of lawyer URL -> profile dict backed by a LawyerStore."""
+
+    def __init__(self, store: LawyerStore):
+        self.store = store
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    def __getitem__(self, url: str) -> Dict[str, Any]:
+        if url not in self._cache:
+            profile = self.store.get(url)
+            if profile is None:
+                raise KeyError(url)
+            self._cache[url] = profile
+        return self._cache[url]
+
+    def __contains__(self, url) -> bool:
+        return url in self._cache or url in self.store
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.urls())
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+def open_lawyer_store(db_path: str = LAWYER_DB_PATH, embeddings_path: str = LAWYER_EMBEDDINGS_PATH,
+                      chunk_embeddings_path: str = LAWYER_CHUNK_EMBEDDINGS_PATH) -> LawyerStore:
+    """
+    Open the lawyer store for the configured embedding backend, importing a legacy
+    lawyer_data.json the first time.
+    """
+    store = LawyerStore(db_path, embeddings_path, chunk_embeddings_path, configured_embedding_space())
+    # lawyer_data.json only ever held text-embedding-3-large vectors
+    legacy_space = ('openai', EMBEDDING_MODEL_LARGE)
+    if not len(store) and os.path.exists(LEGACY_LAWYER_DATA_PATH) and store.embedding_space == legacy_space:
+        imported = store.import_json(LEGACY_LAWYER_DATA_PATH)
+        print(f"Imported {imported} lawyers from {LEGACY_LAWYER_DATA_PATH}")
+    return store
@@ -1,49 +1,475 @@
 from openai import OpenAI
-from models import LawyerProfile
+from models import CandidateStrategy, LawyerProfile
+from search_index import EmbeddingIndex
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
-import numpy as np
-from typing import Dict, List
-from openai import AsyncOpenAI
-from constants import PRIMARY_MODEL, MINI_MODEL, EMBEDDING_MODEL_LARGE, EMBEDDING_MODEL_SMALL, IS_DEBUG_MODE, OPENAI_KEY
+import heapq
+import itertools
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, InternalServerError, RateLimitError
+from constants import PRIMARY_MODEL, MINI_MODEL, OPENAI_KEY
+from constants import QUERY_EMBEDDING_CACHE_PATH, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_SAVE_INTERVAL
+from constants import OPENAI_BASE_URL, OPENAI_TIMEOUT, OPENAI_MAX_RETRIES, CHAT_COMPLETION_TOKEN_ESTIMATE
+from constants import MODEL_CONCURRENCY, DEFAULT_MODEL_CONCURRENCY, MODEL_TOKENS_PER_MINUTE
+from constants import EMBEDDING_BACKEND, EMBEDDING_MODELS, LOCAL_EMBEDDING_DEVICE, LOCAL_EMBEDDING_BATCH_SIZE
+from constants import EMBEDDING_BATCH_TOKEN_BUDGET, EMBEDDING_BATCH_MAX_INPUTS, EMBEDDING_BATCH_MAX_WAIT
+from embedding_cache import EmbeddingCache
+from tracing import count, span
 
-openai_client = OpenAI(api_key=OPENAI_KEY)
-client = AsyncOpenAI(api_key=OPENAI_KEY)
+logger = logging.getLogger(__name__)
 
-async def async_get_embedding(texts, size=EMBEDDING_MODEL_LARGE):
+openai_client = OpenAI(api_key=OPENAI_KEY, base_url=OPENAI_BASE_URL)
+# Retries are handled by the scheduler so that backoff waits free up concurrency slots
+client = AsyncOpenAI(api_key=OPENAI_KEY, base_url=OPENAI_BASE_URL, max_retries=0, timeout=OPENAI_TIMEOUT)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+request_priority: ContextVar[int] = ContextVar('request_priority', default=PRIORITY_INTERACTIVE)
+
+class TokenBucket:
+    """Token-per-minute budget that refills continuously."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+
+    async def consume(self, tokens: int):
+        tokens = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) * 60 / self.capacity)
+
+class RequestScheduler:
+    """
+    Shared scheduler for every async OpenAI request.
+
+    Bounds in-flight requests and tokens per minute per model, lets interactive
+    query traffic jump ahead of background precompute traffic, and retries rate
+    limits, timeouts and 5xx errors with jittered exponential backoff.
+    """
+
+    def __init__(self, concurrency: Dict[str, int] = MODEL_CONCURRENCY,
+                 tokens_per_minute: Dict[str, int] = MODEL_TOKENS_PER_MINUTE,
+                 max_retries: int = OPENAI_MAX_RETRIES, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight: Counter = Counter()
+        self.waiters: Dict[str, list] = defaultdict(list)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.counters: Counter = Counter()
+        self._sequence = itertools.count()
+
+    async def run(self, model: str, estimated_tokens: int, request: Callable[[], Awaitable[Any]],
+                  priority: int = None):
+        """
+        Run an API request under the model's limits, retrying transient failures.
+
+        Args:
+            model (str): Model the request is for; limits are tracked per model.
+            estimated_tokens (int): Tokens the request is expected to use, charged to the budget.
+            request (Callable[[], Awaitable[Any]]): Issues the request; called again on every retry.
+            priority (int, optional): PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+                Defaults to the `request_priority` of the calling context.
+
+        Returns:
+            The response of the first successful attempt.
+        """
+        priority = request_priority.get() if priority is None else priority
+        for attempt in range(self.max_retries + 1):
+            # Time spent waiting for a concurrency slot and token budget, apart from the request itself
+            with span('openai.queue_wait', model=model):
+                await self._acquire(model, priority)
+            try:
+                bucket = self._bucket(model)
+                if bucket:
+                    with span('openai.rate_limit_wait', model=model):
+                        await bucket.consume(estimated_tokens)
+                with span(f'openai.{model}', attempt=attempt):
+                    response = await request()
+                self.counters['completed'] += 1
+                return response
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    self.counters['failed'] += 1
+                    raise
+                self.counters['retries'] += 1
+                delay = self._retry_delay(e, attempt)
+            except APIStatusError as e:
+                if e.status_code < 500 or attempt == self.max_retries:
+                    self.counters['failed'] += 1
+                    raise
+                self.counters['retries'] += 1
+                delay = self._retry_delay(e, attempt)
+            finally:
+                self._release(model)
+            logger.info("Retrying OpenAI request", extra={'fields': {'model': model, 'delay': round(delay, 2),
+                                                                     'attempt': attempt + 1}})
+            with span('openai.retry_wait', model=model):
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current in-flight and queued requests per model plus lifetime counters."""
+        return {
+            "in_flight": {model: n for model, n in self.in_flight.items() if n},
+            "queued": {model: len(waiters) for model, waiters in self.waiters.items() if waiters},
+            **self.counters,
+        }
+
+    def _limit(self, model: str) -> int:
+        return self.concurrency.get(model, DEFAULT_MODEL_CONCURRENCY)
+
+    def _bucket(self, model: str) -> Optional[TokenBucket]:
+        if model not in self.buckets and self.tokens_per_minute.get(model):
+            self.buckets[model] = TokenBucket(self.tokens_per_minute[model])
+        return self.buckets.get(model)
+
+    async def _acquire(self, model: str, priority: int):
+        if self.in_flight[model] < self._limit(model) and not self.waiters[model]:
+            self.in_flight[model] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters[model], (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release(model)
+            else:
+                self.waiters[model] = [w for w in self.waiters[model] if w[2] is not future]
+                heapq.heapify(self.waiters[model])
+            raise
+
+    def _release(self, model: str):
+        waiters = self.waiters[model]
+        while waiters:
+            _, _, future = heapq.heappop(waiters)
+            if not future.done():
+                # Hand the slot straight to the highest-priority waiter
+                future.set_result(None)
+                return
+        self.in_flight[model] -= 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            if retry_after is not None:
+                return min(self.max_delay, float(retry_after))
+        except ValueError:
+            pass
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+scheduler = RequestScheduler()
+
+def estimate_message_tokens(*texts) -> int:
+    """Rough token count of request text (about 4 characters per token)."""
+    return sum(len(text) for text in texts if text) // 4 + 1
+
+# Reads its file on first use and saves in the background, so importing this module touches no files
+query_embedding_cache = EmbeddingCache(QUERY_EMBEDDING_CACHE_PATH, QUERY_EMBEDDING_CACHE_SIZE,
+                                       QUERY_EMBEDDING_CACHE_SAVE_INTERVAL)
+
+# Running totals of API calls and tokens, for benchmarks and debugging
+api_usage = Counter()
+
+def record_usage(kind: str, response):
+    """Add one API response to the running `api_usage` totals and to the current trace's counters."""
+    counts = {f"{kind}_calls": 1}
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        counts[f"{kind}_prompt_tokens"] = getattr(usage, 'prompt_tokens', 0) or 0
+        counts[f"{kind}_completion_tokens"] = getattr(usage, 'completion_tokens', 0) or 0
+    for key, n in counts.items():
+        api_usage[key] += n
+        count(key, n)
+
+class EmbeddingBackend(ABC):
+    """
+    Source of embedding vectors.
+
+    `name` and `model` identify the vector space; vectors from different
+    spaces must never be compared, so the lawyer store records both.
+    """
+    name = ''
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def space(self) -> Tuple[str, str]:
+        return self.name, self.model
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def load(self):
+        """Prepare the backend so the first request does not pay for it."""
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, one vector per text in order."""
+
+    @abstractmethod
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts without an event loop, one vector per text in order."""
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API, with async requests going through the shared scheduler."""
+    name = 'openai'
+
+    @property
+    def cache_key(self) -> str:
+        # Plain model name, as used by caches written before backends were pluggable
+        return self.model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await scheduler.run(
+            self.model, estimate_message_tokens(*texts), lambda: client.embeddings.create(input=texts, model=self.model)
+        )
+        record_usage('embedding', response)
+        return [item.embedding for item in response.data]
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        response = openai_client.embeddings.create(input=texts, model=self.model)
+        record_usage('embedding', response)
+        return [item.embedding for item in response.data]
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Local sentence_transformers model, loaded once and run in-process.
+
+    Concurrent `embed` calls are coalesced into a single `encode` call that runs
+    in a worker thread, so many small requests (queries, per-lawyer chunks)
+    share one forward pass without blocking the event loop.
     """
-    Get embeddings for the given texts using the specified model size.
+    name = 'sentence_transformers'
+
+    def __init__(self, model: str, device: Optional[str] = LOCAL_EMBEDDING_DEVICE,
+                 batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE):
+        super().__init__(model)
+        self.device = device
+        self.batch_size = batch_size
+        self._model = None
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def load(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "EMBEDDING_BACKEND = 'sentence_transformers' needs the sentence_transformers package"
+                ) from e
+            self._model = SentenceTransformer(self.model, device=self.device)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((texts, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+        return await future
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        self.load()
+        vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        api_usage['local_embedding_texts'] += len(texts)
+        return vectors.tolist()
+
+    async def _flush(self):
+        while self._pending:
+            # Let callers that are ready in the same loop iteration join this batch
+            await asyncio.sleep(0)
+            pending, self._pending = self._pending, []
+            texts = [text for batch, _ in pending for text in batch]
+            try:
+                vectors = await asyncio.to_thread(self._encode, texts)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for batch, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+EMBEDDING_BACKENDS = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+}
+_embedding_backends: Dict[Tuple[str, str], EmbeddingBackend] = {}
+
+def get_embedding_backend(name: str = EMBEDDING_BACKEND, model: Optional[str] = None) -> EmbeddingBackend:
+    """Return the shared backend instance for a backend name and model (defaults: EMBEDDING_BACKEND and its model)."""
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    model = model or EMBEDDING_MODELS[name]
+    if (name, model) not in _embedding_backends:
+        _embedding_backends[(name, model)] = EMBEDDING_BACKENDS[name](model)
+    return _embedding_backends[(name, model)]
+
+def load_embedding_backend() -> EmbeddingBackend:
+    """Load the configured embedding backend up front, e.g. a local model at startup."""
+    backend = get_embedding_backend()
+    backend.load()
+    return backend
+
+def _clean_text(text):
+    return text.replace('\n', ' ').replace('\t', ' ').strip()
+
+def _clean_texts(texts):
+    return [_clean_text(text) for text in texts if text]
+
+def _lookup_cached(cleaned_texts, size, cache):
+    """Split texts into cached embeddings and the texts that still need an API call."""
+    embeddings = [cache.get(size, text) if cache is not None else None for text in cleaned_texts]
+    missing = [text for text, embedding in zip(cleaned_texts, embeddings) if embedding is None]
+    return embeddings, missing
+
+def _fill_cached(embeddings, cleaned_texts, missing_embeddings, size, cache):
+    """Merge freshly computed embeddings into the cached ones, which are persisted in the background."""
+    fresh = iter(missing_embeddings)
+    for i, text in enumerate(cleaned_texts):
+        if embeddings[i] is None:
+            embeddings[i] = next(fresh)
+            if cache is not None:
+                cache.put(size, text, embeddings[i])
+    if cache is not None and missing_embeddings:
+        cache.save_soon()
+    return embeddings
+
+async def async_get_embedding(texts, size=None, cache: EmbeddingCache = None):
+    """
+    Get embeddings for the given texts from the configured embedding backend.
 
     Args:
         texts (list): List of text strings to embed.
-        size (str): Model size to use for embedding. Defaults to EMBEDDING_MODEL_SMALL.
+        size (str, optional): OpenAI embedding model to use instead of the configured backend.
+        cache (EmbeddingCache, optional): Cache to consult before calling the backend.
 
     Returns:
-        list: List of embeddings (dimensions: 1536 for small, 3072 for large) for the input texts.
+        list: List of embeddings for the input texts (3072 dimensions for text-embedding-3-large).
     """
-    cleaned_texts = [text.replace('\n', ' ').replace('\t', ' ').strip() for text in texts if text]
-    response = await client.embeddings.create(input=cleaned_texts, model=size)
-    return [item.embedding for item in response.data]
+    backend = get_embedding_backend() if size is None else get_embedding_backend('openai', size)
+    cleaned_texts = _clean_texts(texts)
+    embeddings, missing = _lookup_cached(cleaned_texts, backend.cache_key, cache)
+    missing_embeddings = await backend.embed(missing) if missing else []
+    return _fill_cached(embeddings, cleaned_texts, missing_embeddings, backend.cache_key, cache)
 
-def get_embedding(texts, size=EMBEDDING_MODEL_LARGE):
+class EmbeddingBatcher:
     """
-    Get embeddings for the given texts using the specified model size.
+    Pipeline stage that packs texts from many callers into token-bounded embedding requests.
+
+    Callers `await embed(texts)` and get their vectors back in order. Queued texts
+    are sent as one request once they reach `token_budget` estimated tokens or
+    `max_inputs` texts, or once the oldest has waited `max_wait` seconds. A
+    request that fails is split in half and each half retried, so a bad input
+    only fails the callers whose texts it belongs to.
+    """
+
+    def __init__(self, backend: Optional[EmbeddingBackend] = None, token_budget: int = EMBEDDING_BATCH_TOKEN_BUDGET,
+                 max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS, max_wait: float = EMBEDDING_BATCH_MAX_WAIT):
+        self.backend = backend or get_embedding_backend()
+        self.token_budget = token_budget
+        self.max_inputs = max_inputs
+        self.max_wait = max_wait
+        self.stats = Counter()
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._requests = set()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in map(_clean_text, texts):
+            tokens = estimate_message_tokens(text)
+            if self._pending and (self._pending_tokens + tokens > self.token_budget
+                                  or len(self._pending) >= self.max_inputs):
+                self.flush()
+            future = loop.create_future()
+            self._pending.append((text, tokens, future))
+            self._pending_tokens += tokens
+            futures.append(future)
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return list(await asyncio.gather(*futures))
+
+    def flush(self):
+        """Send the queued texts now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        request = asyncio.ensure_future(self._send(batch))
+        self._requests.add(request)
+        request.add_done_callback(self._requests.discard)
+
+    async def _send(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        try:
+            self.stats['requests'] += 1
+            vectors = await self.backend.embed([text for text, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats['failed_texts'] += 1
+                if not batch[0][2].done():
+                    batch[0][2].set_exception(e)
+                return
+            self.stats['splits'] += 1
+            middle = len(batch) // 2
+            await asyncio.gather(self._send(batch[:middle]), self._send(batch[middle:]))
+            return
+        self.stats['texts'] += len(batch)
+        for (_, _, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+def get_embedding(texts, size=None, cache: EmbeddingCache = None):
+    """
+    Get embeddings for the given texts from the configured embedding backend.
 
     Args:
         texts (list): List of text strings to embed.
-        size (str): Model size to use for embedding. Defaults to EMBEDDING_MODEL_SMALL.
+        size (str, optional): OpenAI embedding model to use instead of the configured backend.
+        cache (EmbeddingCache, optional): Cache to consult before calling the backend.
 
     Returns:
-        list: List of embeddings (dimensions: 1536 for small, 3072 for large) for the input texts.
+        list: List of embeddings for the input texts (3072 dimensions for text-embedding-3-large).
     """
-    cleaned_texts = [text.replace('\n', ' ').replace('\t', ' ').strip() for text in texts if text]
-    response = openai_client.embeddings.create(input=cleaned_texts, model=size)
-    return [item.embedding for item in response.data]
+    backend = get_embedding_backend() if size is None else get_embedding_backend('openai', size)
+    cleaned_texts = _clean_texts(texts)
+    embeddings, missing = _lookup_cached(cleaned_texts, backend.cache_key, cache)
+    missing_embeddings = backend.embed_sync(missing) if missing else []
+    return _fill_cached(embeddings, cleaned_texts, missing_embeddings, backend.cache_key, cache)
 
 
 async def async_llm(model=MINI_MODEL, system_prompt=None, user_prompt=None, assistant_prompt = None, params = None):
-    if IS_DEBUG_MODE:
-        print(f"performing async_llm with prommpt: {user_prompt}")
+    logger.debug("Performing async_llm with prompt: %s", user_prompt)
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -61,7 +487,9 @@ async def async_llm(model=MINI_MODEL, system_prompt=None, user_prompt=None, assi
     if params:
         body.update(params)
 
-    response = await client.chat.completions.create(**body)
+    estimated_tokens = estimate_message_tokens(*(m["content"] for m in messages)) + CHAT_COMPLETION_TOKEN_ESTIMATE
+    response = await scheduler.run(model, estimated_tokens, lambda: client.chat.completions.create(**body))
+    record_usage('chat', response)
     return response.choices[0].message.content
 
 async def do_async(questions=None, system_prompt=None, assistant_prompt=None, model=None, params=None):
@@ -95,13 +523,9 @@ async def do_async(questions=None, system_prompt=None, assistant_prompt=None, mo
     
     qa_pairs = dict(zip(questions, result))
     
-    if IS_DEBUG_MODE:
-        print("\n=== Results ===")
-        for question, answer in qa_pairs.items():
-            print(f"\nQ: {question}")
-            print(f"A: {answer}")
-            print("-" * 50)
-        
+    for question, answer in qa_pairs.items():
+        logger.debug("Q: %s A: %s", question, answer)
+
     return qa_pairs
 
 def llm(model=MINI_MODEL, system_prompt=None, user_prompt=None, assistant_prompt=None, params=None):
@@ -136,38 +560,71 @@ def llm(model=MINI_MODEL, system_prompt=None, user_prompt=None, assistant_prompt
         body.update(params)
 
     response = openai_client.chat.completions.create(**body)
+    record_usage('chat', response)
     return response.choices[0].message.content
 
-def cosine_search(cutoff_threshold: float, embeddings: Dict[str, List[float]], query: str) -> List[str]:
+# A similarity cutoff, a candidate strategy, or one of those per query
+CandidateSelection = Union[float, CandidateStrategy, Sequence[Union[float, CandidateStrategy]]]
+
+def cosine_search(cutoff_threshold: CandidateSelection, index: EmbeddingIndex, query: str) -> List[str]:
     """
-    Perform cosine similarity search between query and embeddings.
+    Perform cosine similarity search between query and the lawyer embedding index.
     
     Args:
-        cutoff_threshold (float): Minimum similarity threshold (e.g., 0.8).
-        embeddings (Dict[str, List[float]]): Dictionary of lawyer URLs to their embeddings.
+        cutoff_threshold (float | CandidateStrategy): Minimum similarity threshold (e.g., 0.8),
+            or a candidate selection strategy such as top-k or score-gap detection.
+        index (EmbeddingIndex): Normalized embedding index of all lawyers.
         query (str): Search query to compare against.
         
     Returns:
         List[str]: List of lawyer URLs that exceed the similarity threshold, sorted by similarity.
     """
-    # Enhance query
-    enhanced_query = f"Find a lawyer: {query}"  # Adds context
-    
-    query_embedding = np.array(get_embedding([enhanced_query])[0])
-    
-    # Normalize query embedding for efficient cosine similarity calculation
-    query_norm = np.linalg.norm(query_embedding)
+    return batch_cosine_search(cutoff_threshold, index, [query])[0]
+
+def batch_cosine_search(cutoff_threshold: CandidateSelection, index: EmbeddingIndex,
+                        queries: List[str]) -> List[List[str]]:
+    """
+    Perform cosine similarity search for several queries with one embeddings call and one matmul.
     
-    results = []
-    for lawyer_url, lawyer_embedding in embeddings.items():
-        lawyer_embedding = np.array(lawyer_embedding)
+    Args:
+        cutoff_threshold (float | CandidateStrategy | list): Minimum similarity threshold (e.g., 0.8),
+            a candidate selection strategy, or a list with one of those per query.
+        index (EmbeddingIndex): Normalized embedding index of all lawyers.
+        queries (List[str]): Search queries to compare against.
         
-        # Compute cosine similarity
-        similarity = np.dot(query_embedding, lawyer_embedding) / (query_norm * np.linalg.norm(lawyer_embedding))
-        print(f"Lawyer URL: {lawyer_url}, Similarity: {similarity}")
-        # Append results above threshold
-        if similarity >= cutoff_threshold:
-            results.append((lawyer_url, similarity))
-    
-    # Sort results by similarity in descending order and return only URLs
-    return [url for url, _ in sorted(results, key=lambda x: x[1], reverse=True)]
\ No newline at end of file
+    Returns:
+        List[List[str]]: For each query, the selected lawyer URLs sorted by similarity.
+    """
+    with span('embed', queries=len(queries)):
+        query_embeddings = get_embedding(enhance_queries(queries), cache=query_embedding_cache)
+    return _rank_queries(cutoff_threshold, index, query_embeddings)
+
+async def async_cosine_search(cutoff_threshold: CandidateSelection, index: EmbeddingIndex, query: str) -> List[str]:
+    """Async version of `cosine_search` that does not block the event loop on the embedding call."""
+    return (await async_batch_cosine_search(cutoff_threshold, index, [query]))[0]
+
+async def async_batch_cosine_search(cutoff_threshold: CandidateSelection, index: EmbeddingIndex,
+                                    queries: List[str]) -> List[List[str]]:
+    """Async version of `batch_cosine_search`; all queries share one embeddings request."""
+    with span('embed', queries=len(queries)):
+        query_embeddings = await async_get_embedding(enhance_queries(queries), cache=query_embedding_cache)
+    return _rank_queries(cutoff_threshold, index, query_embeddings)
+
+def enhance_queries(queries: List[str]) -> List[str]:
+    """Add search context to queries before embedding them."""
+    return [f"Find a lawyer: {query}" for query in queries]
+
+def _rank_queries(cutoff_threshold, index, query_embeddings) -> List[List[str]]:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Query embedding cache", extra={'fields': query_embedding_cache.stats()})
+    if isinstance(cutoff_threshold, (list, tuple)):
+        strategies = list(cutoff_threshold)
+    else:
+        strategies = [cutoff_threshold] * len(query_embeddings)
+    strategies = [
+        strategy if isinstance(strategy, CandidateStrategy) else CandidateStrategy(kind='threshold', threshold=strategy)
+        for strategy in strategies
+    ]
+    with span('score', queries=len(strategies)):
+        results = index.search_strategies(query_embeddings, strategies)
+    return [[url for url, _ in ranked] for ranked in results]
@@ -1,45 +1,31 @@
-from llm_utils import async_llm, cosine_search
-from scraping_utils import scrape_all_lawyers
+from llm_utils import async_batch_cosine_search, load_embedding_backend
+from verifier import verification_tasks, cascade_summary
+import aiohttp
+import argparse
 import asyncio
 import json
-from precompute import update_lawyer_data, load_lawyers_data
-from typing import Dict, List, Union
-from constants import EMBEDDING_CUTOFF, IS_DEBUG_MODE
+import logging
+import math
+from functools import partial
+from precompute import update_lawyer_data, load_lawyers_data, load_lexical_index, load_embedding_index
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, Union
+from constants import (EMBEDDING_CUTOFF, CHUNK_EMBEDDING_CUTOFF, CANDIDATE_STRATEGIES, LEXICAL_TOP_K,
+                       LEXICAL_MAX_DOC_FREQ, RRF_K, HYBRID_CANDIDATE_RATIO, HYBRID_MIN_CANDIDATES, VERIFY_MODE,
+                       VERIFY_CASCADES)
+from search_index import EmbeddingIndex, ChunkIndex, FieldIndex, BM25Index, reciprocal_rank_fusion
+from query_router import route_query
+from models import CandidateStrategy, VerifyCascade
+from lawyer_store import LawyerStore, open_lawyer_store
+from tracing import configure_logging, count, recent_traces, span, stage_summary, start_trace, trace_table
 import ast
+import time
 
-async def passes_criterion(text, query: str) -> bool:
-    """
-    Evaluate if a lawyer passes a given criterion based on their profile.
+logger = logging.getLogger(__name__)
 
-    Args:
-        lawyer_url (str): URL of the lawyer's profile
-        query (str): Criterion to evaluate against
+# (lawyer_index, lawyers_dict, field_index, lexical_index), as loaded by `load_search_indexes`
+SearchIndexes = Tuple[EmbeddingIndex, Any, FieldIndex, BM25Index]
 
-    Returns:
-        bool: True if lawyer passes the criterion, False otherwise
-    """
-    system_prompt = """
-    You are evaluating a lawyer whether they pass a given criterion.
-    
-    Respond in the following format:
-    <thinking>...</thinking>, within which you include your detailed thought process.
-    <answer>...</answer>, within which you include your final answer. "Pass" or "Fail".
-    """.strip()
-    
-    user_prompt = f"""
-    You are an expert lawyer searcher.
-    Find a lawyer that meets this requirement: {query}
-    Here is the lawyer's profile: {text}
-    """.strip()
-
-    print(f"USER_PROMPT: {user_prompt}")
-    
-    if IS_DEBUG_MODE:
-        print(f"\nEvaluating criterion: '{query}' for lawyer profile...")
-    response = await async_llm(system_prompt=system_prompt, user_prompt=user_prompt)
-    return response.split('<answer>')[1].split('</answer>')[0].strip() == 'Pass'
-
-def format_result(lawyer_urls: List[str], query: str):
+def format_result(lawyer_urls: List[str], query: str, timings: Dict[str, float] = None):
     print("\n" + "="*50)
     print(f"Search Results for: '{query}'")
     print("-"*50)
@@ -49,17 +35,163 @@ def format_result(lawyer_urls: List[str], query: str):
             print(f"- {url}")
     else:
         print("No lawyers found matching criteria")
+    if timings:
+        first = timings['first_result']
+        print("-"*50)
+        print(f"Time to first result: {f'{first:.2f}s' if first is not None else 'n/a'}")
+        print(f"Time to last result: {timings['last_result']:.2f}s")
     print("="*50 + "\n")
 
-async def process_search(lawyer_embeddings: Dict[str, List[float]], query: str, lawyers_dict) -> list:
-    print("\nComputing similarities...")
-    lawyer_urls = cosine_search(EMBEDDING_CUTOFF, lawyer_embeddings, query)
-    print("\nEvaluating criteria...")
-    coros = [passes_criterion(lawyers_dict[lawyer_url]['structured_data'], query) for lawyer_url in lawyer_urls]
-    results = await asyncio.gather(*coros)
-    filtered_urls = [url for url, passed in zip(lawyer_urls, results) if passed]
+async def select_candidates(lawyer_index: EmbeddingIndex, queries: List[str], field_index: FieldIndex = None,
+                            lexical_index: BM25Index = None) -> List[Tuple[List[str], bool]]:
+    """
+    Pick the lawyers to consider for each query.
+
+    Queries the query router can answer from the field index are resolved
+    directly; all others share one embeddings request and a cosine search,
+    merged with BM25 hits by reciprocal rank fusion when a lexical index is given.
+
+    Returns:
+        List[Tuple[List[str], bool]]: Per query, the candidate URLs and whether they
+        still need to be verified by the LLM.
+    """
+    with span('route', queries=len(queries)):
+        routes = [route_query(query) for query in queries]
+        structured = [field_index.answer(route) if field_index is not None else None for route in routes]
+    free_form = [query for query, urls in zip(queries, structured) if urls is None]
+    strategies = [candidate_strategy(route.kind, lawyer_index) for route, urls in zip(routes, structured) if urls is None]
+    if free_form:
+        logger.debug("Computing similarities", extra={'fields': {'queries': len(free_form)}})
+    similar = await async_batch_cosine_search(strategies, lawyer_index, free_form) if free_form else []
+    if lexical_index is not None and free_form:
+        with span('lexical', queries=len(free_form)):
+            similar = [
+                hybrid_candidates(similar_urls, lexical_index.search(query, top_k=LEXICAL_TOP_K,
+                                                                     max_doc_freq=LEXICAL_MAX_DOC_FREQ))
+                for query, similar_urls in zip(free_form, similar)
+            ]
+    similar = iter(similar)
+    return [(urls, False) if urls is not None else (next(similar), True) for urls in structured]
+
+def candidate_strategy(route_kind: str, lawyer_index: EmbeddingIndex) -> CandidateStrategy:
+    """The configured candidate selection strategy for a query route kind."""
+    strategy = CandidateStrategy(**CANDIDATE_STRATEGIES.get(route_kind, CANDIDATE_STRATEGIES['free_form']))
+    if strategy.kind == 'threshold' and strategy.threshold is None:
+        # Max-sim chunk scores run higher than whole-profile scores, so chunk indexes use their own cutoff
+        strategy.threshold = CHUNK_EMBEDDING_CUTOFF if isinstance(lawyer_index, ChunkIndex) else EMBEDDING_CUTOFF
+    return strategy
+
+def verify_cascade(route_kind: str) -> VerifyCascade:
+    """The configured verification cascade for a query route kind."""
+    return VerifyCascade(**VERIFY_CASCADES.get(route_kind, VERIFY_CASCADES['free_form']))
+
+def hybrid_candidates(similar_urls: List[str], lexical_hits: List[Tuple[str, float]]) -> List[str]:
+    """
+    Fuse cosine and BM25 rankings into the candidates to verify.
+
+    Every candidate costs a verdict, so BM25 may reorder the cosine cut and swap rare-term hits in for
+    its weakest members, but not grow it past HYBRID_CANDIDATE_RATIO times its size (or
+    HYBRID_MIN_CANDIDATES, when the embeddings find next to nothing).
+    """
+    fused = reciprocal_rank_fusion([similar_urls, [url for url, _ in lexical_hits]], k=RRF_K)
+    limit = max(math.ceil(len(similar_urls) * HYBRID_CANDIDATE_RATIO), HYBRID_MIN_CANDIDATES)
+    return fused[:limit]
+
+async def stream_search(lawyer_index: EmbeddingIndex, query: str, lawyers_dict, lawyer_urls: List[str] = None,
+                        ordered: bool = False, field_index: FieldIndex = None, lexical_index: BM25Index = None,
+                        needs_verification: bool = True) -> AsyncIterator[str]:
+    """
+    Yield each matching lawyer URL as soon as its verdict arrives.
+
+    Args:
+        lawyer_index (EmbeddingIndex): Embedding index of all lawyers.
+        query (str): Criterion to evaluate against.
+        lawyers_dict: Mapping of lawyer URLs to their profiles.
+        lawyer_urls (List[str], optional): Candidates sorted by similarity. Computed with
+            `select_candidates` if omitted.
+        ordered (bool): Hold back a match until every more similar candidate has been judged,
+            so results come out in similarity order at the cost of time to first result.
+        field_index (FieldIndex, optional): Index used to answer structured queries without the LLM.
+        lexical_index (BM25Index, optional): Keyword index fused with the cosine ranking.
+        needs_verification (bool): Whether the given candidates still need an LLM verdict.
+
+    Yields:
+        str: URL of a lawyer that passes the criterion.
+    """
+    if lawyer_urls is None:
+        [(lawyer_urls, needs_verification)] = await select_candidates(lawyer_index, [query], field_index,
+                                                                      lexical_index)
+    count('candidates', len(lawyer_urls))
+    if not needs_verification:
+        for lawyer_url in lawyer_urls:
+            yield lawyer_url
+        return
+    logger.debug("Evaluating criteria", extra={'fields': {'query': query, 'candidates': len(lawyer_urls)}})
+
+    tasks = verification_tasks(lawyer_urls, lawyers_dict, query, cascade=verify_cascade(route_query(query).kind))
+    pending_verdicts = {}
+    next_rank = 0
+    try:
+        # Spans the time to the last verdict, including the time callers spend on each match
+        with span('verify', candidates=len(lawyer_urls)):
+            for next_verdicts in asyncio.as_completed(tasks):
+                for rank, lawyer_url, passed in await next_verdicts:
+                    if not ordered:
+                        if passed:
+                            yield lawyer_url
+                        continue
+                    pending_verdicts[rank] = (lawyer_url, passed)
+                while next_rank in pending_verdicts:
+                    lawyer_url, passed = pending_verdicts.pop(next_rank)
+                    next_rank += 1
+                    if passed:
+                        yield lawyer_url
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def process_search(lawyer_index: EmbeddingIndex, query: str, lawyers_dict, lawyer_urls: List[str] = None,
+                         field_index: FieldIndex = None, lexical_index: BM25Index = None,
+                         on_result: Callable[[str], None] = None) -> list:
+    """
+    Return every matching lawyer URL, in candidate order, once all verdicts are in.
+
+    `on_result` is called with each match as it streams in, so callers can time
+    the first result without consuming `stream_search` themselves. The search is
+    traced under the query's name (see `tracing`).
+    """
+    with start_trace(query):
+        needs_verification = True
+        if lawyer_urls is None:
+            with span('select'):
+                [(lawyer_urls, needs_verification)] = await select_candidates(lawyer_index, [query], field_index,
+                                                                              lexical_index)
+        passed = set()
+        async for url in stream_search(lawyer_index, query, lawyers_dict, lawyer_urls,
+                                       needs_verification=needs_verification):
+            passed.add(url)
+            if on_result:
+                on_result(url)
+        filtered_urls = [url for url in lawyer_urls if url in passed]
     return filtered_urls
 
+async def stream_and_print(lawyer_index: EmbeddingIndex, query: str, lawyers_dict, lawyer_urls: List[str],
+                           start: float, needs_verification: bool = True) -> Tuple[List[str], Dict[str, float]]:
+    """Print matches for a query as they stream in and time the first and last result."""
+    rank = {url: i for i, url in enumerate(lawyer_urls)}
+    matches = []
+    first_result = None
+    async for url in stream_search(lawyer_index, query, lawyers_dict, lawyer_urls,
+                                   needs_verification=needs_verification):
+        elapsed = time.perf_counter() - start
+        if first_result is None:
+            first_result = elapsed
+        with span('render'):
+            print(f"[{elapsed:6.2f}s] {query}: {url}")
+        matches.append(url)
+    timings = {'first_result': first_result, 'last_result': time.perf_counter() - start}
+    return sorted(matches, key=rank.get), timings
+
 def parse_queries(input_str: str) -> Union[List[str], None]:
     """
     Parse input string into a list of queries.
@@ -78,44 +210,95 @@ def parse_queries(input_str: str) -> Union[List[str], None]:
         print("Please ensure your input is formatted correctly, e.g., ['query1', 'query2']")
         return None
 
-async def handle_single_query(lawyer_embedding_task, lawyers_dict):
+async def handle_single_query(lawyer_index, lawyers_dict, field_index=None, lexical_index=None):
     """Handle single query mode"""
     query = input("Enter your query:\n")
-    lawyer_urls = await process_search(lawyer_embedding_task, query, lawyers_dict)
-    format_result(lawyer_urls, query)
+    start = time.perf_counter()
+    with start_trace(query):
+        with span('select'):
+            [(candidates, needs_verification)] = await select_candidates(lawyer_index, [query], field_index,
+                                                                         lexical_index)
+        lawyer_urls, timings = await stream_and_print(lawyer_index, query, lawyers_dict, candidates, start,
+                                                      needs_verification)
+        with span('render'):
+            format_result(lawyer_urls, query, timings)
+    if VERIFY_MODE == 'cascade':
+        print(cascade_summary())
 
-async def handle_multiple_queries(lawyer_embedding_task, lawyers_dict):
+async def handle_multiple_queries(lawyer_index, lawyers_dict, field_index=None, lexical_index=None):
     """Handle multiple queries mode"""
     queries_input = input("Enter your queries as ['query1', 'query2', ...] or 'Q' to exit:\n")
     queries = parse_queries(queries_input)
     if queries:
-        # Collect all results first
-        all_results = []
-        for query in queries:
-            lawyer_urls = await process_search(lawyer_embedding_task, query, lawyers_dict)
-            all_results.append((query, lawyer_urls))
+        start = time.perf_counter()
+        # Answer structured queries from the field index; embed the rest in one request
+        with start_trace(f"{len(queries)} queries", kind='select') as selection:
+            with span('select'):
+                candidates = await select_candidates(lawyer_index, queries, field_index, lexical_index)
+
+        async def traced_search(query, candidate_urls, needs_verification):
+            with start_trace(query) as trace:
+                # Every query is charged the selection it shared with the others
+                trace.merge(selection)
+                return await stream_and_print(lawyer_index, query, lawyers_dict, candidate_urls, start,
+                                              needs_verification)
+
+        # Run all searches concurrently, printing matches as they arrive
+        coros = [
+            traced_search(query, candidate_urls, needs_verification)
+            for query, (candidate_urls, needs_verification) in zip(queries, candidates)
+        ]
+        all_results = await asyncio.gather(*coros)
         
-        # Print all results at the end
-        for query, lawyer_urls in all_results:
-            format_result(lawyer_urls, query)
+        # Print a summary per query once everything is in
+        for query, (lawyer_urls, timings) in zip(queries, all_results):
+            format_result(lawyer_urls, query, timings)
+        if VERIFY_MODE == 'cascade':
+            print(cascade_summary())
 
-async def run_program():
-    # Initialize data
-    await update_lawyer_data()
-    lawyers_dict = load_lawyers_data()
-    lawyer_embedding_task = {k: lawyers_dict[k]['embedding'] for k in lawyers_dict}
+def stats_report(last: int = 5) -> str:
+    """Stage tables of startup and the last few queries, then p50/p95 per stage over recent queries."""
+    startup = [trace for trace in recent_traces if trace.kind == 'startup']
+    queries = [trace for trace in recent_traces if trace.kind == 'query']
+    sections = [trace_table(trace) for trace in startup[-1:] + queries[-last:]]
+    sections.append(f"Over the last {stage_summary(queries)}" if queries else "No queries traced yet")
+    return '\n\n'.join(sections)
 
-    # Command mapping
-    commands = {
-        'Q': None,
-        'List': handle_multiple_queries,
-        'Single': handle_single_query
-    }
+async def handle_stats(lawyer_index, lawyers_dict, field_index=None, lexical_index=None):
+    """Handle stats mode"""
+    print(stats_report())
+
+async def load_search_indexes(store: LawyerStore = None, update: bool = True) -> SearchIndexes:
+    """
+    Bring the store up to date and load everything a search needs, traced as 'startup'.
+
+    Returns:
+        SearchIndexes: (lawyer_index, lawyers_dict, field_index, lexical_index).
+    """
+    with start_trace('startup', kind='startup'):
+        if store is None:
+            store = open_lawyer_store()
+        # Load a local embedding model once, before the first query needs it
+        with span('load.embedding_backend'):
+            load_embedding_backend()
+        if update:
+            await update_lawyer_data(store)
+        with span('load.profiles'):
+            lawyers_dict = load_lawyers_data(store)
+        with span('load.embedding_index'):
+            lawyer_index = load_embedding_index(store)
+        with span('load.field_index'):
+            field_index = FieldIndex.from_profiles(store.iter_structured_data())
+        with span('load.lexical_index'):
+            lexical_index = load_lexical_index(store)
+    return lawyer_index, lawyers_dict, field_index, lexical_index
 
+async def command_loop(commands: Dict[str, Tuple[str, Callable[[], Awaitable[None]]]]):
+    """Prompt for commands until 'Q'; `commands` maps each command to its description and handler."""
     while True:
         print("\nAvailable commands:")
-        print("- 'Single': Search with a single query")
-        print("- 'List': Search with multiple queries")
+        for command, (description, _) in commands.items():
+            print(f"- '{command}': {description}")
         print("- 'Q': Quit")
         
         command = input("Enter command: ").strip()
@@ -123,14 +306,81 @@ async def run_program():
         if command == 'Q':
             break
         
-        handler = commands.get(command)
-        if handler:
-            await handler(lawyer_embedding_task, lawyers_dict)
+        if command in commands:
+            await commands[command][1]()
         else:
             print("Invalid command. Please try again.")
 
+async def run_program():
+    # Initialize data
+    indexes = await load_search_indexes()
+
+    # Command mapping
+    await command_loop({
+        'Single': ("Search with a single query", partial(handle_single_query, *indexes)),
+        'List': ("Search with multiple queries", partial(handle_multiple_queries, *indexes)),
+        'Stats': ("Time per stage of startup and recent queries", partial(handle_stats, *indexes)),
+    })
+
+async def stream_remote_search(session: aiohttp.ClientSession, server_url: str, query: str,
+                               start: float) -> Tuple[List[str], Dict[str, float]]:
+    """Print a query's matches as the search server streams them, and return them like `stream_and_print`."""
+    first_result = None
+    async with session.post(f"{server_url}/search", json={'query': query}) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            event = json.loads(line)
+            # Timed from this client's start, which includes the round trips to the server
+            elapsed = time.perf_counter() - start
+            if event['event'] == 'result':
+                if first_result is None:
+                    first_result = elapsed
+                print(f"[{elapsed:6.2f}s] {query}: {event['url']}")
+            elif event['event'] == 'error':
+                print(f"Search failed for '{query}': {event['message']}")
+                break
+            elif event['event'] == 'done':
+                return event['results'], {'first_result': first_result, 'last_result': elapsed}
+    return [], None
+
+async def run_client(server_url: str):
+    """The REPL as a thin client of a running search server (see server.py)."""
+    server_url = server_url.rstrip('/')
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+        async def single():
+            query = input("Enter your query:\n")
+            lawyer_urls, timings = await stream_remote_search(session, server_url, query, time.perf_counter())
+            format_result(lawyer_urls, query, timings)
+
+        async def multiple():
+            queries = parse_queries(input("Enter your queries as ['query1', 'query2', ...] or 'Q' to exit:\n"))
+            if queries:
+                start = time.perf_counter()
+                all_results = await asyncio.gather(*(stream_remote_search(session, server_url, query, start)
+                                                     for query in queries))
+                for query, (lawyer_urls, timings) in zip(queries, all_results):
+                    format_result(lawyer_urls, query, timings)
+
+        async def stats():
+            async with session.get(f"{server_url}/stats") as response:
+                print(await response.text())
+
+        await command_loop({
+            'Single': ("Search with a single query", single),
+            'List': ("Search with multiple queries", multiple),
+            'Stats': ("Time per stage of the server's startup and recent queries", stats),
+        })
+
 async def main():
-    await run_program()
+    parser = argparse.ArgumentParser(description="Search Davis Polk lawyers")
+    parser.add_argument('--server', help="URL of a running search server (python server.py) to send queries to, "
+                                         "instead of loading the index in this process")
+    args = parser.parse_args()
+    configure_logging()
+    if args.server:
+        await run_client(args.server)
+    else:
+        await run_program()
 
 if __name__ == '__main__':
     asyncio.run(main())
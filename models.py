@@ -1,8 +1,64 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class LawyerProfile(BaseModel):
     """Data model for scraped lawyer information"""
     url: str
     raw_content: str
-    structured_data: Dict[str, Any]
\ No newline at end of file
+    structured_data: Dict[str, Any]
+
+class EducationEntry(BaseModel):
+    """One degree from a profile's education section"""
+    school: Optional[str] = None
+    degree: Optional[str] = None
+    year: Optional[int] = None
+
+class ProfileSections(BaseModel):
+    """Fixed schema of the profile fields extracted from the page structure"""
+    name: Optional[str] = None
+    title: Optional[str] = None
+    offices: List[str] = []
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    education: List[EducationEntry] = []
+    bar_admissions: List[str] = []
+    clerkships: List[str] = []
+    practice_areas: List[str] = []
+    experience: List[str] = []
+    bar_numbers: Optional[str] = None
+
+class QueryRoute(BaseModel):
+    """How a query should be answered, as decided by the query router"""
+    kind: str  # 'name', 'school', 'graduation_year', 'practice_area' or 'free_form'
+    value: Optional[str] = None
+    comparator: Optional[str] = None  # '<', '<=', '=', '>=', '>' for graduation_year
+    law_degree_only: bool = False
+
+class CandidateStrategy(BaseModel):
+    """How many lawyers a similarity ranking passes on to LLM verification"""
+    kind: str = 'threshold'  # 'threshold', 'top_k', 'relative', 'gap' or 'knee'
+    threshold: Optional[float] = None  # Minimum similarity; a floor for every kind
+    top_k: Optional[int] = None  # Maximum candidates; a cap for every kind
+    relative: Optional[float] = None  # 'relative': keep scores of at least this fraction of the best score
+    min_candidates: int = 1  # 'relative', 'gap' and 'knee' never cut below this many candidates
+
+
+class VerifyCascade(BaseModel):
+    """Two-tier verification: a quick batched first pass, with unsure verdicts re-judged by a stronger model"""
+    first_model: Optional[str] = None  # None uses MINI_MODEL
+    escalation_model: Optional[str] = None  # None uses PRIMARY_MODEL
+    min_confidence: float = 0.8  # First-pass verdicts less confident than this are escalated
+    batch_size: int = 5  # Lawyers per first-pass request; small batches decode their short answers quickly
+
+
+class PageFetch(BaseModel):
+    """Result of a (possibly conditional) page fetch"""
+    url: str
+    status: int
+    html: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
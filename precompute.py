@@ -1,17 +1,53 @@
 import json
+import logging
 import pandas as pd
-from scraping_utils import scrape_lawyer
-from llm_utils import async_llm, async_get_embedding
+from scraping_utils import Crawler
+from llm_utils import (async_llm, async_get_embedding, api_usage, request_priority, PRIORITY_BACKGROUND,
+                       EmbeddingBatcher)
 import asyncio
-from constants import IS_TEST
+import argparse
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+from constants import (IS_TEST, PRECOMPUTE_CONCURRENCY, PRECOMPUTE_MAX_ATTEMPTS,
+                       LLM_FALLBACK_FIELDS, CHUNK_MAX_WORDS, CHUNK_MAX_PER_LAWYER, LAWYER_DB_PATH,
+                       LAWYER_EMBEDDINGS_PATH, LAWYER_CHUNK_EMBEDDINGS_PATH)
+from lawyer_store import LawyerStore, LazyProfiles, configured_embedding_space, content_hash, open_lawyer_store
+from search_index import BM25Index, ChunkIndex, EmbeddingIndex, profile_chunks, profile_text
+from tracing import configure_logging, span, start_trace, trace_table
+from verdict_cache import VerdictCache
+import verifier
 
-def load_lawyers_data():
-    with open('lawyer_data.json', 'r') as file:
-        content = file.read().strip()
-        if not content:
-            return {}
-        data = json.loads(content)
-    return data
+logger = logging.getLogger(__name__)
+
+def load_lawyers_data(store: LawyerStore = None) -> LazyProfiles:
+    """Return a lazily decoded url -> {raw_content, structured_data} mapping of all stored lawyers."""
+    if store is None:
+        store = open_lawyer_store()
+    return store.profiles()
+
+def build_lexical_index(store: LawyerStore) -> BM25Index:
+    """Build the BM25 index over every stored profile and save it next to the store."""
+    documents = ((url, profile_text(raw_content, structured_data))
+                 for url, raw_content, structured_data in store.iter_profiles())
+    index = BM25Index.build(documents, fingerprint=store.fingerprint())
+    index.save(store.lexical_index_path)
+    return index
+
+def load_lexical_index(store: LawyerStore) -> BM25Index:
+    """Load the store's saved BM25 index, rebuilding it if the store changed since it was built."""
+    if os.path.exists(store.lexical_index_path):
+        index = BM25Index.load(store.lexical_index_path)
+        if index.fingerprint == store.fingerprint():
+            return index
+    return build_lexical_index(store)
+
+def load_embedding_index(store: LawyerStore) -> EmbeddingIndex:
+    """Chunk-level max-sim index when the store has section chunks, otherwise one vector per lawyer."""
+    if store.chunk_count():
+        return ChunkIndex.from_store(store)
+    return EmbeddingIndex.from_store(store)
 
 def load_lawyer_links():
     if IS_TEST:
@@ -20,77 +56,366 @@ def load_lawyer_links():
         csv_file = 'lawyers.csv'
     return pd.read_csv(csv_file, header=None)[0].tolist()
 
-async def update_lawyer_data():
-    lawyers = load_lawyers_data()
-    lawyer_links = load_lawyer_links()
+async def update_lawyer_data(store: LawyerStore = None, retry_failed: bool = False, lawyer_links: List[str] = None,
+                             cache: VerdictCache = None):
+    # Precompute traffic yields to interactive queries in the request scheduler
+    priority_token = request_priority.set(PRIORITY_BACKGROUND)
+    try:
+        with span('precompute.update'):
+            await _update_lawyer_data(store, retry_failed, lawyer_links, cache)
+    finally:
+        request_priority.reset(priority_token)
+
+async def scrape_and_structure(lawyer_link: str, crawler: Crawler) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Scrape one lawyer and complete their structured data; returns (scraped_data, structured_data)."""
+    scraped_data = await crawler.scrape(lawyer_link)
+    if not scraped_data:
+        raise ValueError("Scrape returned no content")
+    return scraped_data, await complete_structured_data(scraped_data)
+
+async def structure_with_llm(raw_content: str, fields) -> Dict[str, Any]:
+    """Ask the LLM to parse the given fields out of a profile's text."""
+    system_prompt = f"""You are the best lawyer parser. Always respond with valid JSON format.
+    The JSON should include the fields {', '.join(fields)}."""
     
-    async def process_lawyer(lawyer_link):
-        if lawyer_link not in lawyers:
-            try:
-                scraped_data = await scrape_lawyer(lawyer_link)
-                
-                system_prompt = """You are the best lawyer parser. Always respond with valid JSON format.
-                The JSON should include fields like name, practice_areas, education, and experience."""
-                
-                user_prompt = f"""Convert the text below into structured JSON data. 
-                Ensure the response is a valid JSON object.: 
-                
-                {scraped_data['raw_content']}"""
-
-                structured_data_str = await async_llm(system_prompt=system_prompt, user_prompt=user_prompt)
-                
-                # Clean up JSON response
-                structured_data_str = structured_data_str.strip()
-                if structured_data_str.startswith("```json"):
-                    structured_data_str = structured_data_str.split("```json")[1]
-                if structured_data_str.endswith("```"):
-                    structured_data_str = structured_data_str.rsplit("```", 1)[0]
-                
-                structured_data = json.loads(structured_data_str)
-
-                # Format text for embedding
-                lawyer_text = f"""
-                {scraped_data['raw_content']}
-                {' '.join([f'{k}: {v}' for k,v in structured_data.items()])}
-                """
-                print(lawyer_text)
-                
-                # Get embedding asynchronously
-                embedding = (await async_get_embedding([lawyer_text]))[0]
-                
-                return lawyer_link, {
-                    "raw_content": scraped_data["raw_content"],
-                    "structured_data": structured_data,
-                    "embedding": embedding
-                }
-            except Exception as e:
-                print(f"Error processing {lawyer_link}: {str(e)}")
-                return None
+    user_prompt = f"""Convert the text below into structured JSON data. 
+    Ensure the response is a valid JSON object.: 
     
-    # Create and run all tasks at once
-    tasks = [process_lawyer(link) for link in lawyer_links if link not in lawyers]
-    results = await asyncio.gather(*tasks)
+    {raw_content}"""
+
+    structured_data_str = await async_llm(system_prompt=system_prompt, user_prompt=user_prompt)
     
-    # Update lawyers dictionary and save to file
-    for result in results:
-        if result:
-            link, data = result
-            lawyers[link] = data
-            print(f"Writing data for lawyer link: {link}")
-            print_data = {
-                "raw_content": data["raw_content"],
-                "structured_data": data["structured_data"]
-            }
-            print(json.dumps(print_data, indent=2))
+    # Clean up JSON response
+    structured_data_str = structured_data_str.strip()
+    if structured_data_str.startswith("```json"):
+        structured_data_str = structured_data_str.split("```json")[1]
+    if structured_data_str.endswith("```"):
+        structured_data_str = structured_data_str.rsplit("```", 1)[0]
     
-    # Write all results to file at once
+    return json.loads(structured_data_str)
+
+async def complete_structured_data(scraped_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Complete a scraped profile's structured data.
+
+    Fields extracted from the page structure are kept as they are; the LLM is
+    only asked for the LLM_FALLBACK_FIELDS the page did not yield, so a fully
+    structured page costs no chat completion. Only those fields are taken from
+    its answer, so the record keeps the `ProfileSections` schema.
+    """
+    structured_data = dict(scraped_data.get('structured_data') or {})
+    missing = [field for field in LLM_FALLBACK_FIELDS if not structured_data.get(field)]
+    if missing:
+        parsed = await structure_with_llm(scraped_data['raw_content'], missing)
+        if isinstance(parsed, dict):
+            structured_data.update({field: parsed[field] for field in missing if parsed.get(field)})
+    return structured_data
+
+async def structure_and_embed(scraped_data: Dict[str, Any], embedder: EmbeddingBatcher = None) -> Dict[str, Any]:
+    """Complete a scraped profile's structured data and embed it."""
+    structured_data = await complete_structured_data(scraped_data)
+    embedding, chunks = await embed_profile(scraped_data["raw_content"], structured_data, embedder)
+    
+    return {
+        "raw_content": scraped_data["raw_content"],
+        "structured_data": structured_data,
+        "embedding": embedding,
+        "chunks": chunks
+    }
+
+async def embed_profile(raw_content: str, structured_data: Dict[str, Any],
+                        embedder: EmbeddingBatcher = None) -> Tuple[List[float], List[Tuple[str, str, List[float]]]]:
+    """
+    Embed a whole profile and its section chunks; returns (embedding, chunks).
+
+    With an `embedder` the texts share batched requests with other lawyers';
+    without one they go out as a request of their own.
+    """
+    # Format text for embedding
+    lawyer_text = f"""
+    {raw_content}
+    {' '.join([f'{k}: {v}' for k,v in structured_data.items()])}
+    """
+    logger.debug("Embedding lawyer text: %s", lawyer_text)
+
+    chunks = profile_chunks(raw_content, structured_data, CHUNK_MAX_WORDS, CHUNK_MAX_PER_LAWYER)
+    embed = embedder.embed if embedder is not None else async_get_embedding
+    embeddings = await embed([lawyer_text] + [text for _, text in chunks])
+    return embeddings[0], [(section, text, embedding) for (section, text), embedding in zip(chunks, embeddings[1:])]
+
+async def embed_missing_chunks(store: LawyerStore) -> int:
+    """Embed section chunks for stored lawyers that predate chunking. Returns the number of lawyers updated."""
+    urls = store.urls_without_chunks()
+    if not urls:
+        return 0
+    print(f"Embedding section chunks for {len(urls)} stored lawyers...")
+    embedder = EmbeddingBatcher()
+
+    async def embed_chunks(url):
+        profile = store.get(url)
+        chunks = profile_chunks(profile["raw_content"], profile["structured_data"], CHUNK_MAX_WORDS,
+                                CHUNK_MAX_PER_LAWYER)
+        embeddings = await embedder.embed([text for _, text in chunks]) if chunks else []
+        return url, [(section, text, embedding) for (section, text), embedding in zip(chunks, embeddings)]
+
+    updated = 0
+    for next_done in asyncio.as_completed([embed_chunks(url) for url in urls]):
+        try:
+            url, chunks = await next_done
+        except Exception as e:
+            logger.error("Error embedding chunks: %s", e)
+            continue
+        store.add_chunks(url, chunks)
+        updated += 1
+    return updated
+
+class PrecomputeProgress:
+    """Counts finished lawyers and reports throughput while precompute runs."""
+
+    def __init__(self, total: int, report_every: int = 25):
+        self.total = total
+        self.report_every = report_every
+        self.succeeded = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.usage_start = api_usage.copy()
+
+    def update(self, succeeded: bool):
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        if (self.succeeded + self.failed) % self.report_every == 0:
+            self.report()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        usage = api_usage - self.usage_start
+        tokens = sum(count for key, count in usage.items() if key.endswith('_tokens'))
+        print(f"Precompute: {self.succeeded + self.failed}/{self.total} done ({self.failed} failed) "
+              f"in {elapsed:.1f}s, {self.succeeded / elapsed:.2f} lawyers/sec, {tokens / elapsed:.0f} tokens/sec")
+
+async def _update_lawyer_data(store: LawyerStore = None, retry_failed: bool = False, lawyer_links: List[str] = None,
+                              cache: VerdictCache = None):
+    """
+    Scrape, structure and embed every lawyer that is not stored yet.
+
+    Lawyers are scraped and structured PRECOMPUTE_CONCURRENCY at a time, then
+    wait for an embedding request shared with other lawyers (see
+    `EmbeddingBatcher`). Each lawyer is committed to the store as soon as its
+    vectors arrive, so an interrupted run resumes where it stopped. Stored lawyers without section
+    chunks get them embedded first. Failures are recorded with their
+    attempt count; lawyers that failed PRECOMPUTE_MAX_ATTEMPTS times are skipped
+    unless `retry_failed` is set. `lawyer_links` defaults to the links CSV.
+    Cached verdicts of stored lawyers are dropped from `cache`, which defaults
+    to the shared `verifier.verdict_cache`.
+    """
+    if store is None:
+        store = open_lawyer_store()
+    cache = verifier.verdict_cache if cache is None else cache
+    lawyers = load_lawyers_data(store)
+    if lawyer_links is None:
+        lawyer_links = load_lawyer_links()
+    failed_attempts = store.failure_attempts()
+    pending = [
+        link for link in lawyer_links
+        if link not in lawyers and (retry_failed or failed_attempts.get(link, 0) < PRECOMPUTE_MAX_ATTEMPTS)
+    ]
+    skipped = sum(1 for link in lawyer_links if link not in lawyers) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} lawyers that failed {PRECOMPUTE_MAX_ATTEMPTS} times; use --retry-failed to retry")
+    await embed_missing_chunks(store)
+    if not pending:
+        if not os.path.exists(store.lexical_index_path):
+            build_lexical_index(store)
+        return
+
+    semaphore = asyncio.Semaphore(PRECOMPUTE_CONCURRENCY)
+    embedder = EmbeddingBatcher()
+
+    async def process_lawyer(lawyer_link, crawler):
+        try:
+            async with semaphore:
+                with span('precompute.scrape_and_structure'):
+                    scraped_data, structured_data = await scrape_and_structure(lawyer_link, crawler)
+            # Wait for the embedding batch outside the semaphore so the next lawyers are scraped meanwhile
+            with span('precompute.embed'):
+                embedding, chunks = await embed_profile(scraped_data["raw_content"], structured_data, embedder)
+        except Exception as e:
+            return lawyer_link, None, e
+        return lawyer_link, {
+            "raw_content": scraped_data["raw_content"],
+            "structured_data": structured_data,
+            "embedding": embedding,
+            "chunks": chunks,
+            "etag": scraped_data.get("etag"),
+            "last_modified": scraped_data.get("last_modified"),
+        }, None
+
+    progress = PrecomputeProgress(len(pending))
+    async with Crawler() as crawler:
+        for next_done in asyncio.as_completed([process_lawyer(link, crawler) for link in pending]):
+            link, data, error = await next_done
+            if error is not None:
+                logger.error("Error processing %s: %s", link, error)
+                store.record_failure(link, str(error))
+                progress.update(False)
+                continue
+            # Commit every lawyer as soon as it is ready so a crash loses at most the ones in flight
+            store.add(link, data["raw_content"], data["structured_data"], data["embedding"])
+            store.add_chunks(link, data["chunks"])
+            store.set_validators(link, data["etag"], data["last_modified"])
+            cache.invalidate([link])
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Wrote lawyer %s: %s", link, json.dumps({"raw_content": data["raw_content"],
+                                                                      "structured_data": data["structured_data"]}))
+            progress.update(True)
+    progress.report()
+    print(f"Embedding: {embedder.stats['texts']} texts in {embedder.stats['requests']} requests "
+          f"({embedder.stats['splits']} split after a failure)")
+
+    if progress.succeeded or not os.path.exists(store.lexical_index_path):
+        build_lexical_index(store)
+
+async def refresh_lawyer_data(store: LawyerStore = None, cache: VerdictCache = None) -> Dict[str, int]:
+    """
+    Re-scrape every stored lawyer and reprocess only the profiles whose text changed.
+
+    Pages are fetched with conditional GETs using the stored ETag/Last-Modified
+    validators. A 200 response whose extracted text hashes to the stored
+    content hash only refreshes the validators; LLM structuring and embedding
+    run just for profiles that actually changed. A lawyer whose page cannot be
+    scraped or processed is recorded as a failure and keeps its stored profile.
+
+    Args:
+        store (LawyerStore, optional): Store to refresh. Defaults to the configured store.
+        cache (VerdictCache, optional): Verdict cache to drop changed lawyers from. Defaults to the shared
+            `verifier.verdict_cache`.
+
+    Returns:
+        Dict[str, int]: Counts of 'not_modified', 'unchanged', 'changed' and 'failed' lawyers.
+    """
+    if store is None:
+        store = open_lawyer_store()
+    cache = verifier.verdict_cache if cache is None else cache
+    priority_token = request_priority.set(PRIORITY_BACKGROUND)
+    counts = Counter()
+    semaphore = asyncio.Semaphore(PRECOMPUTE_CONCURRENCY)
+    embedder = EmbeddingBatcher()
+
+    async def refresh_lawyer(lawyer_link, crawler):
+        etag, last_modified, stored_hash = store.validators(lawyer_link)
+        try:
+            async with semaphore:
+                scraped_data = await crawler.scrape(lawyer_link, etag, last_modified)
+                if not scraped_data:
+                    raise ValueError("Scrape returned no content")
+                if scraped_data.get("not_modified"):
+                    return lawyer_link, 'not_modified', scraped_data, None, None
+                if content_hash(scraped_data["raw_content"]) == stored_hash:
+                    return lawyer_link, 'unchanged', scraped_data, None, None
+                structured_data = await complete_structured_data(scraped_data)
+            # As in the update, wait for the embedding batch outside the semaphore so crawling goes on meanwhile
+            embedding, chunks = await embed_profile(scraped_data["raw_content"], structured_data, embedder)
+        except Exception as e:
+            return lawyer_link, 'failed', None, None, e
+        return lawyer_link, 'changed', scraped_data, {
+            "raw_content": scraped_data["raw_content"],
+            "structured_data": structured_data,
+            "embedding": embedding,
+            "chunks": chunks,
+        }, None
+
+    try:
+        async with Crawler() as crawler:
+            for next_done in asyncio.as_completed([refresh_lawyer(link, crawler) for link in store.urls()]):
+                link, status, scraped_data, data, error = await next_done
+                counts[status] += 1
+                if error is not None:
+                    # One bad page only fails its own lawyer, which keeps its stored profile
+                    logger.error("Error refreshing %s: %s", link, error)
+                    store.record_failure(link, str(error))
+                    continue
+                if status == 'changed':
+                    store.add(link, data["raw_content"], data["structured_data"], data["embedding"])
+                    store.add_chunks(link, data["chunks"])
+                    cache.invalidate([link])
+                    logger.info("Profile changed, updated: %s", link)
+                store.set_validators(link, scraped_data.get("etag"), scraped_data.get("last_modified"))
+    finally:
+        request_priority.reset(priority_token)
+
+    if counts['changed']:
+        build_lexical_index(store)
+    print(f"Refresh: {counts['changed']} changed, {counts['unchanged']} unchanged, "
+          f"{counts['not_modified']} not modified, {counts['failed']} failed")
+    return dict(counts)
+
+async def reembed_lawyer_data(db_path: str = LAWYER_DB_PATH, embeddings_path: str = LAWYER_EMBEDDINGS_PATH,
+                              chunk_embeddings_path: str = LAWYER_CHUNK_EMBEDDINGS_PATH) -> int:
+    """
+    Re-embed every stored profile with the configured embedding backend, without scraping or the LLM.
+
+    Profiles are copied into a new store next to the old one, which only
+    replaces the old store once every lawyer has been re-embedded, so an
+    interrupted run leaves the old store untouched.
+
+    Returns:
+        int: Number of lawyers re-embedded.
+    """
+    paths = (db_path, embeddings_path, chunk_embeddings_path)
+    new_paths = [f"{path}.reembed" for path in paths]
+    for path in new_paths:
+        if os.path.exists(path):
+            os.remove(path)
+    source = LawyerStore(*paths)
+    target = LawyerStore(*new_paths, embedding_space=configured_embedding_space())
+    print(f"Re-embedding {len(source)} lawyers from {source.embedding_space} with {target.embedding_space}...")
+    priority_token = request_priority.set(PRIORITY_BACKGROUND)
+    embedder = EmbeddingBatcher()
+
+    async def reembed(url, raw_content, structured_data):
+        return url, raw_content, structured_data, await embed_profile(raw_content, structured_data, embedder)
+
+    progress = PrecomputeProgress(len(source))
     try:
-        with open('lawyer_data.json', 'w') as f:
-            json.dump(lawyers, f, indent=2)
-        print("All data successfully written to lawyer_data.json")
-    except Exception as e:
-        print(f"Failed to write data to lawyer_data.json: {e}")
+        for next_done in asyncio.as_completed([reembed(*profile) for profile in source.iter_profiles()]):
+            url, raw_content, structured_data, (embedding, chunks) = await next_done
+            target.add(url, raw_content, structured_data, embedding)
+            target.add_chunks(url, chunks)
+            etag, last_modified, _ = source.validators(url)
+            target.set_validators(url, etag, last_modified)
+            progress.update(True)
+    finally:
+        request_priority.reset(priority_token)
+        source.close()
+        target.close()
+    progress.report()
+    print(f"Embedding: {embedder.stats['texts']} texts in {embedder.stats['requests']} requests")
+
+    for new_path, path in zip(new_paths, paths):
+        if os.path.exists(new_path):
+            os.replace(new_path, path)
+        elif os.path.exists(path):
+            os.remove(path)
+    return progress.succeeded
 
 # Run the async function using asyncio
 if __name__ == "__main__":
-    asyncio.run(update_lawyer_data())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape, structure and embed lawyer profiles")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help=f"Retry lawyers that already failed {PRECOMPUTE_MAX_ATTEMPTS} times")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Re-scrape stored lawyers and reprocess only the profiles that changed")
+    parser.add_argument('--reembed', action='store_true',
+                        help="Re-embed the stored profiles with the configured EMBEDDING_BACKEND")
+    args = parser.parse_args()
+    configure_logging()
+    with start_trace('precompute', kind='precompute') as trace:
+        if args.reembed:
+            asyncio.run(reembed_lawyer_data())
+        elif args.refresh:
+            asyncio.run(refresh_lawyer_data())
+        else:
+            asyncio.run(update_lawyer_data(retry_failed=args.retry_failed))
+    print(trace_table(trace))
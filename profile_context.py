@@ -0,0 +1,129 @@
+import json
+from typing import Any, Dict, List, Tuple
+from search_index import lexical_tokens, tokenize
+from constants import VERIFY_CONTEXT_TOKEN_BUDGET
+
+# Sections are always written in this order, whatever the query, so a profile's
+# context is stable and identical selections produce identical prompts
+SECTION_ORDER = ('name', 'title', 'offices', 'practice_areas', 'education', 'clerkships', 'bar_admissions',
+                 'experience', 'email', 'phone')
+SECTION_LABELS = {
+    'practice_areas': 'Practice areas',
+    'bar_admissions': 'Bar admissions',
+}
+# Sent with every context so the model knows who it is judging
+IDENTITY_SECTIONS = ('name', 'title')
+# Query words that make a whole section relevant even when none of its entries share a word with the query
+SECTION_HINTS = {
+    'title': {'partner', 'partners', 'counsel', 'associate', 'associates', 'title', 'senior'},
+    'offices': {'office', 'offices', 'based', 'located', 'city'},
+    'practice_areas': {'practice', 'practices', 'practicing', 'specialize', 'specializes', 'specializing', 'focus',
+                       'group', 'area', 'areas'},
+    'education': {'school', 'college', 'university', 'graduated', 'graduate', 'degree', 'went', 'attended',
+                  'studied', 'alumni', 'alumnus', 'jd', 'llm', 'class'},
+    'clerkships': {'clerk', 'clerked', 'clerkship', 'clerkships', 'judge', 'justice', 'court'},
+    'bar_admissions': {'bar', 'admitted', 'admission', 'admissions', 'licensed'},
+    'experience': {'case', 'cases', 'matter', 'matters', 'client', 'clients', 'represented', 'representing',
+                   'advised', 'advising', 'deal', 'deals', 'transaction', 'transactions', 'worked', 'litigation',
+                   'companies', 'company', 'acquisition', 'acquisitions', 'offering', 'investigation'},
+    'email': {'email'},
+    'phone': {'phone', 'telephone', 'number'},
+}
+
+
+def section_items(value: Any) -> List[str]:
+    """Flatten one structured_data value into the entries written to the context."""
+    if value is None or value == '' or value == []:
+        return []
+    if isinstance(value, list):
+        return [text for item in value for text in section_items(item)]
+    if isinstance(value, dict):
+        if 'school' in value or 'degree' in value:
+            return [', '.join(str(value[k]) for k in ('degree', 'school', 'year') if value.get(k))]
+        return [json.dumps(value, separators=(',', ':'), ensure_ascii=False)]
+    return [' '.join(str(value).split())]
+
+
+def profile_sections(structured_data: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """The profile's non-empty sections as (key, entries), in serialization order."""
+    keys = [k for k in SECTION_ORDER if k in structured_data] + sorted(k for k in structured_data
+                                                                         if k not in SECTION_ORDER)
+    sections = [(key, section_items(structured_data[key])) for key in keys]
+    return [(key, items) for key, items in sections if items]
+
+
+def section_label(key: str) -> str:
+    return SECTION_LABELS.get(key, key.replace('_', ' ').capitalize())
+
+
+def build_profile_context(structured_data: Any, query: str, token_budget: int = VERIFY_CONTEXT_TOKEN_BUDGET,
+                          whole_hinted_sections: bool = False) -> str:
+    """
+    Serialize only the parts of a profile that are relevant to a query, within a token budget.
+
+    An entry is relevant when it shares a word with the query; a whole section is
+    relevant when the query uses one of its SECTION_HINTS (e.g. "went to" for
+    education). Relevant entries are added best first until the budget is spent,
+    then written one section per line in SECTION_ORDER, so the output only
+    depends on which entries were chosen. A query that hints at a section the
+    profile lacks gets just the lawyer's name and title. When neither words nor
+    hints say what the query is about, the whole profile is sent, truncated to
+    the budget, rather than guessing.
+
+    Free-form queries rarely share words with their evidence ("TV network" does
+    not match "NBCUniversal"), so with `whole_hinted_sections` every entry of a
+    hinted section is sent whatever the budget, and only the remaining entries
+    compete for it.
+
+    Args:
+        structured_data: The lawyer's structured profile. Strings are returned unchanged.
+        query (str): Criterion the profile will be judged against.
+        token_budget (int): Maximum estimated tokens of the context (about 4 characters per token).
+        whole_hinted_sections (bool): Send hinted sections in full instead of cutting them to the budget.
+
+    Returns:
+        str: Lines of the form "Label: entry; entry".
+    """
+    if isinstance(structured_data, str):
+        return structured_data
+    sections = profile_sections(structured_data)
+    query_words = set(lexical_tokens(query))
+    query_tokens = set(tokenize(query))
+
+    # (hits, hinted, -position) ranks entries sharing words with the query first, then hinted sections
+    scored = []
+    position = 0
+    for s, (key, items) in enumerate(sections):
+        hinted = bool(SECTION_HINTS.get(key, set()) & query_tokens)
+        for i, item in enumerate(items):
+            hits = len(query_words & set(lexical_tokens(item)))
+            scored.append(((hits, hinted, -position), s, i))
+            position += 1
+    relevant = [entry for entry in scored if entry[0][0] or entry[0][1]]
+    if not relevant and not any(hints & query_tokens for hints in SECTION_HINTS.values()):
+        relevant = scored
+
+    chosen = {(s, i) for s, (key, items) in enumerate(sections) if key in IDENTITY_SECTIONS
+              for i in range(len(items))}
+    if whole_hinted_sections:
+        chosen.update((s, i) for (hits, hinted, _), s, i in relevant if hinted)
+    used_sections = {s for s, _ in chosen}
+    budget_chars = token_budget * 4
+    used_chars = (sum(len(sections[s][1][i]) + 2 for s, i in chosen)
+                  + sum(len(sections[s][0]) + 3 for s in used_sections))
+    for _, s, i in sorted(relevant, reverse=True):
+        if (s, i) in chosen:
+            continue
+        cost = len(sections[s][1][i]) + 2 + (len(sections[s][0]) + 3 if s not in used_sections else 0)
+        if used_chars + cost > budget_chars:
+            continue
+        chosen.add((s, i))
+        used_sections.add(s)
+        used_chars += cost
+
+    lines = []
+    for s, (key, items) in enumerate(sections):
+        kept = [item for i, item in enumerate(items) if (s, i) in chosen]
+        if kept:
+            lines.append(f"{section_label(key)}: {'; '.join(kept)}")
+    return '\n'.join(lines)
@@ -0,0 +1,68 @@
+import re
+from models import QueryRoute
+
+# Leading filler such as "Find all lawyers who were" that carries no constraint
+PREFIX_PATTERN = re.compile(
+    r"^(?:(?:find|show|list|get|give)(?:\s+me)?\s+)?(?:all\s+)?(?:the\s+)?"
+    r"(?:(?:lawyers?|attorneys?|people|partners?|associates?|counsel)\s+)?"
+    r"(?:(?:who|that|whose)\s+)?(?:(?:are|were|is|was|have|has|had|did)\s+)?",
+    re.IGNORECASE
+)
+NAME_PATTERN = re.compile(
+    r"^(?:named|called|(?:with\s+(?:the\s+)?|whose\s+)?(?:first\s+|last\s+|sur)?name(?:\s+is|\s+of)?)\s+"
+    r"['\"]?([A-Za-z][\w'.-]*(?:\s+[A-Za-z][\w'.-]*)?)['\"]?$",
+    re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(
+    r"^(?:graduated(?:\s+from)?(?:\s+law\s+school)?|"
+    r"(?:got|received|earned|obtained)\s+(?:their|a|his|her)\s+(?:law\s+degree|j\.?d\.?|degree)|"
+    r"(?:in\s+(?:the\s+)?)?(?:law\s+school\s+)?class\s+of)\s+"
+    r"(?:(after|since|later\s+than|before|prior\s+to|earlier\s+than|in)\s+)?((?:19|20)\d{2})$",
+    re.IGNORECASE
+)
+SCHOOL_PATTERN = re.compile(
+    r"^(?:went\s+to|attended|graduated\s+from|studied\s+at|alum(?:ni|nus|nae|na)?\s+of|"
+    r"(?:got|received|earned)\s+(?:their|a|his|her)\s+(?:\w+\s+)?degree\s+from)\s+(?:the\s+)?(.+)$",
+    re.IGNORECASE
+)
+PRACTICE_PATTERN = re.compile(
+    r"^(?:practi[cs]e|practi[cs]ing|specializ\w*\s+in|work(?:s|ing)?\s+in|focus(?:es|ed)?\s+on)\s+"
+    r"(?:in\s+)?(?:the\s+)?(.+?)(?:\s+practice(?:\s+areas?)?|\s+law)?$",
+    re.IGNORECASE
+)
+LAW_DEGREE_PATTERN = re.compile(r"\blaw\b|\bj\.?d\b", re.IGNORECASE)
+
+COMPARATORS = {
+    'after': '>', 'later than': '>', 'since': '>=',
+    'before': '<', 'prior to': '<', 'earlier than': '<',
+    'in': '=', None: '=',
+}
+
+
+def route_query(query: str) -> QueryRoute:
+    """
+    Classify a query as a name, school, graduation year, practice area or free-form query.
+
+    Only queries that consist of a single structured constraint are routed to a
+    field; anything compound or open-ended is 'free_form' and goes through
+    embeddings and the LLM. A structured route can still fall back to the LLM
+    path if the `FieldIndex` cannot answer it.
+
+    Args:
+        query (str): The user's search query.
+
+    Returns:
+        QueryRoute: The route with the extracted value.
+    """
+    body = PREFIX_PATTERN.sub('', ' '.join(query.split()).rstrip('?.!'), count=1)
+    if match := YEAR_PATTERN.match(body):
+        comparator = match.group(1) and ' '.join(match.group(1).lower().split())
+        return QueryRoute(kind='graduation_year', value=match.group(2), comparator=COMPARATORS[comparator],
+                          law_degree_only=bool(LAW_DEGREE_PATTERN.search(body)))
+    if match := NAME_PATTERN.match(body):
+        return QueryRoute(kind='name', value=match.group(1))
+    if match := SCHOOL_PATTERN.match(body):
+        return QueryRoute(kind='school', value=match.group(1))
+    if match := PRACTICE_PATTERN.match(body):
+        return QueryRoute(kind='practice_area', value=match.group(1))
+    return QueryRoute(kind='free_form')
@@ -1,15 +1,17 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ProcessPoolExecutor
 import logging
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
 import json
+import random
 import re
-from models import LawyerProfile
-from constants import IS_TEST
+from models import EducationEntry, LawyerProfile, PageFetch, ProfileSections
+from constants import (IS_TEST, CRAWL_CONCURRENCY, CRAWL_PER_HOST_LIMIT, CRAWL_REQUESTS_PER_SECOND, CRAWL_TIMEOUT,
+                       CRAWL_CONNECT_TIMEOUT, CRAWL_KEEPALIVE_TIMEOUT, CRAWL_MAX_RETRIES, PARSE_WORKERS)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Add browser-like headers
@@ -18,50 +20,237 @@ HEADERS = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
     'Accept-Language': 'en-US,en;q=0.5',
 }
+# Fetch statuses worth retrying; 0 means the request itself failed (timeout, reset connection)
+RETRYABLE_STATUSES = {0, 429, 500, 502, 503, 504}
+# Only build the <main> subtree when parsing a profile page
+MAIN_STRAINER = SoupStrainer('main')
+
+HEADING_TAGS = ['h2', 'h3', 'h4', 'h5']
+# Normalized section headings -> ProfileSections list field
+SECTION_HEADINGS = {
+    'education': 'education',
+    'bar admissions': 'bar_admissions',
+    'bar admission': 'bar_admissions',
+    'admissions': 'bar_admissions',
+    'clerkships': 'clerkships',
+    'clerkship': 'clerkships',
+    'judicial clerkships': 'clerkships',
+    'practices': 'practice_areas',
+    'practice areas': 'practice_areas',
+    'practice': 'practice_areas',
+    'experience': 'experience',
+    'selected experience': 'experience',
+    'representative experience': 'experience',
+    'representative matters': 'experience',
+}
+DEGREE_PATTERN = re.compile(
+    r"^(?:J\.?D|LL\.?[MB]|B\.?A|A\.?B|B\.?S(?:c)?|M\.?B\.?A|M\.?A|M\.?S(?:c)?|Ph\.?D|D\.?Phil|M\.?Phil|"
+    r"B\.?C\.?L|B\.?Eng|M\.?P\.?P|M\.?P\.?A|Diploma|Certificate)\.?$",
+    re.IGNORECASE
+)
+SCHOOL_PATTERN = re.compile(r"universit|college|school|institut|law cent|academy|polytechnic|sciences po", re.IGNORECASE)
+HONORS_PATTERN = re.compile(r"laude|honou?rs|distinction|scholar|order of the coif|editor|member", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(?:19|20)\d{2}\b")
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
 
 async def fetch_page(url: str, session: aiohttp.ClientSession) -> str:
     """Fetch a single page and return its HTML content"""
+    return (await fetch_page_conditional(url, session)).html
+
+async def fetch_page_conditional(url: str, session: aiohttp.ClientSession, etag: Optional[str] = None,
+                                 last_modified: Optional[str] = None) -> PageFetch:
+    """
+    Fetch a page, sending If-None-Match/If-Modified-Since when validators are known.
+
+    Returns a PageFetch with status 304 and no HTML if the page has not changed,
+    and status 0 if the request itself failed.
+    """
+    headers = dict(HEADERS)
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
     try:
-        async with session.get(url, headers=HEADERS) as response:
+        async with session.get(url, headers=headers) as response:
+            fetch = PageFetch(
+                url=url,
+                status=response.status,
+                etag=response.headers.get('ETag', etag),
+                last_modified=response.headers.get('Last-Modified', last_modified),
+            )
             if response.status == 200:
-                return await response.text()
-            else:
+                fetch.html = await response.text()
+            elif response.status != 304:
                 logger.error(f"Error fetching {url}: Status {response.status}")
-                return ""
+            return fetch
     except Exception as e:
         logger.error(f"Exception while fetching {url}: {e}")
-        return ""
+        return PageFetch(url=url, status=0)
+
+def main_content_element(html: str):
+    """Parse a page and return its main content element with header and footer removed."""
+    # Parse only the <main> subtree with lxml; pages without one get a full parse
+    soup = BeautifulSoup(html, 'lxml', parse_only=MAIN_STRAINER)
+    main_content = soup.find('main')
+    if main_content is None:
+        soup = BeautifulSoup(html, 'lxml')
+        main_content = soup.find('div', class_='main-content') or soup
+
+    # Remove header and footer
+    for elem in main_content.find_all(['header', 'footer']):
+        elem.decompose()
+    return main_content
 
 def extract_main_content(html: str) -> str:
     """Extract main content from HTML, ignoring header and footer"""
     try:
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # Remove header and footer
-        for elem in soup.find_all(['header', 'footer']):
-            elem.decompose()
-            
-        # Find main content
-        main_content = soup.find('main') or soup.find('div', class_='main-content')
-        return main_content.get_text(strip=True) if main_content else soup.get_text(strip=True)
-            
+        # One line per text node, so sections and list items stay separated
+        return main_content_element(html).get_text(separator='\n', strip=True)
     except Exception as e:
         logger.error(f"Error parsing HTML: {e}")
         return ""
 
-async def scrape_lawyer_profile(url: str, session: aiohttp.ClientSession) -> dict:
-    """Scrape a single lawyer's profile and return structured data"""
-    html = await fetch_page(url, session)
-    if not html:
+def parse_profile_html(html: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extract a profile page's main content text and its structured sections from one parse.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The raw content and a `ProfileSections` dict,
+        with email and phone falling back to regex matches in the text, and any
+        "Bar No." found in the text as `bar_numbers`.
+    """
+    try:
+        main_content = main_content_element(html)
+    except Exception as e:
+        logger.error(f"Error parsing HTML: {e}")
+        return "", {}
+    raw_content = main_content.get_text(separator='\n', strip=True)
+    sections = extract_profile_sections(main_content)
+    basic_info = extract_basic_info(raw_content)
+    sections["email"] = sections["email"] or basic_info.get("email")
+    sections["phone"] = sections["phone"] or basic_info.get("phone")
+    sections["bar_numbers"] = basic_info.get("bar_numbers")
+    return raw_content, sections
+
+def extract_profile_sections(main_content) -> Dict[str, Any]:
+    """
+    Pull the standard profile fields out of a profile page's DOM.
+
+    The name is the page's <h1>, offices and practices come from links into the
+    site's office and practice pages, contact details from mailto:/tel: links,
+    and the list sections (education, bar admissions, clerkships, practices,
+    experience) from the items that follow their section headings.
+
+    Args:
+        main_content: The element returned by `main_content_element`.
+
+    Returns:
+        Dict[str, Any]: A `ProfileSections` dict; fields missing from the page are empty.
+    """
+    sections = ProfileSections()
+    if heading := main_content.find('h1'):
+        sections.name = _text(heading)
+        sections.title = _profile_title(main_content, heading)
+    sections.offices = _unique(_text(a) for a in main_content.select('a[href*="/offices/"]'))
+    if email := main_content.select_one('a[href^="mailto:"]'):
+        sections.email = email['href'][len('mailto:'):].strip()
+    if phone := main_content.select_one('a[href^="tel:"]'):
+        sections.phone = _text(phone) or phone['href'][len('tel:'):].strip()
+
+    items = {}
+    for heading in main_content.find_all(HEADING_TAGS):
+        field = SECTION_HEADINGS.get(' '.join(re.sub(r'[^\w\s]', ' ', _text(heading).lower()).split()))
+        if field and field not in items:
+            items[field] = _section_items(heading)
+    sections.education = [parse_education_entry(entry) for entry in items.get('education', [])]
+    sections.bar_admissions = items.get('bar_admissions', [])
+    sections.clerkships = items.get('clerkships', [])
+    sections.practice_areas = items.get('practice_areas') or _unique(
+        _text(a) for a in main_content.select('a[href*="/practices/"]')
+    )
+    sections.experience = items.get('experience', [])
+    return sections.model_dump()
+
+def parse_education_entry(text: str) -> EducationEntry:
+    """Split an entry such as "J.D., Yale Law School, 2015" into school, degree and year."""
+    years = YEAR_PATTERN.findall(text)
+    parts = [part.strip() for part in re.split(r",|;|\s[-\u2013\u2014]\s", text) if part.strip()]
+    degree = next((part for part in parts if DEGREE_PATTERN.match(part)), None)
+    school = next((part for part in parts if SCHOOL_PATTERN.search(part)), None)
+    if school is None:
+        rest = [part for part in parts
+                if part != degree and not YEAR_PATTERN.fullmatch(part) and not HONORS_PATTERN.search(part)]
+        school = rest[0] if rest else None
+    return EducationEntry(school=school, degree=degree, year=int(years[-1]) if years else None)
+
+def _text(element) -> str:
+    return ' '.join(element.get_text(' ', strip=True).split())
+
+def _unique(values) -> List[str]:
+    return list(dict.fromkeys(value for value in values if value))
+
+def _profile_title(main_content, name_heading) -> Optional[str]:
+    """The lawyer's title: an element whose class names a title, else the first short text after the name."""
+    for element in main_content.find_all(class_=re.compile(r"title|position|role", re.IGNORECASE)):
+        if element is not name_heading and (text := _text(element)) and len(text) < 80:
+            return text
+    sibling = name_heading.find_next_sibling()
+    if sibling is not None and (text := _text(sibling)) and len(text) < 80:
+        return text
+    return None
+
+def _section_items(heading) -> List[str]:
+    """Text of the list items (or paragraphs) between a section heading and the next heading."""
+    items = []
+    for sibling in heading.find_next_siblings():
+        if sibling.name in HEADING_TAGS or sibling.name == 'h1':
+            break
+        if sibling.name == 'li':
+            items.append(_text(sibling))
+        elif list_items := sibling.find_all('li'):
+            items.extend(_text(li) for li in list_items)
+        else:
+            items.extend(line for line in sibling.get_text('\n', strip=True).split('\n') if line)
+    return [item for item in items if item]
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all HTML parsing, created on first use."""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _parse_pool
+
+async def run_in_parse_pool(func, *args):
+    """Run a parsing function in the parse pool so parsing never blocks the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(get_parse_pool(), func, *args)
+
+async def scrape_lawyer_profile(url: str, session: aiohttp.ClientSession, etag: Optional[str] = None,
+                                last_modified: Optional[str] = None) -> dict:
+    """
+    Scrape a single lawyer's profile and return structured data.
+
+    With validators from an earlier scrape, an unchanged page comes back as
+    {"url", "not_modified": True, "etag", "last_modified"} without being parsed.
+    """
+    return await profile_from_page(await fetch_page_conditional(url, session, etag, last_modified))
+
+async def profile_from_page(page: PageFetch) -> dict:
+    """Turn a fetched profile page into the scrape result returned by `scrape_lawyer_profile`."""
+    url = page.url
+    if page.not_modified:
+        return {"url": url, "not_modified": True, "etag": page.etag, "last_modified": page.last_modified}
+    if not page.html:
         return {}
         
-    raw_content = extract_main_content(html)
-    parsed_data = await parse_lawyer_profile(raw_content)
+    raw_content, structured_data = await run_in_parse_pool(parse_profile_html, page.html)
     
     return {
         "url": url,
         "raw_content": raw_content,
-        "structured_data": parsed_data
+        "structured_data": structured_data,
+        "etag": page.etag,
+        "last_modified": page.last_modified
     }
 
 async def scrape_all_lawyers() -> list[dict]:
@@ -77,32 +266,14 @@ async def scrape_all_lawyers() -> list[dict]:
     test_urls = urls[:3]  # Start with 3 URLs for testing
     logger.info(f"Scraping {len(test_urls)} lawyers...")
     
-    async with aiohttp.ClientSession() as session:
-        tasks = [scrape_lawyer_profile(url, session) for url in test_urls]
-        results = await asyncio.gather(*tasks)
-        
-        # Log results
-        for result in results:
+    results = []
+    async with Crawler() as crawler:
+        async for url, result in crawler.crawl(test_urls):
             if result:  # Only log non-empty results
                 logger.info(f"Successfully scraped: {result['url']}")
                 logger.info(f"Content preview: {result['raw_content'][:200]}...")
-        
-        return results
-
-async def parse_lawyer_profile(raw_content: str) -> Dict[str, Any]:
-    """Parse lawyer profile using both regex and GPT"""
-    
-    # First pass: Use regex for reliable structured data
-    basic_info = extract_basic_info(raw_content)
-    
-    try:
-        # Combine regex and GPT results
-        return {
-            **basic_info,
-        }
-    except Exception as e:
-        logger.error(f"Error parsing profile with GPT: {e}")
-        return basic_info
+            results.append(result)
+    return results
 
 def extract_basic_info(text: str) -> Dict[str, str]:
     """Extract basic information using regex"""
@@ -124,16 +295,132 @@ def extract_basic_info(text: str) -> Dict[str, str]:
             
     return info
 
-async def scrape_lawyer(url: str) -> LawyerProfile:
+async def scrape_lawyer(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> LawyerProfile:
     logger.info(f"Scraping lawyer profile from: {url}")
 
-    async with aiohttp.ClientSession() as session:
-        result = await scrape_lawyer_profile(url, session)
+    async with Crawler(concurrency=1) as crawler:
+        result = await crawler.scrape(url, etag, last_modified)
 
-        if result:
+        if result.get("not_modified"):
+            logger.info(f"Not modified since last scrape: {url}")
+        elif result:
             logger.info(f"Successfully scraped: {result['url']}")
             logger.info(f"Content preview: {result['raw_content'][:200]}...")
         else:
-            logger.error(f"Failed to scrape: {link}")
+            logger.error(f"Failed to scrape: {url}")
             
-        return result
\ No newline at end of file
+        return result
+
+class RateLimiter:
+    """Spaces request starts at least 1 / `requests_per_second` seconds apart."""
+
+    def __init__(self, requests_per_second: Optional[float]):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_start = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start)
+        self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class Crawler:
+    """
+    Polite crawler built around one pooled aiohttp session.
+
+    All requests share a connection pool with a per-host connection limit and
+    keep-alive, so a crawl of the whole site reuses a handful of connections
+    instead of opening one pool (DNS lookup, TLS handshake) per page. Request
+    starts are rate limited, every request has a timeout, and failed or
+    throttled fetches are retried with jittered exponential backoff.
+
+    Use as an async context manager:
+
+        async with Crawler() as crawler:
+            async for url, result in crawler.crawl(load_lawyer_links()):
+                ...
+
+    Args:
+        concurrency (int): Maximum requests in flight, and total pool size.
+        per_host_limit (int): Maximum open connections to a single host.
+        requests_per_second (float): Maximum request starts per second; 0 or None disables the limit.
+        timeout (float): Total seconds allowed for one request.
+        max_retries (int): Retries for a fetch that failed or got a 429/5xx status.
+    """
+
+    def __init__(self, concurrency: int = CRAWL_CONCURRENCY, per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+                 requests_per_second: Optional[float] = CRAWL_REQUESTS_PER_SECOND, timeout: float = CRAWL_TIMEOUT,
+                 max_retries: int = CRAWL_MAX_RETRIES):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'Crawler':
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host_limit,
+            keepalive_timeout=CRAWL_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout, connect=min(CRAWL_CONNECT_TIMEOUT, self.timeout))
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> PageFetch:
+        """Fetch a page through the shared session, retrying failures and 429/5xx responses."""
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.wait()
+            page = await fetch_page_conditional(url, self.session, etag, last_modified)
+            if page.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                return page
+            delay = min(2 ** attempt, 30) * random.uniform(0.5, 1.0)
+            logger.info(f"Retrying {url} in {delay:.1f}s (status {page.status})")
+            await asyncio.sleep(delay)
+
+    async def scrape(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> dict:
+        """Fetch and parse one profile; same result as `scrape_lawyer_profile`."""
+        return await profile_from_page(await self.fetch(url, etag, last_modified))
+
+    async def crawl(self, urls: Iterable[str]) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Scrape a stream of profile URLs, yielding (url, result) as each page completes.
+
+        URLs are pulled from the iterable only as slots free up, so at most
+        `concurrency` pages are in flight and the stream can be arbitrarily long.
+        A failed page yields an empty result.
+        """
+        urls = iter(urls)
+        in_flight = {}
+
+        def schedule():
+            for url in urls:
+                in_flight[asyncio.ensure_future(self.scrape(url))] = url
+                if len(in_flight) >= self.concurrency:
+                    return
+
+        schedule()
+        try:
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        # e.g. a page the parser chokes on; the rest of the crawl goes on
+                        logger.error(f"Error scraping {url}: {e}")
+                        result = {}
+                    yield url, result
+                schedule()
+        finally:
+            for task in in_flight:
+                task.cancel()
@@ -0,0 +1,597 @@
+import os
+import re
+import numpy as np
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from models import CandidateStrategy, QueryRoute
+
+
+class EmbeddingIndex:
+    """
+    In-memory index over lawyer embeddings.
+
+    Holds a contiguous float32 matrix of L2-normalized vectors and a parallel
+    array of lawyer URLs, so that cosine similarity against every lawyer is a
+    single matrix-vector product.
+    """
+
+    def __init__(self, urls: Sequence[str], matrix: np.ndarray):
+        if len(urls) != matrix.shape[0]:
+            raise ValueError(f"Got {len(urls)} urls for {matrix.shape[0]} embedding rows")
+        self.urls = np.asarray(urls, dtype=object)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    @classmethod
+    def from_embeddings(cls, embeddings: Dict[str, List[float]]) -> 'EmbeddingIndex':
+        """
+        Build an index from a mapping of lawyer URLs to raw embeddings.
+
+        Args:
+            embeddings (Dict[str, List[float]]): Dictionary of lawyer URLs to their embeddings.
+
+        Returns:
+            EmbeddingIndex: Index holding the normalized embedding matrix.
+        """
+        urls = list(embeddings)
+        if not urls:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        matrix = np.array([embeddings[url] for url in urls], dtype=np.float32)
+        return cls(urls, normalize_rows(matrix))
+
+    @classmethod
+    def from_lawyers(cls, lawyers_dict: Dict[str, dict]) -> 'EmbeddingIndex':
+        """Build an index from the dictionary returned by `load_lawyers_data`."""
+        return cls.from_embeddings({url: data['embedding'] for url, data in lawyers_dict.items()})
+
+    @classmethod
+    def from_store(cls, store) -> 'EmbeddingIndex':
+        """
+        Build an index over the memory-mapped vectors of a `LawyerStore`.
+
+        Stored vectors are already normalized, so when every row on disk is live
+        the memory map is used as the matrix directly without copying.
+        """
+        urls, rows = store.manifest()
+        return cls(urls, live_rows(store.vectors(), rows))
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Cosine similarity of one query embedding against every lawyer."""
+        if not len(self):
+            return np.zeros(0, dtype=np.float32)
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+        return self.matrix @ query
+
+    def batch_scores(self, query_embeddings) -> np.ndarray:
+        """Cosine similarity of several query embeddings, shape (n_queries, n_lawyers)."""
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        if not len(self):
+            return np.zeros((queries.shape[0], 0), dtype=np.float32)
+        return queries @ self.matrix.T
+
+    def search(self, query_embedding, cutoff_threshold: Optional[float] = None,
+               top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Rank lawyers against a single query embedding.
+
+        Args:
+            query_embedding: Embedding of the query.
+            cutoff_threshold (float, optional): Minimum similarity to keep.
+            top_k (int, optional): Maximum number of results to keep.
+
+        Returns:
+            List[Tuple[str, float]]: (url, similarity) pairs sorted by similarity, descending.
+        """
+        return self._rank(self.scores(query_embedding), cutoff_threshold, top_k)
+
+    def search_batch(self, query_embeddings, cutoff_threshold: Optional[float] = None,
+                     top_k: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """Rank lawyers against several query embeddings scored in one matmul."""
+        return [self._rank(row, cutoff_threshold, top_k) for row in self.batch_scores(query_embeddings)]
+
+    def search_strategies(self, query_embeddings,
+                          strategies: Sequence[CandidateStrategy]) -> List[List[Tuple[str, float]]]:
+        """Rank lawyers against several query embeddings, cutting each ranking with its own strategy."""
+        return [
+            apply_candidate_strategy(self._rank(row, strategy.threshold, strategy.top_k), strategy)
+            for row, strategy in zip(self.batch_scores(query_embeddings), strategies)
+        ]
+
+    def _rank(self, scores: np.ndarray, cutoff_threshold: Optional[float],
+              top_k: Optional[int]) -> List[Tuple[str, float]]:
+        if cutoff_threshold is not None:
+            candidates = np.flatnonzero(scores >= cutoff_threshold)
+        else:
+            candidates = np.arange(scores.shape[0])
+        if top_k is not None and top_k < candidates.shape[0]:
+            if top_k <= 0:
+                return []
+            partitioned = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[partitioned]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.urls[i], float(scores[i])) for i in order]
+
+
+class ChunkIndex(EmbeddingIndex):
+    """
+    Index over several vectors per lawyer: the whole-profile vector plus one per section chunk.
+
+    A lawyer scores as the best similarity of any of their vectors (max-sim), so
+    a query about one matter or one clerkship matches that chunk directly instead
+    of being diluted by the rest of the profile. Profile vectors stay in `matrix`
+    as in `EmbeddingIndex`, and chunk vectors in a second matrix whose rows are
+    grouped by lawyer; `chunk_owners` maps every chunk row to its lawyer, so
+    scoring is two matmuls and a `np.maximum.reduceat` over the chunk scores.
+    Keeping the two apart lets both matrices be the store's memory maps as they are.
+    """
+
+    def __init__(self, urls: Sequence[str], matrix: np.ndarray, chunk_matrix: np.ndarray, chunk_owners: np.ndarray):
+        super().__init__(urls, matrix)
+        chunk_owners = np.asarray(chunk_owners, dtype=np.int64)
+        if chunk_owners.shape[0] != chunk_matrix.shape[0]:
+            raise ValueError(f"Got {chunk_owners.shape[0]} chunk owners for {chunk_matrix.shape[0]} chunk rows")
+        if chunk_owners.shape[0] and (np.any(np.diff(chunk_owners) < 0) or chunk_owners[0] < 0
+                                      or chunk_owners[-1] >= len(urls)):
+            raise ValueError("Chunk rows must be grouped by lawyer, in lawyer order")
+        self.chunk_matrix = np.ascontiguousarray(chunk_matrix, dtype=np.float32)
+        self.chunk_owners = chunk_owners
+        # Lawyers that have chunks, and the first chunk row of each
+        self.chunked = np.unique(chunk_owners)
+        self.chunk_starts = np.searchsorted(chunk_owners, self.chunked)
+
+    @classmethod
+    def from_store(cls, store) -> 'ChunkIndex':
+        """
+        Build an index over a `LawyerStore`'s profile vectors and chunk vectors.
+
+        Precompute appends each lawyer's chunks right after the lawyer, so the chunk
+        file is normally already grouped in lawyer order and is used as it is;
+        otherwise the live rows of each file are gathered once.
+        """
+        urls, rows = store.manifest()
+        chunk_urls, _, chunk_rows = store.chunk_manifest()
+        position = {url: i for i, url in enumerate(urls)}
+        chunk_owners = np.array([position[url] for url in chunk_urls], dtype=np.int64)
+        return cls(urls, live_rows(store.vectors(), rows), live_rows(store.chunk_vectors(), chunk_rows),
+                   chunk_owners)
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Best cosine similarity of one query embedding against each lawyer's vectors."""
+        return self.batch_scores(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+    def batch_scores(self, query_embeddings) -> np.ndarray:
+        """Best cosine similarity per lawyer for several query embeddings, shape (n_queries, n_lawyers)."""
+        scores = super().batch_scores(query_embeddings)
+        if not len(self) or not self.chunked.shape[0]:
+            return scores
+        queries = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        best_chunks = np.maximum.reduceat(queries @ self.chunk_matrix.T, self.chunk_starts, axis=1)
+        scores[:, self.chunked] = np.maximum(scores[:, self.chunked], best_chunks)
+        return scores
+
+
+def live_rows(vectors: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    The given rows of a memory-mapped vector file, as the memory map itself when they are
+    exactly its rows in order, else gathered into memory.
+    """
+    if rows.shape[0] == vectors.shape[0] and np.array_equal(rows, np.arange(rows.shape[0])):
+        return vectors
+    return vectors[rows]
+
+
+def apply_candidate_strategy(ranked: List[Tuple[str, float]],
+                             strategy: CandidateStrategy) -> List[Tuple[str, float]]:
+    """
+    Cut a ranking that already respects the strategy's threshold and top_k.
+
+    'threshold' and 'top_k' need nothing further. 'relative' keeps lawyers
+    scoring at least `relative` times the best score. 'gap' cuts at the largest
+    drop between consecutive scores, and 'knee' at the point of the sorted score
+    curve farthest below the straight line from its first to its last score.
+    None of them cut below `min_candidates` or between lawyers with the same score.
+
+    Args:
+        ranked (List[Tuple[str, float]]): (url, similarity) pairs sorted by similarity, descending.
+        strategy (CandidateStrategy): The candidate selection strategy.
+
+    Returns:
+        List[Tuple[str, float]]: The leading part of the ranking to verify.
+    """
+    if strategy.kind in ('threshold', 'top_k') or len(ranked) <= 1:
+        return ranked
+    scores = np.array([score for _, score in ranked], dtype=np.float32)
+    floor = min(max(strategy.min_candidates, 1), len(ranked))
+    if strategy.kind == 'relative':
+        if strategy.relative is None:
+            raise ValueError("The 'relative' candidate strategy needs a relative score")
+        keep = int(np.count_nonzero(scores >= scores[0] * strategy.relative)) if scores[0] > 0 else len(ranked)
+    elif strategy.kind == 'gap':
+        gaps = scores[:-1] - scores[1:]
+        keep = floor + int(np.argmax(gaps[floor - 1:])) if floor < len(ranked) else len(ranked)
+    elif strategy.kind == 'knee':
+        spread = scores[0] - scores[-1]
+        if spread <= 0:
+            return ranked
+        x = np.linspace(0.0, 1.0, len(ranked))
+        below_chord = (1.0 - x) - (scores - scores[-1]) / spread
+        if below_chord.max() <= 0:
+            # No knee: the scores only fall off at the end
+            return ranked
+        keep = int(np.argmax(below_chord)) + 1
+    else:
+        raise ValueError(f"Unknown candidate strategy: {strategy.kind}")
+    # Which of several equal scores comes first is arbitrary, so keep them all or none
+    keep = int(np.count_nonzero(scores >= scores[max(keep, floor) - 1]))
+    return ranked[:keep]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2D matrix, leaving all-zero rows untouched."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+YEAR_VALUE_PATTERN = re.compile(r"\b(19[4-9]\d|20\d{2})\b")
+LAW_DEGREE_VALUE_PATTERN = re.compile(r"\b(?:j\.?\s?d|ll\.?\s?[bm]|juris)\b|\blaw\b", re.IGNORECASE)
+INSTITUTION_STOPWORDS = {'the', 'of', 'at', 'and', 'university', 'college', 'school', 'law', 'institute'}
+PRACTICE_STOPWORDS = {'the', 'of', 'and', 'in', 'practice', 'practices', 'law', 'group'}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class FieldIndex:
+    """
+    Inverted index over the structured fields of every lawyer profile.
+
+    Answers routed name, school, graduation year and practice area queries
+    (see `query_router.route_query`) without any API calls. Field extraction is
+    tolerant of the shapes the LLM parser produces: strings, lists of strings,
+    or lists of dicts.
+    """
+
+    def __init__(self):
+        self.name_tokens: Dict[str, Set[str]] = defaultdict(set)
+        self.school_tokens: Dict[str, Set[str]] = defaultdict(set)
+        self.institutions: Dict[str, List[Set[str]]] = defaultdict(list)
+        self.practice_tokens: Dict[str, Set[str]] = defaultdict(set)
+        self.degree_years: List[Tuple[int, bool, str]] = []
+        self._year_arrays = None
+
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[Tuple[str, Dict[str, Any]]]) -> 'FieldIndex':
+        """
+        Build the index from (url, structured_data) pairs.
+
+        Args:
+            profiles (Iterable[Tuple[str, Dict[str, Any]]]): Lawyer URLs and their structured data.
+
+        Returns:
+            FieldIndex: The populated index.
+        """
+        index = cls()
+        for url, structured_data in profiles:
+            index.add(url, structured_data or {})
+        return index
+
+    def add(self, url: str, structured_data: Dict[str, Any]):
+        for token in tokenize(_flatten(_field(structured_data, 'name', 'full_name'))):
+            self.name_tokens[token].add(url)
+        for entry in _as_list(_field(structured_data, 'education')):
+            institution, degree, year = _education_parts(entry)
+            institution_tokens = set(tokenize(institution))
+            self.institutions[url].append(institution_tokens)
+            for token in institution_tokens:
+                self.school_tokens[token].add(url)
+            if year:
+                is_law = bool(LAW_DEGREE_VALUE_PATTERN.search(f"{degree} {institution}"))
+                self.degree_years.append((year, is_law, url))
+                self._year_arrays = None
+        for area in _as_list(_field(structured_data, 'practice_areas', 'practices', 'practice_area', 'practice')):
+            for token in tokenize(_flatten(area)):
+                self.practice_tokens[token].add(url)
+
+    def answer(self, route: QueryRoute) -> Optional[List[str]]:
+        """
+        Answer a routed query from the index.
+
+        Returns:
+            Optional[List[str]]: Sorted matching URLs, or None if the query must go
+            through the LLM path (free-form, or a value the index does not know about).
+        """
+        if route.kind == 'name':
+            tokens = tokenize(route.value)
+            # A trailing word that is not a known name is not part of the name
+            known = [t for t in tokens if t in self.name_tokens]
+            tokens = known if tokens and tokens[0] in self.name_tokens else tokens
+            return sorted(_intersect(self.name_tokens, tokens))
+        if route.kind == 'school':
+            tokens = tokenize(route.value)
+            urls = _answer_tokens(self.school_tokens, tokens, INSTITUTION_STOPWORDS)
+            if not urls:
+                return urls
+            # Every significant token, and "law" for law school queries, must name the same institution
+            required = {t for t in tokens if t not in INSTITUTION_STOPWORDS or t == 'law'}
+            return [url for url in urls if any(required <= institution for institution in self.institutions[url])]
+        if route.kind == 'practice_area':
+            return _answer_tokens(self.practice_tokens, tokenize(route.value), PRACTICE_STOPWORDS)
+        if route.kind == 'graduation_year' and self.degree_years:
+            year = int(route.value)
+            compare = {
+                '<': np.less, '<=': np.less_equal, '=': np.equal, '>=': np.greater_equal, '>': np.greater
+            }[route.comparator]
+            if self._year_arrays is None:
+                years, is_law, urls = zip(*self.degree_years)
+                self._year_arrays = (
+                    np.array(years, dtype=np.int32), np.array(is_law, dtype=bool), np.array(urls, dtype=object)
+                )
+            years, is_law, urls = self._year_arrays
+            mask = compare(years, year)
+            if route.law_degree_only:
+                mask &= is_law
+            return sorted(set(urls[mask]))
+        return None
+
+
+def _answer_tokens(inverted: Dict[str, Set[str]], tokens: List[str], stopwords: Set[str]) -> Optional[List[str]]:
+    significant = [t for t in tokens if t not in stopwords] or tokens
+    if not significant or any(t not in inverted for t in significant):
+        return None
+    return sorted(_intersect(inverted, significant))
+
+
+def _intersect(inverted: Dict[str, Set[str]], tokens: List[str]) -> Set[str]:
+    if not tokens:
+        return set()
+    return set.intersection(*(inverted.get(t, set()) for t in tokens))
+
+
+def _field(data: Dict[str, Any], *keys: str):
+    lowered = {str(k).lower().replace(' ', '_'): v for k, v in data.items()}
+    for key in keys:
+        if lowered.get(key):
+            return lowered[key]
+    return None
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [part for part in re.split(r"[;\n]", value) if part.strip()]
+    return [value]
+
+
+def _flatten(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        return ' '.join(_flatten(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(_flatten(v) for v in value)
+    return str(value)
+
+
+def _education_parts(entry) -> Tuple[str, str, Optional[int]]:
+    """Split an education entry into (institution, degree, year)."""
+    if isinstance(entry, dict):
+        institution = _flatten(_field(entry, 'school', 'institution', 'university', 'college', 'name'))
+        degree = _flatten(_field(entry, 'degree', 'degrees'))
+        year_text = _flatten(_field(entry, 'year', 'graduation_year', 'date', 'years')) or _flatten(entry)
+    else:
+        text = _flatten(entry)
+        institution, degree, year_text = text, text, text
+    years = YEAR_VALUE_PATTERN.findall(year_text)
+    return institution, degree, int(years[-1]) if years else None
+
+
+LEXICAL_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'for', 'from', 'had', 'has', 'have',
+    'in', 'is', 'it', 'of', 'on', 'or', 'that', 'the', 'their', 'to', 'was', 'were', 'which', 'who',
+    'with', 'find', 'lawyer', 'lawyers', 'attorney', 'attorneys', 'worked', 'work', 'works',
+}
+
+
+def lexical_tokens(text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in LEXICAL_STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over each lawyer's raw content and structured data.
+
+    Postings are stored as CSR arrays keyed by a sorted vocabulary, so the index
+    saves to a single .npz file and loads without rebuilding any Python dicts.
+    """
+
+    def __init__(self, urls, vocab, indptr, doc_ids, term_freqs, doc_lengths, k1: float = 1.5, b: float = 0.75,
+                 fingerprint: str = ''):
+        self.fingerprint = fingerprint
+        self.urls = np.asarray(urls, dtype=object)
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if doc_lengths.shape[0] else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], fingerprint: str = '') -> 'BM25Index':
+        """
+        Build the index from (url, text) pairs.
+
+        Args:
+            documents (Iterable[Tuple[str, str]]): Lawyer URLs and the text to index for each.
+            fingerprint (str): Identifies the data the index was built from, see `LawyerStore.fingerprint`.
+
+        Returns:
+            BM25Index: The built index.
+        """
+        urls, doc_lengths = [], []
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, (url, text) in enumerate(documents):
+            tokens = lexical_tokens(text)
+            urls.append(url)
+            doc_lengths.append(len(tokens))
+            counts: Dict[str, int] = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, count in counts.items():
+                postings[token].append((doc_id, count))
+
+        vocab = sorted(postings)
+        lengths = [len(postings[term]) for term in vocab]
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(lengths)
+        pairs = [pair for term in vocab for pair in postings[term]]
+        doc_ids = np.array([doc_id for doc_id, _ in pairs], dtype=np.int32)
+        term_freqs = np.array([count for _, count in pairs], dtype=np.float32)
+        return cls(urls, np.array(vocab, dtype=str), indptr, doc_ids, term_freqs,
+                   np.array(doc_lengths, dtype=np.float32), fingerprint=fingerprint)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['urls'].tolist(), data['vocab'], data['indptr'], data['doc_ids'],
+                       data['term_freqs'], data['doc_lengths'], fingerprint=str(data['fingerprint']))
+
+    def save(self, path: str):
+        """Atomically write the index to an .npz file."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, urls=np.array(self.urls.tolist(), dtype=str), vocab=self.vocab, indptr=self.indptr,
+                 doc_ids=self.doc_ids, term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+                 fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def scores(self, query: str, max_doc_freq: Optional[float] = None) -> np.ndarray:
+        """
+        BM25 score of every lawyer for the query.
+
+        Args:
+            query (str): Query text.
+            max_doc_freq (float, optional): Ignore query terms found in more than this fraction of
+                profiles, such as "represented" or "law", which match nearly everyone.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        if not len(self) or not self.vocab.shape[0]:
+            return scores
+        for term in set(lexical_tokens(query)):
+            position = np.searchsorted(self.vocab, term)
+            if position >= self.vocab.shape[0] or self.vocab[position] != term:
+                continue
+            start, end = self.indptr[position], self.indptr[position + 1]
+            if max_doc_freq is not None and end - start > max_doc_freq * len(self):
+                continue
+            doc_ids = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            idf = np.log(1 + (len(self) - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_ids] / self.avg_length)
+            scores[doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: Optional[int] = None,
+               max_doc_freq: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Rank lawyers that mention any query term, or any rare one when `max_doc_freq` is given.
+
+        Returns:
+            List[Tuple[str, float]]: (url, score) pairs with a positive score, sorted descending.
+        """
+        scores = self.scores(query, max_doc_freq)
+        hits = np.flatnonzero(scores > 0)
+        if top_k is not None and top_k < hits.shape[0]:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        return [(self.urls[i], float(scores[i])) for i in order]
+
+
+def profile_text(raw_content: str, structured_data: Dict[str, Any]) -> str:
+    """Text indexed lexically for a lawyer: the page content plus every structured value."""
+    return f"{raw_content} {_flatten(structured_data)}"
+
+
+def profile_chunks(raw_content: str, structured_data: Dict[str, Any], max_words: int = 120,
+                   max_chunks: int = 40) -> List[Tuple[str, str]]:
+    """
+    Split a profile into (section, text) chunks to embed separately.
+
+    The overview (name, title, offices, practices, bar admissions), education
+    and clerkships each become one chunk and every experience entry its own.
+    Profiles without structured experience fall back to windows of at most
+    `max_words` words over the page text.
+    """
+    data = structured_data or {}
+    name = _flatten(_field(data, 'name', 'full_name'))
+    chunks = []
+    overview = [
+        name,
+        _flatten(_field(data, 'title', 'position')),
+        _flatten(_field(data, 'offices', 'office', 'location')),
+        _flatten(_field(data, 'practice_areas', 'practices', 'practice_area', 'practice')),
+        _flatten(_field(data, 'bar_admissions', 'admissions')),
+    ]
+    if any(overview):
+        chunks.append(('overview', ' | '.join(part for part in overview if part)))
+    education = [_flatten(entry) for entry in _as_list(_field(data, 'education'))]
+    if education:
+        chunks.append(('education', f"{name} education: " + '; '.join(education)))
+    clerkships = [_flatten(entry) for entry in _as_list(_field(data, 'clerkships', 'clerkship'))]
+    if clerkships:
+        chunks.append(('clerkships', f"{name} clerked for: " + '; '.join(clerkships)))
+    experience = [_flatten(entry) for entry in _as_list(_field(data, 'experience', 'representative_matters'))]
+    if experience:
+        chunks.extend(('experience', entry) for entry in experience if entry.strip())
+    else:
+        chunks.extend(('content', window) for window in _text_windows(raw_content, max_words))
+    return chunks[:max_chunks]
+
+
+def _text_windows(text: str, max_words: int) -> List[str]:
+    """Pack the lines of a text into windows of at most `max_words` words, splitting longer lines."""
+    windows, current = [], []
+    for line in text.split('\n'):
+        words = line.split()
+        while len(words) > max_words:
+            if current:
+                windows.append(' '.join(current))
+                current = []
+            windows.append(' '.join(words[:max_words]))
+            words = words[max_words:]
+        if len(current) + len(words) > max_words:
+            windows.append(' '.join(current))
+            current = []
+        current.extend(words)
+    if current:
+        windows.append(' '.join(current))
+    return windows
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """
+    Merge several rankings of URLs with reciprocal rank fusion.
+
+    Args:
+        rankings (List[List[str]]): Rankings to merge, best first.
+        k (int): Damping constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        List[str]: Every URL in any ranking, sorted by fused score.
+    """
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, url in enumerate(ranking):
+            fused[url] += 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda url: -fused[url])
@@ -0,0 +1,224 @@
+"""
+Long-running search server that keeps the lawyer indexes warm between queries.
+
+Loads the store and the embedding, field and lexical indexes once, as the REPL
+does at startup, then serves any number of concurrent clients over HTTP:
+
+    POST /search {"query": "..."}  (or GET /search?q=...)  NDJSON stream of search events
+    GET  /stats                                             stage tables of recent queries
+    GET  /health                                            store size and searches in flight
+
+A search streams one JSON object per line: "accepted" (with whether the client
+joined a search already in flight), "candidates" once candidates are selected,
+"result" for every matching lawyer as soon as its verdict arrives, and finally
+"done" with all matches in candidate order, or "error". Identical queries in
+flight at the same time share one search (singleflight): a client that joins
+late gets the events so far, then the rest as they happen. A search nobody is
+listening to any more is cancelled along with its LLM requests.
+
+Usage:
+    python server.py --port 8080
+    python main.py --server http://127.0.0.1:8080
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+from aiohttp import web
+from constants import SERVER_HOST, SERVER_PORT
+from main import SearchIndexes, load_search_indexes, select_candidates, stats_report, stream_search
+from tracing import configure_logging, span, start_trace
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(query: str) -> str:
+    """Queries that differ only in case and whitespace share a search."""
+    return ' '.join(query.lower().split())
+
+
+class SearchFlight:
+    """One search in flight, whose events are replayed to every client that asked for the same query."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def publish(self, event: Dict[str, Any]):
+        self.events.append(event)
+        self._wake()
+
+    def finish(self):
+        self.done = True
+        self._wake()
+
+    def _wake(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every event so far, then each new one until the search is done."""
+        sent = 0
+        while True:
+            # Taken before draining, so an event published while a client is writing wakes the next wait
+            updated = self._updated
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.done:
+                return
+            await updated.wait()
+
+
+class SearchServer:
+    """
+    HTTP search service over indexes loaded once.
+
+    Args:
+        indexes (SearchIndexes): (lawyer_index, lawyers_dict, field_index, lexical_index),
+            as returned by `main.load_search_indexes`.
+    """
+
+    def __init__(self, indexes: SearchIndexes):
+        self.lawyer_index, self.lawyers_dict, self.field_index, self.lexical_index = indexes
+        self.flights: Dict[str, SearchFlight] = {}
+        self.counters: Counter = Counter()
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> str:
+        app = web.Application()
+        app.router.add_route('*', '/search', self._search)
+        app.router.add_get('/stats', self._stats)
+        app.router.add_get('/health', self._health)
+        # Cancel a client's handler when it disconnects, so searches nobody awaits are cancelled too
+        self._runner = web.AppRunner(app, access_log=None, handler_cancellation=True)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        for flight in list(self.flights.values()):
+            flight.task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def search(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the events of a search for `query`, joining an identical search if one is in flight."""
+        key = flight_key(query)
+        flight = self.flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self.flights[key] = SearchFlight(query)
+            flight.task = asyncio.ensure_future(self._run(key, flight))
+        self.counters['searches'] += 1
+        self.counters['shared'] += shared
+        flight.subscribers += 1
+        try:
+            yield {'event': 'accepted', 'query': query, 'shared': shared}
+            async for event in flight.follow():
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # Nobody is listening any more; stop paying for its verdicts
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+                flight.task.cancel()
+                self.counters['cancelled'] += 1
+
+    async def _run(self, key: str, flight: SearchFlight):
+        start = time.perf_counter()
+        try:
+            with start_trace(flight.query):
+                with span('select'):
+                    [(candidates, needs_verification)] = await select_candidates(
+                        self.lawyer_index, [flight.query], self.field_index, self.lexical_index)
+                flight.publish({'event': 'candidates', 'count': len(candidates)})
+                matches, first_result = [], None
+                async for url in stream_search(self.lawyer_index, flight.query, self.lawyers_dict, candidates,
+                                               needs_verification=needs_verification):
+                    elapsed = time.perf_counter() - start
+                    if first_result is None:
+                        first_result = elapsed
+                    matches.append(url)
+                    flight.publish({'event': 'result', 'url': url, 'name': self._name(url),
+                                    'elapsed': round(elapsed, 3)})
+            rank = {url: i for i, url in enumerate(candidates)}
+            flight.publish({'event': 'done', 'results': sorted(matches, key=rank.get),
+                            'first_result': round(first_result, 3) if first_result is not None else None,
+                            'last_result': round(time.perf_counter() - start, 3)})
+        except Exception as e:
+            logger.exception("Search failed", extra={'fields': {'query': flight.query}})
+            flight.publish({'event': 'error', 'message': str(e)})
+        finally:
+            flight.finish()
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def _name(self, url: str) -> Optional[str]:
+        structured_data = self.lawyers_dict[url].get('structured_data')
+        return structured_data.get('name') if isinstance(structured_data, dict) else None
+
+    async def _search(self, request: web.Request) -> web.StreamResponse:
+        if request.method == 'POST':
+            try:
+                query = (await request.json())['query']
+            except (ValueError, KeyError, TypeError):
+                query = None
+        else:
+            query = request.query.get('q')
+        if not isinstance(query, str) or not query.strip():
+            return web.json_response({'error': 'Expected a JSON body {"query": "..."} or a q parameter'}, status=400)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        events = self.search(query)
+        try:
+            async for event in events:
+                await response.write(json.dumps(event).encode() + b'\n')
+        except ConnectionResetError:
+            # The client went away; closing `events` below drops its subscription
+            pass
+        finally:
+            await events.aclose()
+        return response
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        counters = self.counters
+        return web.Response(text=f"{stats_report()}\n\n{counters['searches']} searches, {counters['shared']} "
+                                 f"joined one in flight, {counters['cancelled']} cancelled")
+
+    async def _health(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'lawyers': len(self.lawyers_dict), 'in_flight': len(self.flights)})
+
+
+async def serve(args):
+    configure_logging()
+    indexes = await load_search_indexes(update=not args.no_update)
+    server = SearchServer(indexes)
+    base_url = await server.start(args.host, args.port)
+    print(f"Serving lawyer searches on {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--no-update', action='store_true',
+                        help="Serve the store as it is instead of scraping lawyers that are missing first")
+    asyncio.run(serve(parser.parse_args()))
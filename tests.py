@@ -1,63 +1,801 @@
 import unittest
+import aiohttp
 import asyncio
-from unittest.mock import patch, MagicMock
-from main import process_query, load_lawyer_data
+import json
+import os
+import re
+import numpy as np
+import openai
+import tempfile
+import time
+import llm_utils
+import verifier
+from benchmarks.fixtures import (PROFILE_URL, FixtureServer, build_fixture_store, render_profile, slug_from_url,
+                                 labeled_queries, readme_queries, synthetic_corpus)
+from benchmarks.mock_openai import MockOpenAIServer, default_responder, use_mock_openai
+from embedding_cache import EmbeddingCache
+from lawyer_store import LawyerStore
+from llm_utils import (EmbeddingBackend, EmbeddingBatcher, OpenAIEmbeddingBackend, RequestScheduler,
+                       SentenceTransformerBackend, get_embedding_backend)
+from constants import (EMBEDDING_MODEL_LARGE, EMBEDDING_MODELS, HYBRID_MIN_CANDIDATES, LOCAL_EMBEDDING_MODEL,
+                       MINI_MODEL, PRECOMPUTE_MAX_ATTEMPTS, PRIMARY_MODEL)
+from main import process_search, select_candidates
+from precompute import (complete_structured_data, load_embedding_index, load_lawyers_data, load_lexical_index,
+                        refresh_lawyer_data, update_lawyer_data)
+from profile_context import build_profile_context
+from query_router import route_query
+from scraping_utils import Crawler, RateLimiter, parse_education_entry, parse_profile_html
+from models import CandidateStrategy, VerifyCascade
+from search_index import BM25Index, ChunkIndex, EmbeddingIndex, FieldIndex, apply_candidate_strategy, profile_text
+from server import SearchServer
+from tracing import recent_traces, start_trace
+from verdict_cache import VerdictCache
+from verifier import cascade_summary, parse_batch_results, verification_tasks
 
-class TestLawyerSearch(unittest.TestCase):
+
+class TestLawyerSearch(unittest.IsolatedAsyncioTestCase):
+    """Search the synthetic test.csv profiles end to end against the mock OpenAI server."""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockOpenAIServer()
+        use_mock_openai(await self.mock.start())
+        # Keep verdicts and query embeddings from earlier runs out of the results
+        self.caches = verifier.verdict_cache, llm_utils.query_embedding_cache
+        verifier.verdict_cache = VerdictCache(os.path.join(self.tmp.name, 'verdicts.sqlite'))
+        llm_utils.query_embedding_cache = EmbeddingCache()
+
+        self.corpus = synthetic_corpus('test.csv')
+        self.store = LawyerStore(*(os.path.join(self.tmp.name, name)
+                                   for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')))
+        await build_fixture_store(self.store, self.corpus)
+        self.lawyers_dict = load_lawyers_data(self.store)
+        self.lawyer_index = load_embedding_index(self.store)
+        self.field_index = FieldIndex.from_profiles(self.store.iter_structured_data())
+        self.lexical_index = BM25Index.build(
+            (url, profile_text(raw, structured)) for url, raw, structured in self.store.iter_profiles())
+
+    async def asyncTearDown(self):
+        verifier.verdict_cache, llm_utils.query_embedding_cache = self.caches
+        self.store.close()
+        await self.mock.stop()
+        self.tmp.cleanup()
+
+    async def search(self, query):
+        return await process_search(self.lawyer_index, query, self.lawyers_dict, field_index=self.field_index,
+                                    lexical_index=self.lexical_index)
+
+    def label(self, query):
+        return next(l for l in readme_queries(self.corpus) + labeled_queries(self.corpus) if l['query'] == query)
+
+    async def test_tv_network_query(self):
+        query = "Lawyers who worked on a case with a TV network"
+        streamed = []
+        results = await process_search(self.lawyer_index, query, self.lawyers_dict, field_index=self.field_index,
+                                       lexical_index=self.lexical_index, on_result=streamed.append)
+
+        self.assertTrue(results)
+        self.assertLessEqual(set(results), set(self.label(query)['relevant']))
+        self.assertEqual(sorted(streamed), sorted(results))
+
+        trace = recent_traces[-1]
+        self.assertEqual(trace.name, query)
+        self.assertGreaterEqual(trace.counters['candidates'], len(results))
+        self.assertEqual(len(trace.spans['openai.queue_wait']),
+                         trace.counters['chat_calls'] + trace.counters['embedding_calls'])
+        self.assertIn('verify', trace.spans)
+
+    async def test_education_query(self):
+        query = "Lawyers who went to Yale"
+        before = llm_utils.api_usage.copy()
+        results = await self.search(query)
+
+        self.assertEqual(sorted(results), self.label(query)['relevant'])
+        # Answered from the field index without calling the API
+        self.assertEqual((llm_utils.api_usage - before)['chat_calls'], 0)
+
+    async def test_graduation_year_query(self):
+        query = "Lawyers who graduated law school after 2015"
+        results = await self.search(query)
+        self.assertEqual(sorted(results), self.label(query)['relevant'])
+
+    async def test_hybrid_candidates_do_not_outgrow_cosine_cut(self):
+        queries = [label['query'] for label in readme_queries(self.corpus) + labeled_queries(self.corpus)]
+        cosine = await select_candidates(self.lawyer_index, queries, self.field_index)
+        hybrid = await select_candidates(self.lawyer_index, queries, self.field_index, self.lexical_index)
+
+        for query, (cosine_urls, _), (hybrid_urls, _) in zip(queries, cosine, hybrid):
+            # Only queries the embeddings all but miss may take BM25 hits up to the floor
+            self.assertLessEqual(len(hybrid_urls), max(len(cosine_urls), HYBRID_MIN_CANDIDATES), query)
+            if len(cosine_urls) >= HYBRID_MIN_CANDIDATES:
+                self.assertLessEqual(len(hybrid_urls), len(cosine_urls), query)
+
+    async def test_chunk_index_scores_from_memory_maps(self):
+        self.assertIsInstance(self.lawyer_index, ChunkIndex)
+        # Precompute writes chunks grouped by lawyer, so neither vector file is copied into memory
+        self.assertIsInstance(self.lawyer_index.matrix.base, np.memmap)
+        self.assertIsInstance(self.lawyer_index.chunk_matrix.base, np.memmap)
+
+        urls, rows = self.store.manifest()
+        chunk_urls, _, chunk_rows = self.store.chunk_manifest()
+        query = self.store.chunk_vectors()[chunk_rows[0]]
+        expected = self.store.vectors()[rows] @ query
+        for url, score in zip(chunk_urls, self.store.chunk_vectors()[chunk_rows] @ query):
+            expected[urls.index(url)] = max(expected[urls.index(url)], score)
+        np.testing.assert_allclose(self.lawyer_index.scores(query), expected, rtol=1e-5)
+
+    async def test_lawyer_without_chunks_is_not_chunked_again(self):
+        url = self.store.urls()[0]
+        self.store.add_chunks(url, [])
+        self.assertEqual(self.store.urls_without_chunks(), [])
+
+    async def test_load_lawyers_data(self):
+        self.assertEqual(len(self.lawyers_dict), len(self.corpus))
+        slug = next(iter(self.corpus))
+        profile = self.lawyers_dict[PROFILE_URL.format(slug=slug)]
+        self.assertEqual(profile['structured_data']['name'], self.corpus[slug]['name'])
+
+    async def test_server_shares_identical_queries_in_flight(self):
+        query = "Lawyers who clerked for the Supreme Court"
+        before = llm_utils.api_usage.copy()
+        expected = await self.search(query)
+        single_search_calls = (llm_utils.api_usage - before)['chat_calls']
+        verifier.verdict_cache = VerdictCache(os.path.join(self.tmp.name, 'server-verdicts.sqlite'))
+        llm_utils.query_embedding_cache = EmbeddingCache()
+
+        server = SearchServer((self.lawyer_index, self.lawyers_dict, self.field_index, self.lexical_index))
+        base_url = await server.start(port=0)
+        self.mock.latency = 0.05
+        before = llm_utils.api_usage.copy()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async def stream(q):
+                    async with session.post(f"{base_url}/search", json={'query': q}) as response:
+                        return [json.loads(line) async for line in response.content]
+
+                streams = await asyncio.gather(stream(query), stream(query.upper()))
+        finally:
+            await server.stop()
+
+        self.assertEqual(sorted(event['shared'] for event, *_ in streams), [False, True])
+        for events in streams:
+            self.assertEqual(events[-1]['event'], 'done')
+            self.assertEqual(events[-1]['results'], expected)
+            self.assertEqual(sorted(e['url'] for e in events if e['event'] == 'result'), sorted(expected))
+        self.assertEqual((llm_utils.api_usage - before)['chat_calls'], single_search_calls)
+
+    async def test_embedding_batcher_packs_callers_into_one_request(self):
+        batcher = EmbeddingBatcher(max_wait=0.01)
+        embeddings = await asyncio.gather(*(batcher.embed([f"profile {i}", f"chunk {i}"]) for i in range(5)))
+
+        self.assertEqual([len(e) for e in embeddings], [2] * 5)
+        self.assertEqual(batcher.stats['requests'], 1)
+        self.assertEqual(batcher.stats['texts'], 10)
+
+
+class BatchFailingBackend(EmbeddingBackend):
+    """Embeds one text per request only, and never a text containing 'bad'."""
+    name = 'batch_failing'
+
+    def __init__(self):
+        super().__init__('test')
+        self.requests = []
+
+    async def embed(self, texts):
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts):
+        self.requests.append(list(texts))
+        if len(texts) > 1 or 'bad' in texts[0]:
+            raise ValueError("Rejected batch")
+        return [[float(len(texts[0])), 1.0]]
+
+
+class TestEmbeddingBatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_request_is_split_until_only_the_bad_text_fails(self):
+        backend = BatchFailingBackend()
+        batcher = EmbeddingBatcher(backend, max_wait=0.01)
+        results = await asyncio.gather(batcher.embed(["a", "bb"]), batcher.embed(["bad\ntext"]),
+                                       batcher.embed(["cccc"]), return_exceptions=True)
+
+        self.assertEqual(results[0], [[1.0, 1.0], [2.0, 1.0]])
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], [[4.0, 1.0]])
+        # One request for all four texts, then halves, then single texts; texts are cleaned before sending
+        self.assertEqual(backend.requests[0], ["a", "bb", "bad text", "cccc"])
+        self.assertEqual(batcher.stats['splits'], 3)
+        self.assertEqual(batcher.stats['failed_texts'], 1)
+        self.assertEqual(batcher.stats['texts'], 3)
+
+
+class TestEmbeddingBackends(unittest.TestCase):
+    def test_backend_selection(self):
+        backend = get_embedding_backend('openai')
+        self.assertIsInstance(backend, OpenAIEmbeddingBackend)
+        self.assertEqual(backend.space, ('openai', EMBEDDING_MODELS['openai']))
+        self.assertIs(get_embedding_backend('openai'), backend)
+        self.assertEqual(get_embedding_backend('openai', 'text-embedding-3-small').model, 'text-embedding-3-small')
+        # Selecting the local backend does not load its model, so it needs no sentence_transformers
+        local = get_embedding_backend('sentence_transformers')
+        self.assertIsInstance(local, SentenceTransformerBackend)
+        self.assertEqual(local.space, ('sentence_transformers', LOCAL_EMBEDDING_MODEL))
+        self.assertEqual(local.cache_key, f"sentence_transformers:{LOCAL_EMBEDDING_MODEL}")
+        with self.assertRaises(ValueError):
+            get_embedding_backend('word2vec')
+        with self.assertRaises(TypeError):
+            EmbeddingBackend('model')
+
+
+class TestRequestScheduler(unittest.IsolatedAsyncioTestCase):
+    """The scheduler's limits, retries and cancellation against the mock OpenAI server."""
+
+    async def asyncSetUp(self):
+        self.mock = MockOpenAIServer(retry_after=None)
+        use_mock_openai(await self.mock.start())
+        self.scheduler = RequestScheduler(concurrency={MINI_MODEL: 2}, tokens_per_minute={}, max_retries=3,
+                                          base_delay=0.05)
+
+    async def asyncTearDown(self):
+        await self.mock.stop()
+
+    def chat(self):
+        return self.scheduler.run(MINI_MODEL, 10, lambda: llm_utils.client.chat.completions.create(
+            model=MINI_MODEL, messages=[{"role": "user", "content": "Hello"}]))
+
+    async def test_retries_rate_limits_and_server_errors_with_backoff(self):
+        self.mock.fail_next(429)
+        self.mock.fail_next(500)
+        with start_trace('retries') as trace:
+            response = await self.chat()
+
+        self.assertEqual(response.choices[0].message.content, "OK")
+        self.assertEqual(self.mock.counters['chat_requests'], 3)
+        self.assertEqual(self.scheduler.counters['retries'], 2)
+        # Jittered exponential backoff: 0.05s then 0.1s, each times 0.5 to 1.5
+        waits = trace.spans['openai.retry_wait']
+        self.assertEqual(len(waits), 2)
+        self.assertGreaterEqual(sum(waits), 0.05 * 0.5 + 0.1 * 0.5)
+
+    async def test_does_not_retry_client_errors(self):
+        self.mock.fail_next(400)
+        with self.assertRaises(openai.BadRequestError):
+            await self.chat()
+        self.assertEqual(self.mock.counters['chat_requests'], 1)
+        self.assertEqual(self.scheduler.counters['failed'], 1)
+
+    async def test_limits_requests_in_flight_per_model(self):
+        self.mock.latency = 0.05
+        await asyncio.gather(*(self.chat() for _ in range(6)))
+
+        self.assertEqual(self.mock.counters['chat_requests'], 6)
+        self.assertEqual(self.mock.max_in_flight, 2)
+        self.assertEqual(self.scheduler.in_flight[MINI_MODEL], 0)
+
+    async def test_cancelled_request_frees_its_slot(self):
+        self.scheduler.concurrency = {MINI_MODEL: 1}
+        self.mock.latency = 0.2
+        running = asyncio.ensure_future(self.chat())
+        queued = asyncio.ensure_future(self.chat())
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.scheduler.stats()['queued'], {MINI_MODEL: 1})
+
+        start = time.perf_counter()
+        running.cancel()
+        await queued
+        # The queued request got the slot as soon as the running one was cancelled
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertEqual(self.scheduler.in_flight[MINI_MODEL], 0)
+        self.assertTrue(running.cancelled())
+
+        # A request cancelled while queued gives up its place without taking the slot
+        running = asyncio.ensure_future(self.chat())
+        queued = asyncio.ensure_future(self.chat())
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await running
+        self.assertEqual(self.scheduler.stats()['queued'], {})
+        self.assertEqual(self.scheduler.in_flight[MINI_MODEL], 0)
+
+
+class TestLawyerStore(unittest.TestCase):
     def setUp(self):
-        # Sample test data
-        self.test_lawyer_data = {
-            "http://example.com/lawyer1": {
-                "raw_content": "Worked on major cases for ABC Network and NBC",
-                "structured_data": {
-                    "name": "John Smith",
-                    "experience": "Media law expert, handled TV network cases",
-                    "education": "Yale Law School"
-                }
-            },
-            "http://example.com/lawyer2": {
-                "raw_content": "Corporate lawyer specializing in mergers",
-                "structured_data": {
-                    "name": "Jane Doe", 
-                    "experience": "Corporate law",
-                    "education": "Harvard Law School"
-                }
-            }
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.tmp.name, name) for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reopen_drops_partial_trailing_row(self):
+        store = LawyerStore(*self.paths)
+        store.add_many([(f"https://example.com/{i}", "text", {"name": str(i)}, [float(i + 1), 1.0, 0.0])
+                        for i in range(2)])
+        store.close()
+        # An append interrupted half way through a row, before its manifest row was committed
+        with open(self.paths[1], 'ab') as f:
+            f.write(np.ones(3, dtype=np.float32).tobytes()[:5])
+
+        store = LawyerStore(*self.paths)
+        self.assertEqual(store.vectors().shape, (2, 3))
+        self.assertEqual(os.path.getsize(self.paths[1]), 2 * 3 * 4)
+        store.add("https://example.com/2", "text", {"name": "2"}, [0.0, 0.0, 2.0])
+        urls, rows = store.manifest()
+        self.assertEqual(rows.tolist(), [0, 1, 2])
+        np.testing.assert_array_equal(store.vectors()[2], [0.0, 0.0, 1.0])
+        store.close()
+
+    def test_embedding_space_mismatch_is_refused(self):
+        local = ('sentence_transformers', LOCAL_EMBEDDING_MODEL)
+        store = LawyerStore(*self.paths, embedding_space=local)
+        store.add("https://example.com/0", "text", {}, [1.0, 0.0, 0.0])
+        with self.assertRaises(ValueError):
+            store.add("https://example.com/1", "text", {}, [1.0, 0.0])
+        store.close()
+
+        self.assertEqual(LawyerStore(*self.paths, embedding_space=local).embedding_space, local)
+        with self.assertRaisesRegex(ValueError, "--reembed"):
+            LawyerStore(*self.paths, embedding_space=('openai', EMBEDDING_MODEL_LARGE))
+
+    def test_legacy_store_is_taken_as_openai_vectors(self):
+        store = LawyerStore(*self.paths)
+        store.add("https://example.com/0", "text", {}, [1.0, 0.0])
+        store.close()
+        with self.assertRaises(ValueError):
+            LawyerStore(*self.paths, embedding_space=('sentence_transformers', LOCAL_EMBEDDING_MODEL))
+        self.assertEqual(LawyerStore(*self.paths, embedding_space=('openai', EMBEDDING_MODEL_LARGE)).embedding_space,
+                         ('openai', EMBEDDING_MODEL_LARGE))
+
+    def test_import_json_counts_only_new_lawyers(self):
+        legacy_path = os.path.join(self.tmp.name, 'lawyer_data.json')
+        with open(legacy_path, 'w') as f:
+            json.dump({f"https://example.com/{i}": {"raw_content": "text", "structured_data": {},
+                                                    "embedding": [1.0, 0.0]} for i in range(3)}, f)
+        store = LawyerStore(*self.paths)
+        store.add("https://example.com/0", "text", {}, [1.0, 0.0])
+
+        self.assertEqual(store.import_json(legacy_path), 2)
+        self.assertEqual(store.import_json(legacy_path), 0)
+        self.assertEqual(len(store), 3)
+        store.close()
+
+
+    def test_lexical_index_is_saved_next_to_its_store(self):
+        store = LawyerStore(*self.paths)
+        store.add("https://example.com/0", "Securities litigation partner", {"name": "0"}, [1.0, 0.0])
+        self.assertEqual(len(load_lexical_index(store)), 1)
+        self.assertEqual(os.path.dirname(store.lexical_index_path), os.path.abspath(self.tmp.name))
+        self.assertTrue(os.path.exists(store.lexical_index_path))
+        # A saved index of an older version of the store is rebuilt rather than reused
+        store.add("https://example.com/1", "Patent prosecution", {"name": "1"}, [0.0, 1.0])
+        self.assertEqual(len(load_lexical_index(store)), 2)
+        store.close()
+
+class TestCrawler(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_page_yields_empty_result(self):
+        class FlakyCrawler(Crawler):
+            async def scrape(self, url, etag=None, last_modified=None):
+                if url.endswith('/bad'):
+                    raise ValueError("unparseable page")
+                return {'raw_content': url}
+
+        urls = [f"https://example.com/{name}" for name in ('a', 'bad', 'b', 'c')]
+        results = dict([item async for item in FlakyCrawler(concurrency=2).crawl(urls)])
+        self.assertEqual(results, {url: {} if url.endswith('/bad') else {'raw_content': url} for url in urls})
+
+    async def test_retries_server_errors_but_not_client_errors(self):
+        slug, profile = next(iter(synthetic_corpus().items()))
+        fixtures = FixtureServer({slug: render_profile(profile)})
+        await fixtures.start()
+        try:
+            async with Crawler(requests_per_second=None, max_retries=1) as crawler:
+                fixtures.fail_next(503)
+                self.assertEqual((await crawler.scrape(fixtures.url(slug)))['structured_data']['name'],
+                                 profile['name'])
+                self.assertEqual(fixtures.requests, 2)
+
+                fixtures.fail_next(503, 2)
+                self.assertEqual(await crawler.scrape(fixtures.url(slug)), {})
+                self.assertEqual(fixtures.requests, 4)
+
+                self.assertEqual(await crawler.scrape(fixtures.url('nobody')), {})
+                self.assertEqual(fixtures.requests, 5)
+        finally:
+            await fixtures.stop()
+
+    async def test_rate_limiter_spaces_request_starts(self):
+        loop = asyncio.get_running_loop()
+        limiter = RateLimiter(20)
+        start = loop.time()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        self.assertGreaterEqual(loop.time() - start, 4 / 20 - 0.01)
+
+        start = loop.time()
+        await asyncio.gather(*(RateLimiter(None).wait() for _ in range(100)))
+        self.assertLess(loop.time() - start, 0.05)
+
+
+class TestRefresh(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockOpenAIServer()
+        use_mock_openai(await self.mock.start())
+        self.profiles = dict(list(synthetic_corpus().items())[:3])
+        self.fixtures = FixtureServer({slug: render_profile(profile) for slug, profile in self.profiles.items()})
+        await self.fixtures.start()
+
+    async def asyncTearDown(self):
+        await self.fixtures.stop()
+        await self.mock.stop()
+        self.tmp.cleanup()
+
+    async def test_update_resumes_and_skips_lawyers_that_keep_failing(self):
+        store = LawyerStore(*(os.path.join(self.tmp.name, name)
+                              for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')))
+        cache = VerdictCache(os.path.join(self.tmp.name, 'verdicts.sqlite'))
+        stored, *rest = self.fixtures.urls()
+        missing = self.fixtures.url('nobody')
+        await update_lawyer_data(store, lawyer_links=[stored], cache=cache)
+        self.assertEqual(self.fixtures.requests, 1)
+
+        # Stored lawyers are not scraped again; a page that cannot be scraped is counted as failed
+        await update_lawyer_data(store, lawyer_links=[stored] + rest + [missing], cache=cache)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.failure_attempts(), {missing: 1})
+        self.assertEqual(self.fixtures.requests, 1 + len(rest) + 1)
+
+        for attempt in range(2, PRECOMPUTE_MAX_ATTEMPTS + 1):
+            await update_lawyer_data(store, lawyer_links=[stored] + rest + [missing], cache=cache)
+            self.assertEqual(store.failure_attempts(), {missing: attempt})
+        requests = self.fixtures.requests
+        await update_lawyer_data(store, lawyer_links=[stored] + rest + [missing], cache=cache)
+        self.assertEqual(self.fixtures.requests, requests)
+        await update_lawyer_data(store, retry_failed=True, lawyer_links=[missing], cache=cache)
+        self.assertEqual(self.fixtures.requests, requests + 1)
+        self.assertEqual(store.failure_attempts(), {missing: PRECOMPUTE_MAX_ATTEMPTS + 1})
+        store.close()
+
+    async def test_refresh_reprocesses_only_changed_profiles(self):
+        store = LawyerStore(*(os.path.join(self.tmp.name, name)
+                              for name in ('lawyers.sqlite', 'lawyers.f32', 'chunks.f32')))
+        cache = VerdictCache(os.path.join(self.tmp.name, 'verdicts.sqlite'))
+        await update_lawyer_data(store, lawyer_links=self.fixtures.urls(), cache=cache)
+        same, restyled, edited = self.fixtures.urls()
+        cache.put_many((f"verdict-{url}", url, True) for url in (same, restyled, edited))
+        stored_content = {url: store.get(url)['raw_content'] for url in (same, restyled, edited)}
+        etag = store.validators(restyled)[0]
+
+        # Markup outside the main content changes the ETag but not the extracted text
+        slug = slug_from_url(restyled)
+        self.fixtures.pages[slug] = self.fixtures.pages[slug].replace('<body>', '<body class="redesign">')
+        profile = self.profiles[slug_from_url(edited)]
+        profile['experience'].append("Represented NBCUniversal in a carriage dispute")
+        self.fixtures.pages[slug_from_url(edited)] = render_profile(profile)
+        self.mock.counters.clear()
+
+        counts = await refresh_lawyer_data(store, cache)
+        self.assertEqual(counts, {'not_modified': 1, 'unchanged': 1, 'changed': 1})
+        # Only the edited profile was embedded again, and only its verdict was dropped
+        self.assertEqual(self.mock.counters['embedding_inputs'], 1 + store.chunk_manifest()[0].count(edited))
+        self.assertEqual(store.get(same)['raw_content'], stored_content[same])
+        self.assertEqual(store.get(restyled)['raw_content'], stored_content[restyled])
+        self.assertIn("NBCUniversal in a carriage dispute", store.get(edited)['raw_content'])
+        self.assertNotEqual(store.validators(restyled)[0], etag)
+        self.assertEqual(set(cache.get_many([f"verdict-{url}" for url in (same, restyled, edited)])),
+                         {f"verdict-{same}", f"verdict-{restyled}"})
+        store.close()
+
+
+class TestProfileParsing(unittest.IsolatedAsyncioTestCase):
+    async def test_education_entries(self):
+        cases = [
+            ("J.D., Yale Law School, 2015", ("Yale Law School", "J.D.", 2015)),
+            ("Harvard College, A.B., magna cum laude, 2008", ("Harvard College", "A.B.", 2008)),
+            ("LL.M. \u2013 University of Cambridge \u2013 2012", ("University of Cambridge", "LL.M.", 2012)),
+            ("B.S.; Massachusetts Institute of Technology; 1999",
+             ("Massachusetts Institute of Technology", "B.S.", 1999)),
+            ("Sciences Po, 2010", ("Sciences Po", None, 2010)),
+            ("J.D.", (None, "J.D.", None)),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                entry = parse_education_entry(text)
+                self.assertEqual((entry.school, entry.degree, entry.year), expected)
+
+    async def test_sections_of_a_page_laid_out_differently(self):
+        # No <main>, sections in a different order under h2/h3, paragraphs instead of lists, and no mailto: link
+        page = """<html><body><header><nav><a href="/lawyers">Lawyers</a></nav></header>
+        <div class="main-content">
+        <header>Site banner</header>
+        <h1>Jane Q. Doe</h1>
+        <p>Counsel</p>
+        <p>Reach Jane at jane.doe@example.com or <a href="tel:+12124501234">+1 212 450 1234</a></p>
+        <a href="/offices/london">London</a> <a href="/offices/london">London</a>
+        <a href="/practices/tax">Tax</a> <a href="/practices/finance">Finance</a>
+        <h3>Representative Matters</h3>
+        <ul><li>Advised Pfizer on its  spin-off</li><li>Represented CBS Broadcasting in a merger</li></ul>
+        <h2>Judicial Clerkships:</h2>
+        <p>Hon. Jed S. Rakoff, S.D.N.Y.</p>
+        <h2>Education</h2>
+        <ul><li>J.D., Columbia Law School, 2012</li><li>B.A., Brown University, 2009</li></ul>
+        <h2>Bar Admission</h2>
+        <p>New York<br>California</p>
+        <footer>Attorney Advertising</footer>
+        </div><footer>Privacy</footer></body></html>"""
+        raw_content, structured_data = parse_profile_html(page)
+
+        self.assertEqual(structured_data, {
+            'name': "Jane Q. Doe",
+            'title': "Counsel",
+            'offices': ["London"],
+            'email': "jane.doe@example.com",
+            'phone': "+1 212 450 1234",
+            'education': [{'school': "Columbia Law School", 'degree': "J.D.", 'year': 2012},
+                          {'school': "Brown University", 'degree': "B.A.", 'year': 2009}],
+            'bar_admissions': ["New York", "California"],
+            'clerkships': ["Hon. Jed S. Rakoff, S.D.N.Y."],
+            'practice_areas': ["Tax", "Finance"],
+            'experience': ["Advised Pfizer on its spin-off", "Represented CBS Broadcasting in a merger"],
+            'bar_numbers': None,
+        })
+        for boilerplate in ("Site banner", "Attorney Advertising", "Privacy", "Lawyers"):
+            self.assertNotIn(boilerplate, raw_content)
+        self.assertIn("Bar Admission\nNew York\nCalifornia", raw_content)
+
+    async def test_bar_numbers_are_kept(self):
+        _, structured_data = parse_profile_html(
+            "<main><h1>Jane Doe</h1><p>Admitted in New York, Bar No. 123456</p></main>")
+        self.assertEqual(structured_data['bar_numbers'], "Bar No. 123456")
+
+    async def test_llm_fallback_fills_only_missing_schema_fields(self):
+        def respond(body):
+            return json.dumps({"name": "Someone Else", "practice_areas": ["Tax"], "favorite_color": "green"})
+
+        mock = MockOpenAIServer(responder=respond)
+        use_mock_openai(await mock.start())
+        try:
+            structured_data = await complete_structured_data({
+                "raw_content": "Jane Doe advises on tax matters",
+                "structured_data": {"name": "Jane Doe", "practice_areas": [], "education": [], "experience": []},
+            })
+        finally:
+            await mock.stop()
+        self.assertEqual(structured_data['name'], "Jane Doe")
+        self.assertEqual(structured_data['practice_areas'], ["Tax"])
+        self.assertNotIn('favorite_color', structured_data)
+
+
+class TestVerdictCache(unittest.TestCase):
+    def test_hits_misses_and_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = VerdictCache(os.path.join(tmp, 'verdicts.sqlite'), max_size=10)
+            keys = [VerdictCache.key(f"https://example.com/{i}", 'hash', "Lawyers who clerked", 'v1', 'model')
+                    for i in range(11)]
+            cache.put_many([(key, f"https://example.com/{i}", i % 2 == 0) for i, key in enumerate(keys[:10])])
+            # Replacing a verdict does not grow the cache
+            cache.put_many([(keys[0], "https://example.com/0", True)])
+            self.assertEqual(len(cache), 10)
+
+            time.sleep(0.01)
+            self.assertEqual(cache.get_many(keys[:3] + ["missing"]), {keys[0]: True, keys[1]: False, keys[2]: True})
+            self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+            # Passing max_size evicts the least recently used down to 90% of it
+            cache.put_many([(keys[10], "https://example.com/10", True)])
+            self.assertEqual(len(cache), 9)
+            self.assertEqual(len(cache.get_many(keys[:3] + keys[10:])), 4)
+            self.assertEqual(len(cache.get_many(keys[3:10])), 5)
+
+            cache.invalidate(["https://example.com/10"])
+            self.assertEqual(len(cache), 8)
+            self.assertEqual(len(VerdictCache(cache.path, max_size=10)), 8)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_saves_off_the_miss_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'embeddings.pkl')
+            cache = EmbeddingCache(path, save_interval=3600)
+            llm_utils._fill_cached([None], ["query"], [[1.0, 0.0]], 'model', cache)
+            # Too soon after the cache was created to write it
+            self.assertFalse(os.path.exists(path))
+
+            cache.save_interval = 0
+            llm_utils._fill_cached([None], ["other query"], [[0.0, 1.0]], 'model', cache)
+            cache.save()
+            reopened = EmbeddingCache(path)
+            self.assertEqual(reopened.get('model', "Query!"), [1.0, 0.0])
+            self.assertEqual(len(reopened), 2)
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self):
+        # Similarities with the query [1, 0] once normalized: 0.6, 1.0, 0.0 and 0.707
+        self.index = EmbeddingIndex.from_embeddings({
+            "https://example.com/0": [3.0, 4.0],
+            "https://example.com/1": [1.0, 0.0],
+            "https://example.com/2": [0.0, 2.0],
+            "https://example.com/3": [1.0, 1.0],
+        })
+
+    def ranks(self, query=(1.0, 0.0), **kwargs):
+        return [url.rsplit('/', 1)[-1] for url, _ in self.index.search(list(query), **kwargs)]
+
+    def test_threshold_and_top_k(self):
+        cases = [
+            (dict(), ['1', '3', '0', '2']),
+            (dict(cutoff_threshold=0.65), ['1', '3']),
+            (dict(top_k=2), ['1', '3']),
+            (dict(top_k=10), ['1', '3', '0', '2']),
+            (dict(top_k=0), []),
+            (dict(cutoff_threshold=0.5, top_k=1), ['1']),
+            (dict(cutoff_threshold=1.5), []),
+        ]
+        for kwargs, expected in cases:
+            with self.subTest(**kwargs):
+                self.assertEqual(self.ranks(**kwargs), expected)
+        # Queries are normalized too, so their length does not matter
+        self.assertEqual(self.ranks((5.0, 0.0), cutoff_threshold=0.65), ['1', '3'])
+        np.testing.assert_allclose([score for _, score in self.index.search([1.0, 0.0])],
+                                   [1.0, 0.5 ** 0.5, 0.6, 0.0], atol=1e-6)
+
+    def test_batch_matches_single_queries(self):
+        queries = [[1.0, 0.0], [0.0, 1.0], [1.0, 2.0]]
+        self.assertEqual(self.index.search_batch(queries, cutoff_threshold=0.1, top_k=3),
+                         [self.index.search(query, cutoff_threshold=0.1, top_k=3) for query in queries])
+
+    def test_empty_index(self):
+        index = EmbeddingIndex.from_embeddings({})
+        self.assertEqual(index.search([1.0, 0.0], top_k=3), [])
+
+
+class TestCandidateStrategies(unittest.TestCase):
+    FALLING = [0.9, 0.88, 0.86, 0.5, 0.48, 0.2]
+    KNEE = [0.9, 0.5, 0.45, 0.42, 0.4, 0.38]
+    TIED = [0.8, 0.8, 0.8, 0.3, 0.3]
+    EQUAL = [0.5, 0.5, 0.5, 0.5]
+
+    def cut(self, scores, **strategy):
+        ranked = [(f"https://example.com/{i}", score) for i, score in enumerate(scores)]
+        return len(apply_candidate_strategy(ranked, CandidateStrategy(**strategy)))
+
+    def test_cuts(self):
+        cases = [
+            # (scores, strategy, candidates kept)
+            (self.FALLING, dict(kind='relative', relative=0.9), 3),
+            (self.FALLING, dict(kind='gap'), 3),
+            (self.KNEE, dict(kind='knee'), 2),
+            # Scores that only fall off at the end have no knee
+            (self.FALLING, dict(kind='knee'), 6),
+            (self.TIED, dict(kind='relative', relative=0.9), 3),
+            (self.TIED, dict(kind='gap'), 3),
+            # The knee lands inside the tie at 0.3, which is kept whole
+            (self.TIED, dict(kind='knee'), 5),
+            (self.EQUAL, dict(kind='relative', relative=0.9), 4),
+            (self.EQUAL, dict(kind='gap'), 4),
+            (self.EQUAL, dict(kind='knee'), 4),
+            ([0.4], dict(kind='relative', relative=0.9), 1),
+            ([0.4], dict(kind='gap'), 1),
+            ([0.4], dict(kind='knee'), 1),
+            ([-0.1, -0.2], dict(kind='relative', relative=0.9), 2),
+            (self.FALLING, dict(kind='relative', relative=0.9, min_candidates=5), 5),
+            (self.FALLING, dict(kind='gap', min_candidates=4), 5),
+            (self.KNEE, dict(kind='knee', min_candidates=3), 3),
+            (self.FALLING, dict(kind='gap', min_candidates=10), 6),
+            (self.FALLING, dict(kind='threshold', threshold=0.5), 6),
+        ]
+        for scores, strategy, expected in cases:
+            with self.subTest(scores=scores, **strategy):
+                self.assertEqual(self.cut(scores, **strategy), expected)
+
+    def test_threshold_and_top_k_clamp_every_kind(self):
+        # Unit vectors whose cosine similarity with the query [1, 0] is exactly each score
+        scores = np.array(self.FALLING, dtype=np.float32)
+        index = EmbeddingIndex([f"https://example.com/{i}" for i in range(len(scores))],
+                               np.stack([scores, np.sqrt(1 - scores ** 2)], axis=1))
+        cases = [
+            (dict(kind='relative', relative=0.5, top_k=2), 2),
+            (dict(kind='gap', min_candidates=5, top_k=2), 2),
+            (dict(kind='knee', top_k=4), 4),
+            (dict(kind='gap', threshold=0.45), 3),
+            (dict(kind='relative', relative=0.1, threshold=0.45), 5),
+            (dict(kind='top_k', top_k=0), 0),
+        ]
+        strategies = [CandidateStrategy(**strategy) for strategy, _ in cases]
+        rankings = index.search_strategies([[1.0, 0.0]] * len(cases), strategies)
+        for (strategy, expected), ranking in zip(cases, rankings):
+            with self.subTest(**strategy):
+                self.assertEqual(len(ranking), expected)
+                self.assertEqual([score for _, score in ranking], sorted((score for _, score in ranking), reverse=True))
+
+
+class TestQueryRouting(unittest.TestCase):
+    def test_readme_queries(self):
+        self.assertEqual(route_query("Lawyers named David").kind, 'name')
+        self.assertEqual(route_query("Lawyers who went to Yale").value, 'Yale')
+        route = route_query("Lawyers who graduated law school after 2015")
+        self.assertEqual((route.kind, route.value, route.comparator), ('graduation_year', '2015', '>'))
+        self.assertEqual(route_query("Lawyers who worked on a case with a TV network").kind, 'free_form')
+
+
+class TestVerifier(unittest.TestCase):
+    def test_parse_batch_results(self):
+        response = ('{"results": [{"id": 1, "answer": "Pass", "confidence": 0.9}, {"id": 2, "answer": "fail"}, '
+                    '{"id": 3, "answer": "maybe"}, {"id": 9, "answer": "Pass"}]}')
+        self.assertEqual(parse_batch_results(response, 3), {0: (True, 0.9), 1: (False, None)})
+        self.assertEqual(parse_batch_results("not json", 3), {})
+
+    def test_profile_context_keeps_relevant_sections(self):
+        structured_data = {
+            "name": "Jane Doe",
+            "title": "Partner",
+            "education": ["Yale Law School, J.D., 2010"],
+            "experience": ["Represented NBCUniversal in a merger"],
+        }
+        context = build_profile_context(structured_data, "Lawyers who went to Yale")
+        self.assertIn("Jane Doe", context)
+        self.assertIn("Yale Law School", context)
+        self.assertNotIn("NBCUniversal", context)
+
+    def test_profile_context_sends_hinted_sections_whole_for_free_form_queries(self):
+        experience = [f"Advised Company {i} on its ${i} billion acquisition of a regional competitor, including the "
+                      f"antitrust review, financing and post-closing integration" for i in range(12)]
+        structured_data = {
+            "name": "Jane Doe",
+            "experience": experience + ["Represented NBCUniversal in a carriage fee dispute"],
+        }
+        query = "Lawyers who worked on a case with a TV network"
+        # The evidence is the 13th experience entry, past the budget, and shares no word with the query
+        self.assertNotIn("NBCUniversal", build_profile_context(structured_data, query))
+        self.assertIn("NBCUniversal", build_profile_context(structured_data, query, whole_hinted_sections=True))
+        self.assertIn("NBCUniversal", verifier.verifier_context(structured_data, query, context='relevant'))
+
+
+
+class TestVerifyCascade(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.requests = []
+        self.mock = MockOpenAIServer(responder=self.respond)
+        use_mock_openai(await self.mock.start())
+
+    async def asyncTearDown(self):
+        await self.mock.stop()
+        self.tmp.cleanup()
+
+    def respond(self, body):
+        self.requests.append(body)
+        user = ' '.join(m['content'] for m in body['messages'] if m['role'] == 'user')
+        if '<lawyer id=' not in user:
+            return default_responder(body)
+        # A confident first pass for everyone but the lawyer whose profile says they are hard to judge
+        return json.dumps({"results": [
+            {"id": int(i), "answer": "Pass" if "Pfizer" in text or "unclear" in text else "Fail",
+             "confidence": 0.3 if "unclear" in text else 0.95}
+            for i, text in re.findall(r'<lawyer id="(\d+)">(.*?)</lawyer>', user, re.DOTALL)
+        ]})
+
+    async def test_escalates_only_unsure_verdicts(self):
+        lawyers_dict = {
+            "https://example.com/a": {"structured_data": {"name": "A", "clients": ["Pfizer"]}},
+            "https://example.com/b": {"structured_data": {"name": "B", "clients": ["Comcast"], "notes": "unclear"}},
+            "https://example.com/c": {"structured_data": {"name": "C", "clients": ["Alphabet"]}},
         }
+        before = verifier.cascade_stats.copy()
+        tasks = verification_tasks(list(lawyers_dict), lawyers_dict, "Lawyers who represented Pfizer",
+                                   mode='cascade', context='full',
+                                   cache=VerdictCache(os.path.join(self.tmp.name, 'verdicts.sqlite')),
+                                   cascade=VerifyCascade(first_model=MINI_MODEL, escalation_model=PRIMARY_MODEL))
+        verdicts = {url: passed for task in tasks for _, url, passed in await task}
+
+        self.assertEqual(verdicts, {"https://example.com/a": True, "https://example.com/b": False,
+                                    "https://example.com/c": False})
+        self.assertEqual([body['model'] for body in self.requests], [MINI_MODEL, PRIMARY_MODEL])
+        escalated = self.requests[1]['messages'][-1]['content']
+        self.assertIn('"unclear"', escalated)
+        self.assertNotIn('"Pfizer"', escalated)
+        stats = verifier.cascade_stats - before
+        self.assertEqual(dict(stats), {'first_pass': 2, 'escalated': 1, 'overturned': 1})
+        self.assertEqual(cascade_summary(stats), "3 cascade verdicts: 1 escalated (33%), 1 overturned on escalation")
 
-    @patch('main.load_lawyer_data')
-    async def test_tv_network_query(self, mock_load_data):
-        mock_load_data.return_value = self.test_lawyer_data
-        query = "lawyers who worked on cases with TV networks"
-        results = await process_query(query)
-        
-        # Should find lawyer1 but not lawyer2
-        self.assertEqual(len(results), 1)
-        self.assertIn("John Smith", str(results))
-        self.assertNotIn("Jane Doe", str(results))
-
-    @patch('main.load_lawyer_data')  
-    async def test_education_query(self, mock_load_data):
-        mock_load_data.return_value = self.test_lawyer_data
-        query = "lawyers who went to Yale"
-        results = await process_query(query)
-        
-        self.assertEqual(len(results), 1)
-        self.assertIn("John Smith", str(results))
-        self.assertNotIn("Jane Doe", str(results))
-
-    def test_load_lawyer_data(self):
-        # Test that the data loading function returns a dictionary
-        data = load_lawyer_data()
-        self.assertIsInstance(data, dict)
-
-def run_async_tests():
-    # Helper function to run async tests
-    loop = asyncio.get_event_loop()
-    test_suite = unittest.TestLoader().loadTestsFromTestCase(TestLawyerSearch)
-    loop.run_until_complete(asyncio.gather(
-        *(test for test in test_suite if test._testMethodName.startswith('test_'))
-    ))
 
 if __name__ == '__main__':
-    run_async_tests()
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+Lightweight per-stage tracing and the logging setup shared by the entry points.
+
+`start_trace(name)` makes a `Trace` current for the block it wraps; asyncio
+tasks started inside inherit it, so every verification batch and OpenAI
+request a query fans out to is charged to that query. `span(stage)` times a
+block into the current trace, and `count` adds to its counters. Finished
+traces are kept in `recent_traces`, which `trace_table` and `stage_summary`
+turn into per-stage p50/p95 tables for the REPL.
+
+Spans are always recorded, since that is a perf_counter call and a list
+append, but only logged when DEBUG logging is on, which it is not by default.
+"""
+import json
+import logging
+import time
+import numpy as np
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
+from constants import IS_DEBUG_MODE, LOG_LEVEL, LOG_FORMAT, TRACE_HISTORY
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Stage timings and counters of one query, or of startup or precompute."""
+
+    def __init__(self, name: str, kind: str = 'query'):
+        self.name = name
+        self.kind = kind
+        self.spans: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Counter = Counter()
+        self.start = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        self.spans[stage].append(seconds)
+
+    def merge(self, other: 'Trace'):
+        """
+        Charge another trace's spans and counters to this one, e.g. a candidate selection shared by
+        several queries, and start this trace when the other one started.
+        """
+        self.start = min(self.start, other.start)
+        for stage, seconds in other.spans.items():
+            self.spans[stage].extend(seconds)
+        self.counters.update(other.counters)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.start
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+recent_traces: Deque[Trace] = deque(maxlen=TRACE_HISTORY)
+
+
+@contextmanager
+def start_trace(name: str, kind: str = 'query') -> Iterator[Trace]:
+    """Make a new trace current for the block, and keep it in `recent_traces` once the block ends."""
+    trace = Trace(name, kind)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        trace.finish()
+        recent_traces.append(trace)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("trace finished", extra={'fields': {
+                'trace': name, 'kind': kind, 'seconds': round(trace.elapsed, 4), **trace.counters,
+                **{stage: round(sum(seconds), 4) for stage, seconds in trace.spans.items()},
+            }})
+
+
+@contextmanager
+def span(stage: str, **fields) -> Iterator[None]:
+    """Time the block as one occurrence of `stage` in the current trace, if there is one."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span", extra={'fields': {
+                'stage': stage, 'ms': round(seconds * 1000, 2), 'trace': trace.name if trace else None, **fields,
+            }})
+
+
+def count(key: str, n: int = 1):
+    """Add to a counter of the current trace, if there is one."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.counters[key] += n
+
+
+def trace_table(trace: Trace) -> str:
+    """Per-stage occurrences, total and p50/p95 seconds of one trace, with its candidates and API calls."""
+    counters = trace.counters
+    header = [f"{trace.elapsed:.2f}s" if trace.elapsed is not None else "running"]
+    if 'candidates' in counters:
+        header.append(f"{counters['candidates']} candidates")
+    header.append(f"{counters['chat_calls']} chat and {counters['embedding_calls']} embedding calls, "
+                  f"{counters['chat_prompt_tokens'] + counters['embedding_prompt_tokens']} prompt and "
+                  f"{counters['chat_completion_tokens']} completion tokens")
+    lines = [f"{trace.name}: {', '.join(header)}", f"  {'stage':30} {'n':>5} {'total s':>8} {'p50 s':>7} {'p95 s':>7}"]
+    for stage, seconds in sorted(trace.spans.items()):
+        p50, p95 = np.percentile(seconds, [50, 95])
+        lines.append(f"  {stage:30} {len(seconds):5} {sum(seconds):8.3f} {p50:7.3f} {p95:7.3f}")
+    return '\n'.join(lines)
+
+
+def stage_summary(traces: Iterable[Trace]) -> str:
+    """p50/p95 across traces of the seconds each trace spent per stage, and of the whole trace."""
+    traces = list(traces)
+    per_stage = defaultdict(list)
+    for trace in traces:
+        for stage, seconds in trace.spans.items():
+            per_stage[stage].append(sum(seconds))
+        if trace.elapsed is not None:
+            per_stage['(total)'].append(trace.elapsed)
+    lines = [f"{len(traces)} traces", f"  {'stage':30} {'traces':>6} {'p50 s':>7} {'p95 s':>7}"]
+    for stage, totals in sorted(per_stage.items()):
+        p50, p95 = np.percentile(totals, [50, 95])
+        lines.append(f"  {stage:30} {len(totals):6} {p50:7.3f} {p95:7.3f}")
+    return '\n'.join(lines)
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Log lines with a record's `fields` (passed as `extra={'fields': {...}}`) appended as key=value
+    pairs, or whole records as JSON objects when `json_lines` is set.
+    """
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, 'fields', {})
+        if self.json_lines:
+            entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                     'message': record.getMessage(), **fields}
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        line = super().format(record)
+        return ' '.join([line] + [f"{key}={value}" for key, value in fields.items()])
+
+
+def configure_logging(level: Optional[str] = None, log_format: str = LOG_FORMAT):
+    """
+    Send log records to stderr through `StructuredFormatter`.
+
+    Args:
+        level (str, optional): Level name. Defaults to DEBUG when IS_DEBUG_MODE is set, else LOG_LEVEL.
+        log_format (str): 'text' for key=value lines, 'json' for one JSON object per line.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_lines=log_format == 'json'))
+    logging.basicConfig(level=level or ('DEBUG' if IS_DEBUG_MODE else LOG_LEVEL), handlers=[handler], force=True)
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from embedding_cache import normalize_text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS verdicts_url ON verdicts (url);
+CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used);
+"""
+
+
+class VerdictCache:
+    """
+    Persistent cache of pass/fail verdicts, evicting the least recently used entries.
+
+    A verdict is keyed by the lawyer URL, a hash of the profile text that was
+    judged, the normalized query, the prompt version and the model, so a changed
+    profile or prompt never reuses a stale answer. The database is opened on
+    first use, so creating a cache touches no files.
+
+    The number of rows is counted once when the database is opened and then
+    tracked in memory. Once it passes `max_size`, the least recently used
+    entries are evicted down to `evict_to` of it, so the table is only
+    recounted once per that many inserts rather than scanned on every one.
+    """
+
+    def __init__(self, path: str, max_size: int = 200_000, evict_to: float = 0.9):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.evict_to = evict_to
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._connect()
+        return self._conn
+
+    @staticmethod
+    def key(url: str, profile_hash: str, query: str, prompt_version: str, model: str) -> str:
+        return hashlib.sha1(
+            '\x1f'.join([url, profile_hash, normalize_text(query), prompt_version, model]).encode('utf-8')
+        ).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bool]:
+        """Look up several verdicts at once, refreshing their recency."""
+        found = self._select(keys)
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany("UPDATE verdicts SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, str, bool]]):
+        """Store (key, url, passed) verdicts and evict the oldest entries once there are more than `max_size`."""
+        entries = {key: (url, passed) for key, url, passed in entries}
+        if not entries:
+            return
+        now = time.time()
+        new = len(entries) - len(self._select(list(entries)))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, url, passed, last_used) VALUES (?, ?, ?, ?)",
+                [(key, url, int(passed), now) for key, (url, passed) in entries.items()]
+            )
+            self._size += new
+            if self._size > self.max_size:
+                # Other processes may share the file, so evict from an exact count
+                excess = self._count() - int(self.max_size * self.evict_to)
+                if excess > 0:
+                    self.conn.execute(
+                        "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+                self._size = self._count()
+
+    def invalidate(self, urls: Iterable[str]):
+        """Drop every cached verdict for the given lawyers."""
+        with self.conn:
+            deleted = self.conn.executemany("DELETE FROM verdicts WHERE url = ?", [(url,) for url in urls]).rowcount
+        self._size -= max(deleted, 0)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        if self._conn is None:
+            self._connect()
+        return self._size
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.executescript(SCHEMA)
+        self._size = self._count()
+
+    def _select(self, keys: List[str]) -> Dict[str, bool]:
+        found: Dict[str, bool] = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            found.update(
+                (key, bool(passed)) for key, passed in
+                self.conn.execute(f"SELECT key, passed FROM verdicts WHERE key IN ({placeholders})", chunk)
+            )
+        return found
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
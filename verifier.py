@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from llm_utils import async_llm, estimate_message_tokens
+from lawyer_store import content_hash
+from profile_context import build_profile_context
+from query_router import route_query
+from verdict_cache import VerdictCache
+from constants import VERIFY_MODE, VERIFY_BATCH_MAX_SIZE, VERIFY_BATCH_TOKEN_BUDGET, VERIFY_CONTEXT
+from constants import MINI_MODEL, PRIMARY_MODEL, VERDICT_CACHE_PATH, VERDICT_CACHE_SIZE
+from models import VerifyCascade
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Bump a version whenever its prompt changes so cached verdicts are not reused
+PROMPT_VERSIONS = {
+    'single': 'single-v1',
+    'batched': 'batched-v1',
+    'cascade': 'cascade-v1',
+}
+
+verdict_cache = VerdictCache(VERDICT_CACHE_PATH, VERDICT_CACHE_SIZE)
+
+# Running totals of cascade verdicts: settled by the first pass, escalated, and overturned on escalation
+cascade_stats = Counter()
+
+async def passes_criterion(text, query: str, model: str = MINI_MODEL) -> bool:
+    """
+    Evaluate if a lawyer passes a given criterion based on their profile.
+
+    Args:
+        lawyer_url (str): URL of the lawyer's profile
+        query (str): Criterion to evaluate against
+        model (str): Model that reasons through the verdict
+
+    Returns:
+        bool: True if lawyer passes the criterion, False otherwise
+    """
+    system_prompt = """
+    You are evaluating a lawyer whether they pass a given criterion.
+    
+    Respond in the following format:
+    <thinking>...</thinking>, within which you include your detailed thought process.
+    <answer>...</answer>, within which you include your final answer. "Pass" or "Fail".
+    """.strip()
+    
+    user_prompt = f"""
+    You are an expert lawyer searcher.
+    Find a lawyer that meets this requirement: {query}
+    Here is the lawyer's profile: {text}
+    """.strip()
+
+    logger.debug("Evaluating criterion for one lawyer", extra={'fields': {'query': query, 'model': model,
+                                                                          'prompt': user_prompt}})
+    with span('verify.single', model=model):
+        response = await async_llm(model=model, system_prompt=system_prompt, user_prompt=user_prompt)
+    return response.split('<answer>')[1].split('</answer>')[0].strip() == 'Pass'
+
+BATCH_SYSTEM_PROMPT = """
+You are evaluating several lawyers for whether each passes a given criterion.
+
+Respond with a JSON object of the form {"results": [{"id": <id>, "answer": "Pass" or "Fail"}, ...]}
+containing exactly one entry for every lawyer id you were given. Do not explain your answers.
+""".strip()
+
+CASCADE_SYSTEM_PROMPT = """
+You are evaluating several lawyers for whether each passes a given criterion.
+
+Respond with a JSON object of the form
+{"results": [{"id": <id>, "answer": "Pass" or "Fail", "confidence": <number from 0 to 1>}, ...]}
+containing exactly one entry for every lawyer id you were given. The confidence is 1 when the profile
+settles the answer outright and lower when the answer is a guess or the profile is ambiguous.
+Do not explain your answers.
+""".strip()
+
+def compact_profile(structured_data: Any) -> str:
+    """Serialize a profile without the whitespace of its Python repr."""
+    if isinstance(structured_data, str):
+        return structured_data
+    return json.dumps(structured_data, separators=(',', ':'), ensure_ascii=False)
+
+def verifier_context(structured_data: Any, query: str, context: str = VERIFY_CONTEXT) -> str:
+    """
+    The profile text shown to the verifier: all of it for 'full', else only the parts relevant to the query,
+    with the sections a free-form query hints at sent whole.
+    """
+    if context == 'full':
+        return compact_profile(structured_data)
+    return build_profile_context(structured_data, query, whole_hinted_sections=route_query(query).kind == 'free_form')
+
+def pack_batches(texts: List[str], token_budget: int = VERIFY_BATCH_TOKEN_BUDGET,
+                 max_size: int = VERIFY_BATCH_MAX_SIZE) -> List[List[int]]:
+    """
+    Greedily group profiles into batches that fit the prompt token budget.
+
+    Args:
+        texts (List[str]): Compact profiles, in the order they should be judged.
+        token_budget (int): Maximum estimated prompt tokens per batch.
+        max_size (int): Maximum number of profiles per batch.
+
+    Returns:
+        List[List[int]]: Indices into `texts` for each batch. A profile larger than
+        the budget gets a batch of its own.
+    """
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_message_tokens(text)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_results(response: str, count: int) -> Dict[int, Tuple[bool, Optional[float]]]:
+    """
+    Parse a batched verifier response into {index: (passed, confidence)}, skipping malformed entries.
+
+    The confidence is clamped to [0, 1], and is None when the entry has no usable confidence.
+    """
+    try:
+        results = json.loads(response)['results']
+    except (ValueError, KeyError, TypeError):
+        return {}
+    verdicts = {}
+    for result in results if isinstance(results, list) else []:
+        try:
+            index = int(result['id']) - 1
+            answer = str(result['answer']).strip().lower()
+        except (KeyError, TypeError, ValueError):
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(result['confidence'])))
+        except (KeyError, TypeError, ValueError):
+            confidence = None
+        if 0 <= index < count and answer in ('pass', 'fail'):
+            verdicts[index] = (answer == 'pass', confidence)
+    return verdicts
+
+def parse_batch_verdicts(response: str, count: int) -> Dict[int, bool]:
+    """Parse a batched verifier response into {index: passed}, skipping malformed entries."""
+    return {index: passed for index, (passed, _) in parse_batch_results(response, count).items()}
+
+def batch_user_prompt(texts: List[str], query: str) -> str:
+    profiles = "\n".join(f"<lawyer id=\"{i + 1}\">{text}</lawyer>" for i, text in enumerate(texts))
+    return f"""
+    Requirement: {query}
+    Lawyers:
+    {profiles}
+    """.strip()
+
+async def passes_criteria_batch(texts: List[str], query: str) -> List[bool]:
+    """
+    Evaluate several lawyers against a criterion in a single chat completion.
+
+    Lawyers the model leaves out or answers ambiguously are re-checked with
+    individual `passes_criterion` calls.
+
+    Args:
+        texts (List[str]): Compact profiles of the lawyers to evaluate.
+        query (str): Criterion to evaluate against.
+
+    Returns:
+        List[bool]: Whether each lawyer passes, in the order given.
+    """
+    user_prompt = batch_user_prompt(texts, query)
+
+    logger.debug("Evaluating criterion for a batch", extra={'fields': {'query': query, 'lawyers': len(texts)}})
+    try:
+        with span('verify.batch', lawyers=len(texts)):
+            response = await async_llm(system_prompt=BATCH_SYSTEM_PROMPT, user_prompt=user_prompt,
+                                       params={"response_format": {"type": "json_object"}})
+        verdicts = parse_batch_verdicts(response, len(texts))
+    except Exception as e:
+        logger.warning("Batched verification failed, falling back to single calls: %s", e)
+        verdicts = {}
+
+    missing = [i for i in range(len(texts)) if i not in verdicts]
+    if missing:
+        fallback = await asyncio.gather(*(passes_criterion(texts[i], query) for i in missing))
+        verdicts.update(zip(missing, fallback))
+    return [verdicts[i] for i in range(len(texts))]
+
+async def first_pass_batch(texts: List[str], query: str,
+                           model: str = MINI_MODEL) -> Dict[int, Tuple[bool, Optional[float]]]:
+    """
+    Quick first-tier verdicts with confidences for a batch of lawyers, in one chat completion.
+
+    Returns:
+        Dict[int, Tuple[bool, Optional[float]]]: {index: (passed, confidence)} for the lawyers the
+        model answered; empty if the request failed, so every lawyer gets escalated.
+    """
+    logger.debug("First pass of criterion for a batch", extra={'fields': {'query': query, 'lawyers': len(texts)}})
+    try:
+        with span('verify.first_pass', model=model, lawyers=len(texts)):
+            response = await async_llm(model=model, system_prompt=CASCADE_SYSTEM_PROMPT,
+                                       user_prompt=batch_user_prompt(texts, query),
+                                       params={"response_format": {"type": "json_object"}})
+    except Exception as e:
+        logger.warning("First-pass verification failed, escalating the batch: %s", e)
+        return {}
+    return parse_batch_results(response, len(texts))
+
+def cascade_summary(stats: Counter = cascade_stats) -> str:
+    """One line describing how many cascade verdicts were escalated and overturned."""
+    judged = stats['first_pass'] + stats['escalated']
+    if not judged:
+        return "No cascade verdicts yet"
+    return (f"{judged} cascade verdicts: {stats['escalated']} escalated ({stats['escalated'] / judged:.0%}), "
+            f"{stats['overturned']} overturned on escalation")
+
+def verification_tasks(lawyer_urls: List[str], lawyers_dict, query: str, mode: str = VERIFY_MODE,
+                       cache: VerdictCache = None, context: str = VERIFY_CONTEXT,
+                       cascade: VerifyCascade = None) -> List['asyncio.Future[List[Tuple[int, str, bool]]]']:
+    """
+    Start verifying every candidate and return one task per LLM request.
+
+    Each task resolves to (rank, url, passed) tuples for the candidates it judged,
+    where rank is the candidate's position in `lawyer_urls`. Verdicts found in the
+    cache come back together in one already-finished task. In 'cascade' mode
+    every batch has two tasks: the confident first-pass verdicts, which finish
+    as soon as the quick batched request does, and the escalated verdicts,
+    which finish when the stronger model has re-judged the rest.
+
+    Args:
+        lawyer_urls (List[str]): Candidates, best first.
+        lawyers_dict: Mapping of lawyer URLs to their profiles.
+        query (str): Criterion to evaluate against.
+        mode (str): 'single' for one request per lawyer, 'batched' to pack several per request,
+            'cascade' for batched first-pass verdicts with unsure ones escalated.
+        cache (VerdictCache, optional): Cache of earlier verdicts. Defaults to the shared `verdict_cache`.
+        context (str): 'relevant' to send only the profile sections relevant to the query, 'full' for
+            the whole profile.
+        cascade (VerifyCascade, optional): Models and confidence threshold for 'cascade' mode.
+    """
+    cache = verdict_cache if cache is None else cache
+    texts = [verifier_context(lawyers_dict[url]['structured_data'], query, context) for url in lawyer_urls]
+    prompt_version = PROMPT_VERSIONS[mode]
+    cascade = cascade or VerifyCascade()
+    first_model = cascade.first_model or MINI_MODEL
+    escalation_model = cascade.escalation_model or PRIMARY_MODEL
+    model = MINI_MODEL if mode != 'cascade' else f"{first_model}>{escalation_model}@{cascade.min_confidence}"
+    keys = [
+        VerdictCache.key(url, content_hash(text), query, prompt_version, model)
+        for url, text in zip(lawyer_urls, texts)
+    ]
+    cached = cache.get_many(keys)
+    tasks = []
+    if cached:
+        done = asyncio.get_running_loop().create_future()
+        done.set_result([(i, url, cached[key]) for i, (url, key) in enumerate(zip(lawyer_urls, keys)) if key in cached])
+        tasks.append(done)
+    uncached = [i for i, key in enumerate(keys) if key not in cached]
+
+    def remember(verdicts):
+        cache.put_many((keys[i], url, passed) for i, url, passed in verdicts)
+        return verdicts
+
+    if mode == 'single':
+        async def judge(i):
+            url = lawyer_urls[i]
+            return remember([(i, url, await passes_criterion(texts[i], query))])
+
+        return tasks + [asyncio.ensure_future(judge(i)) for i in uncached]
+
+    async def judge_batch(batch):
+        passed = await passes_criteria_batch([texts[i] for i in batch], query)
+        return remember([(i, lawyer_urls[i], p) for i, p in zip(batch, passed)])
+
+    def is_confident(result):
+        return result is not None and result[1] is not None and result[1] >= cascade.min_confidence
+
+    def cascade_batch(batch):
+        first_pass = asyncio.ensure_future(first_pass_batch([texts[i] for i in batch], query, first_model))
+
+        async def confident():
+            results = await first_pass
+            verdicts = [(i, lawyer_urls[i], results[j][0]) for j, i in enumerate(batch) if is_confident(results.get(j))]
+            cascade_stats['first_pass'] += len(verdicts)
+            return remember(verdicts)
+
+        async def escalated():
+            results = await first_pass
+            unsure = [(j, i) for j, i in enumerate(batch) if not is_confident(results.get(j))]
+            passed = await asyncio.gather(*(passes_criterion(texts[i], query, escalation_model) for _, i in unsure))
+            cascade_stats['escalated'] += len(unsure)
+            cascade_stats['overturned'] += sum(j in results and results[j][0] != p for (j, _), p in zip(unsure, passed))
+            return remember([(i, lawyer_urls[i], p) for (_, i), p in zip(unsure, passed)])
+
+        return [asyncio.ensure_future(confident()), asyncio.ensure_future(escalated())]
+
+    max_size = cascade.batch_size if mode == 'cascade' else VERIFY_BATCH_MAX_SIZE
+    batches = [[uncached[j] for j in batch] for batch in pack_batches([texts[i] for i in uncached], max_size=max_size)]
+    if mode == 'cascade':
+        return tasks + [task for batch in batches for task in cascade_batch(batch)]
+    return tasks + [asyncio.ensure_future(judge_batch(batch)) for batch in batches]